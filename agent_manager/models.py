@@ -0,0 +1,215 @@
+import datetime as dt
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+
+from settings import AGENT_SOCKET_PATH
+from units_manager.models import TimeoutController
+
+# на платформах без unix-сокетов агент недоступен, команды работают без него
+AGENT_SUPPORTED = hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid')
+
+
+def get_socket_path(create=False):
+    """
+    Путь сокета агента: AGENT_SOCKET_PATH или agent.sock в каталоге, доступном только
+    владельцу - $XDG_RUNTIME_DIR или pwdone-<uid> во временном каталоге (create - создать его).
+    Каталог другого пользователя или открытый для других - ValueError
+    """
+    if AGENT_SOCKET_PATH:
+        return str(AGENT_SOCKET_PATH)
+    directory = os.environ.get('XDG_RUNTIME_DIR') or \
+        os.path.join(tempfile.gettempdir(), f'pwdone-{os.getuid()}')
+    if create:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    if os.path.lexists(directory):
+        stat_result = os.lstat(directory)
+        if not stat.S_ISDIR(stat_result.st_mode) or stat_result.st_uid != os.getuid() \
+                or stat_result.st_mode & 0o077:
+            raise ValueError(f'"{directory}" must be a directory available only to its owner')
+    return os.path.join(directory, 'agent.sock')
+
+
+def is_own_socket(path):
+    """path - unix-сокет текущего пользователя"""
+    try:
+        stat_result = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(stat_result.st_mode) and stat_result.st_uid == os.getuid()
+
+
+def remove_socket(path):
+    """
+    Удаление сокета, оставшегося от упавшего сервера. Если path - не сокет
+    (например, опечатка в пути указывает на БД) или сокет другого пользователя - ValueError
+    """
+    if not os.path.lexists(path):
+        return
+    if not is_own_socket(path):
+        raise ValueError(f'"{path}" exists and is not a socket of the current user')
+    os.unlink(path)
+
+
+class AgentServer:
+    """Агент, который держит разблокированный ключ пользователя и прогретый engine
+
+    IN:
+        Получает менеджер БД пользователя и пароль, из которого один раз выводит ключ
+    OUT:
+        Отвечает на запросы cli через unix-сокет строками json, пока сессия,
+        которую отслеживает TimeoutController, не истекла. Сокет создается сразу:
+        если путь занят не сокетом текущего пользователя - ValueError
+    """
+
+    def __init__(self, manager_obj, password, socket_path=None, time_session=None):
+        # Crypto импортируется только агентом, клиенту в cli он не нужен
+        from encryption_manager.models import derive_secret_obj
+
+        self._socket_path = str(socket_path or get_socket_path(create=True))
+        self._server = self._bind()
+        self._manager_obj = manager_obj
+        self._secret_obj = derive_secret_obj(manager_obj.user, password)
+        # при смене имени или пароля пользователя (uupdate) ключ агента устаревает
+        self._pass_hash = manager_obj.user_obj.get_password_hash()
+        self._db = os.path.abspath(os.fspath(manager_obj.file_user_db))
+        self._timeout_obj = TimeoutController(time_session)
+        self._last_access = dt.datetime.today()
+        self._stopped = False
+
+    def handle(self, request):
+        """Обработка запроса, возвращает ответ"""
+        command = request.get('command')
+        if command == 'stop':
+            self._stopped = True
+            return {'status': 'ok'}
+        if request.get('user') != self._manager_obj.user or request.get('db') != self._db:
+            return {'status': 'error', 'message': 'agent is unlocked for another user or DB'}
+
+        if self._manager_obj.user_obj.get_password_hash() != self._pass_hash:
+            self._stopped = True
+            self._secret_obj.wipe()
+            return {'status': 'error',
+                    'message': 'user was changed, agent stopped: unlock it again'}
+
+        unit_obj = self._manager_obj.unit_obj
+        if command == 'ping':
+            return {'status': 'ok'}
+        elif command == 'get':
+            # запрос столбца, а не объекта: identity map долгой сессии агента
+            # отдавала бы пароль, который с тех пор изменил другой процесс
+            encrypted_password = unit_obj.get_encrypted_password(request.get('login'),
+                                                                 request.get('name'))
+            if encrypted_password is None:
+                return {'status': 'error', 'message': 'login not exists', 'missing': True}
+            try:
+                return {'status': 'ok', 'password': self._secret_obj.decrypt(encrypted_password)}
+            except ValueError:
+                return {'status': 'error',
+                        'message': 'password can not be decrypted with the key of the agent'}
+        elif command == 'passwords':
+            encrypted_passwords = unit_obj.get_encrypted_passwords(request.get('pairs', []))
+            return {'status': 'ok', 'passwords': [
+                [login, name, self._secret_obj.decrypt(encrypted_password)]
+                for (login, name), encrypted_password in encrypted_passwords.items()]}
+        elif command == 'logins':
+            return {'status': 'ok', 'logins': unit_obj.get_logins(
+                request.get('category'), request.get('limit'), request.get('offset', 0))}
+        elif command == 'suggest':
+            return {'status': 'ok', 'suggestions': unit_obj.suggest(
+                request.get('login'), request.get('name'))}
+        elif command == 'search':
+            return {'status': 'ok', 'logins': unit_obj.search(
+                request.get('query'), request.get('category'), request.get('limit'))}
+        elif command == 'page':
+            logins, next_cursor = unit_obj.get_page(
+                request.get('category'), request.get('cursor'), request.get('limit'))
+            return {'status': 'ok', 'logins': logins, 'cursor': next_cursor}
+        return {'status': 'error', 'message': f'unknown command "{command}"'}
+
+    def is_active(self):
+        """Агент работает, пока его не остановили и сессия не истекла"""
+        return not self._stopped \
+            and self._timeout_obj.check_time_permission(self._last_access)
+
+    def _bind(self):
+        """Сервер на сокете агента"""
+        agent = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    response = agent.handle(json.loads(self.rfile.readline()))
+                except Exception as exc:
+                    response = {'status': 'error', 'message': str(exc)}
+                agent._last_access = dt.datetime.today()
+                self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+        # сокет от упавшего агента
+        remove_socket(self._socket_path)
+        # сокет доступен только владельцу, как у ssh-agent
+        old_umask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(self._socket_path, RequestHandler)
+        finally:
+            os.umask(old_umask)
+        server.timeout = 1
+        return server
+
+    def serve_forever(self):
+        """Обслуживание запросов до остановки или истечения сессии"""
+        try:
+            while self.is_active():
+                self._server.handle_request()
+        finally:
+            self._server.server_close()
+            if is_own_socket(self._socket_path):
+                os.unlink(self._socket_path)
+            self._secret_obj.wipe()
+
+
+class AgentClient:
+    """Клиент агента для команд cli"""
+
+    def __init__(self, socket_path=None, timeout=5):
+        self._socket_path = socket_path
+        self._timeout = timeout
+
+    def request(self, command, user=None, db=None, **params):
+        """
+        Запрос к агенту, None если агент не запущен. Сокет и процесс на другом его конце
+        должны принадлежать текущему пользователю: иначе это не наш агент
+        """
+        if not AGENT_SUPPORTED:
+            return None
+        try:
+            socket_path = str(self._socket_path or get_socket_path())
+        except ValueError:
+            return None
+        if not is_own_socket(socket_path):
+            return None
+        params.update(command=command, user=user,
+                      db=None if db is None else os.path.abspath(os.fspath(db)))
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(self._timeout)
+                client.connect(socket_path)
+                if hasattr(socket, 'SO_PEERCRED'):
+                    credentials = client.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                    struct.calcsize('3i'))
+                    if struct.unpack('3i', credentials)[1] != os.getuid():
+                        return None
+                client.sendall(json.dumps(params).encode('utf-8') + b'\n')
+                with client.makefile('rb') as response:
+                    return json.loads(response.readline())
+        except (OSError, ValueError):
+            return None
+
+    def is_unlocked(self, user, db):
+        """Агент запущен и держит разблокированным хранилище этого пользователя"""
+        response = self.request('ping', user, db)
+        return response is not None and response['status'] == 'ok'
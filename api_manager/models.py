@@ -0,0 +1,270 @@
+import base64
+import binascii
+import json
+import os
+import socketserver
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from agent_manager.models import is_own_socket, remove_socket
+from database_manager.models import (REGISTRY, UnitManager, UserManager,
+                                     create_sqlite_engine)
+from encryption_manager.models import get_secret_obj
+from settings import (API_HOST, API_POOL_SIZE, API_PORT, FILE_DB, PAGE_SIZE,
+                      SEARCH_LIMIT)
+
+
+class ApiError(Exception):
+    """Ошибка запроса к API: код ответа HTTP и сообщение"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_basic_auth(authorization):
+    """(user, password) из заголовка Authorization: Basic"""
+    scheme, _, credentials = (authorization or '').partition(' ')
+    if scheme.lower() != 'basic':
+        raise ApiError(HTTPStatus.UNAUTHORIZED, 'basic authorization is required')
+    try:
+        user, separator, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        separator = None
+    if not separator:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, 'incorrect authorization header')
+    return user, password
+
+
+def get_int(params, name, default=None):
+    """Целый параметр запроса"""
+    if params.get(name) is None:
+        return default
+    try:
+        value = int(params[name])
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f'incorrect value of "{name}"')
+    return value
+
+
+def get_required(data, name):
+    """Обязательный параметр запроса или поле тела"""
+    if not data.get(name):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f'"{name}" is required')
+    return data[name]
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Разбор запроса HTTP и запись ответа json, обработка - в ApiServer.handle"""
+    # keep-alive: клиент может слать запросы по одному соединению
+    protocol_version = 'HTTP/1.1'
+    server_version = 'pwdone'
+    # заголовки и тело ответа уходят одной записью в сокет: отдельная запись тела
+    # на keep-alive соединении ждет ACK клиента (Nagle + delayed ACK, ~40 мс)
+    wbufsize = -1
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        try:
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # конец тела неизвестен, следующий запрос из соединения не прочитать
+                self.close_connection = True
+                raise ApiError(HTTPStatus.BAD_REQUEST, 'incorrect Content-Length')
+            body = self.rfile.read(length) if length else b''
+            status, response = self.server.api.handle(
+                self.command, url.path, dict(parse_qsl(url.query)),
+                self.headers.get('Authorization'), body)
+        except ApiError as exc:
+            status, response = exc.status, {'status': 'error', 'message': str(exc)}
+        except Exception as exc:
+            status, response = HTTPStatus.INTERNAL_SERVER_ERROR, \
+                {'status': 'error', 'message': str(exc)}
+
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status == HTTPStatus.UNAUTHORIZED:
+            self.send_header('WWW-Authenticate', 'Basic realm="pwdone"')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        # запросы не журналируются: в строке запроса логины
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP сервер на unix-сокете, поток на соединение"""
+    daemon_threads = True
+
+
+class ApiServer:
+    """Локальный HTTP/JSON API хранилища для скриптов и внутренних инструментов
+
+    IN:
+        Файл БД, адрес (host, port) или путь unix-сокета и размер пула соединений с БД
+    OUT:
+        Отвечает json на запросы пользователей хранилища, каждый запрос проверяется
+        по паролю пользователя (HTTP Basic). Engine, схема и соединения пула готовы
+        с запуска, ключи шифрования выводятся один раз и берутся из KEY_CACHE
+    """
+    ROUTES = {
+        ('GET', '/users'): '_all_users',
+        ('GET', '/units'): '_get_logins',
+        ('POST', '/units'): '_add_unit',
+        ('PUT', '/units'): '_update_unit',
+        ('DELETE', '/units'): '_delete_unit',
+        ('GET', '/units/search'): '_search',
+        ('GET', '/units/password'): '_get_password',
+    }
+
+    def __init__(self, file_db=FILE_DB, host=API_HOST, port=API_PORT, socket_path=None,
+                 pool_size=API_POOL_SIZE):
+        if socket_path:
+            # сокет от упавшего сервера; не сокет (опечатка в пути, БД) - ValueError
+            remove_socket(socket_path)
+        # схема проверяется и обновляется один раз, при запуске
+        REGISTRY.get_engine(file_db)
+        # отдельный engine с пулом: соединение с pragmas открывается один раз и выдается
+        # потокам запросов по одному, поэтому sqlite3 можно не привязывать к потоку
+        self._engine = create_sqlite_engine(file_db, poolclass=QueuePool, pool_size=pool_size,
+                                            max_overflow=0,
+                                            connect_args={'check_same_thread': False})
+        self._session_maker = sessionmaker(bind=self._engine)
+        self._socket_path = socket_path
+
+        if socket_path:
+            # сокет доступен только владельцу, как у агента
+            old_umask = os.umask(0o177)
+            try:
+                self._server = ThreadingUnixHTTPServer(socket_path, ApiRequestHandler)
+            finally:
+                os.umask(old_umask)
+        else:
+            self._server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+        self._server.api = self
+
+    @property
+    def address(self):
+        """Путь сокета или (host, port), на котором сервер принимает запросы"""
+        return self._socket_path or self._server.server_address[:2]
+
+    def handle(self, method, path, params, authorization, body):
+        """Обработка запроса, возвращает (код ответа, ответ)"""
+        if (method, path) == ('GET', '/ping'):
+            return HTTPStatus.OK, {'status': 'ok'}
+        route = self.ROUTES.get((method, path))
+        if route is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f'unknown endpoint "{method} {path}"')
+        user, password = parse_basic_auth(authorization)
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'request body is not json')
+        if not isinstance(data, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'request body must be a json object')
+
+        session = self._session_maker()
+        try:
+            if not UserManager(session, user).check_user_password(password):
+                raise ApiError(HTTPStatus.UNAUTHORIZED, 'incorrect user or password')
+            response = getattr(self, route)(UserManager(session, user), UnitManager(session, user),
+                                            user, password, params, data)
+        except ValueError as exc:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(exc))
+        finally:
+            # соединение возвращается в пул
+            session.close()
+        status = response.pop('code', HTTPStatus.OK)
+        return status, dict(response, status='ok' if status < HTTPStatus.BAD_REQUEST else 'error')
+
+    def _all_users(self, user_obj, unit_obj, user, password, params, data):
+        return {'users': user_obj.all_users()}
+
+    def _get_logins(self, user_obj, unit_obj, user, password, params, data):
+        category = params.get('category')
+        if 'cursor' in params or 'page_size' in params:
+            page_size = get_int(params, 'page_size', PAGE_SIZE) or PAGE_SIZE
+            logins, next_cursor = unit_obj.get_page(category, params.get('cursor'), page_size)
+            return {'logins': logins, 'cursor': next_cursor}
+        return {'logins': unit_obj.get_logins(category, get_int(params, 'limit'),
+                                              get_int(params, 'offset', 0))}
+
+    def _search(self, user_obj, unit_obj, user, password, params, data):
+        return {'logins': unit_obj.search(get_required(params, 'query'), params.get('category'),
+                                          get_int(params, 'limit', SEARCH_LIMIT))}
+
+    def _get_password(self, user_obj, unit_obj, user, password, params, data):
+        login, name = get_required(params, 'login'), params.get('name', 'default')
+        encrypted_password = unit_obj.get_encrypted_password(login, name)
+        if encrypted_password is None:
+            return self._suggest(unit_obj, login, name)
+        return {'password': get_secret_obj(user, password).decrypt(encrypted_password)}
+
+    def _add_unit(self, user_obj, unit_obj, user, password, params, data):
+        login, name = get_required(data, 'login'), data.get('name') or 'default'
+        if unit_obj.check_login(login, name):
+            return {'code': HTTPStatus.CONFLICT, 'message':
+                    f'login "{login}" with "{name}" name already exists'}
+        unit_obj.add_unit(user, password, login, get_required(data, 'password'), name,
+                          data.get('category') or 'default', data.get('url'))
+        return {'code': HTTPStatus.CREATED}
+
+    def _update_unit(self, user_obj, unit_obj, user, password, params, data):
+        login, name = get_required(params, 'login'), params.get('name', 'default')
+        if not unit_obj.check_login(login, name):
+            return self._suggest(unit_obj, login, name)
+        new_login, new_name = data.get('new_login') or login, data.get('new_name') or name
+        if (new_login, new_name) != (login, name) and unit_obj.check_login(new_login, new_name):
+            return {'code': HTTPStatus.CONFLICT, 'message':
+                    f'login "{new_login}" with "{new_name}" name already exists'}
+        unit_obj.update_unit(user, password, login, name, new_login, data.get('password'),
+                             data.get('new_category'), data.get('url'), new_name)
+        return {}
+
+    def _delete_unit(self, user_obj, unit_obj, user, password, params, data):
+        login, name = get_required(params, 'login'), params.get('name', 'default')
+        if not unit_obj.check_login(login, name):
+            return self._suggest(unit_obj, login, name)
+        unit_obj.delete_unit(login, name)
+        return {}
+
+    @staticmethod
+    def _suggest(unit_obj, login, name):
+        """Ответ на промах: 404 и ближайшие логины"""
+        return {'code': HTTPStatus.NOT_FOUND,
+                'message': f'login "{login}" with "{name}" name not exists',
+                'suggestions': unit_obj.suggest(login, name)}
+
+    def serve_forever(self):
+        """Обслуживание запросов до shutdown или KeyboardInterrupt"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self.server_close()
+
+    def shutdown(self):
+        """Остановка serve_forever из другого потока"""
+        self._server.shutdown()
+
+    def server_close(self):
+        """Закрываем сокет и соединения пула"""
+        self._server.server_close()
+        if self._socket_path and is_own_socket(self._socket_path):
+            os.unlink(self._socket_path)
+        self._engine.dispose()
@@ -0,0 +1,81 @@
+# Несколько процессов пишут в одну БД и читают из нее, как пользователи и задачи cron
+# с общим FILE_DB: пропускная способность и число ошибок "database is locked".
+# Каждый процесс добавляет свои units и сразу читает их пароли через sqlite3.
+#
+# $ python -m benchmarks.bench_concurrency
+# для сравнения с настройками sqlite по умолчанию:
+# $ PWDONE_SQLITE_JOURNAL_MODE=DELETE PWDONE_SQLITE_BUSY_TIMEOUT=0 PWDONE_SQLITE_BEGIN=DEFERRED \
+#   python -m benchmarks.bench_concurrency
+import multiprocessing
+import pathlib
+import tempfile
+import time
+
+USER = 'bench-user'
+PASSWORD = 'bench-password'
+PROCESSES = (1, 4, 8)
+OPERATIONS = 200
+
+
+def worker(file_db, number, operations):
+    """Процесс: добавление units и чтение их паролей, возвращает (успешных, ошибок)"""
+    import sqlite3
+
+    from sqlalchemy.exc import OperationalError
+
+    from database_manager.models import SQLAlchemyManager
+    from database_manager.sqlite_reader import SQLiteReader, connect
+
+    unit_obj = SQLAlchemyManager(file_db, USER).unit_obj
+    done, errors = 0, 0
+    for i in range(operations):
+        login = f'login-{number}-{i}'
+        try:
+            unit_obj.add_unit(USER, PASSWORD, login, f'secret-{i}')
+            connection = connect(file_db)
+            try:
+                if SQLiteReader(connection, USER).get_password(USER, PASSWORD, login, 'default') \
+                        != f'secret-{i}':
+                    raise AssertionError(f'Incorrect password for {login}')
+            finally:
+                connection.close()
+            done += 1
+        except (OperationalError, sqlite3.OperationalError):
+            unit_obj._session.rollback()
+            errors += 1
+    return done, errors
+
+
+def run(file_db, processes, operations):
+    """Запуск processes процессов на одной БД, возвращает (успешных, ошибок, секунд)"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes) as pool:
+        start = time.perf_counter()
+        results = pool.starmap(worker, [(file_db, number, operations)
+                                        for number in range(processes)])
+        elapsed = time.perf_counter() - start
+    return sum(result[0] for result in results), sum(result[1] for result in results), elapsed
+
+
+def create_vault(file_db):
+    """БД с пользователем USER"""
+    from database_manager.models import REGISTRY, SQLAlchemyManager
+
+    SQLAlchemyManager(file_db, USER).user_obj.add_user(PASSWORD)
+    REGISTRY.dispose()
+
+
+def main():
+    from settings import SQLITE_BEGIN, SQLITE_PRAGMAS
+
+    print(f'pragmas: {SQLITE_PRAGMAS}, begin: {SQLITE_BEGIN}')
+    for processes in PROCESSES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_db = str(pathlib.Path(tmp_dir) / 'bench.sqlite')
+            create_vault(file_db)
+            done, errors, elapsed = run(file_db, processes, OPERATIONS)
+            print(f'{processes} processes: {done / elapsed:8.1f} ops/s   errors {errors}')
+
+
+if __name__ == '__main__':
+    main()
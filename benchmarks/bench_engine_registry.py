@@ -0,0 +1,69 @@
+# Сравнение накладных расходов на запуск команды cli:
+# общий engine/сессия на процесс против engine на каждый SQLAlchemyManager.
+# show и проверки пользователя в cli идут через sqlite3 (SQLiteReader), поэтому
+# путь команды на ORM воспроизводится напрямую: менеджер на проверку пользователя,
+# на проверку пароля и на саму команду
+#
+# $ python -m benchmarks.bench_engine_registry
+import pathlib
+import tempfile
+import time
+
+import database_manager.models as models_db
+
+USER = 'bench-user'
+PASSWORD = 'bench-password'
+ROUNDS = 50
+
+
+def orm_command(file_db):
+    """Команда cli на ORM: проверка пользователя и пароля, выдача units"""
+    models_db.SQLAlchemyManager(file_db, USER).user_obj.check_user()
+    models_db.SQLAlchemyManager(file_db, USER).user_obj.check_user_password(PASSWORD)
+    models_db.SQLAlchemyManager(file_db, USER).unit_obj.get_logins()
+
+
+def run_command(file_db, per_manager_engine):
+    """Запуск команды, возвращает (время, соединения, проверки схемы)"""
+    registry = models_db.REGISTRY
+    registry.dispose()
+    registry.stats.update(engines=0, connections=0, schema_checks=0)
+
+    original_init = models_db.SQLAlchemyManager.__init__
+
+    def init_with_new_engine(self, file_db=models_db.FILE_DB, user=None):
+        # Поведение до появления реестра: новый engine на каждый менеджер
+        registry.dispose()
+        original_init(self, file_db, user)
+
+    if per_manager_engine:
+        models_db.SQLAlchemyManager.__init__ = init_with_new_engine
+    try:
+        start = time.perf_counter()
+        orm_command(file_db)
+        elapsed = time.perf_counter() - start
+    finally:
+        models_db.SQLAlchemyManager.__init__ = original_init
+    return elapsed, registry.stats['connections'], registry.stats['schema_checks']
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_db = str(pathlib.Path(tmp_dir) / 'bench.sqlite')
+        manager_obj = models_db.SQLAlchemyManager(file_db, USER)
+        manager_obj.user_obj.add_user(PASSWORD)
+        for i in range(100):
+            manager_obj.unit_obj.add_unit(USER, PASSWORD, f'login-{i}', 'secret')
+
+        for title, per_manager_engine in (('engine per manager', True),
+                                          ('shared registry', False)):
+            results = [run_command(file_db, per_manager_engine)
+                       for _ in range(ROUNDS)]
+            avg_time = sum(item[0] for item in results) / ROUNDS
+            print(f'{title:<20} {avg_time * 1000:8.2f} ms/command, '
+                  f'connections: {results[-1][1]}, schema checks: {results[-1][2]}')
+        models_db.REGISTRY.dispose()
+
+
+if __name__ == '__main__':
+    main()
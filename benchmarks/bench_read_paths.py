@@ -0,0 +1,92 @@
+# Сравнение путей чтения: ORM (SQLAlchemyManager) и sqlite3 (SQLiteReader)
+# для show (get_logins), get (check_login + get_password) и ushow (all_users)
+#
+# $ python -m benchmarks.bench_read_paths
+import pathlib
+import sqlite3
+import tempfile
+import time
+
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from database_manager.sqlite_reader import SQLiteReader, connect
+
+USER = 'bench-user'
+PASSWORD = 'bench-password'
+SIZES = (1000, 10000, 100000)
+
+
+def fill_vault(file_db, count):
+    """БД с одним пользователем и count units"""
+    manager_obj = SQLAlchemyManager(file_db, USER)
+    manager_obj.user_obj.add_user(PASSWORD)
+    manager_obj.unit_obj.add_unit(USER, PASSWORD, 'login-0', 'secret')
+    REGISTRY.dispose()
+
+    connection = sqlite3.connect(file_db)
+    user_id, category_id, password = connection.execute(
+        'SELECT user_id, category_id, password FROM units').fetchone()
+    connection.executemany(
+        'INSERT INTO units (user_id, login, name, category_id, password) VALUES (?, ?, ?, ?, ?)',
+        ((user_id, f'login-{i}', 'default', category_id, password) for i in range(1, count)))
+    connection.commit()
+    connection.close()
+
+
+def measure(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    for count in SIZES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_db = str(pathlib.Path(tmp_dir) / 'bench.sqlite')
+            fill_vault(file_db, count)
+            login = f'login-{count // 2}'
+            rounds = max(3, 100000 // count)
+
+            # каждый раунд - как отдельный запуск команды: новый менеджер / соединение
+            def orm_show():
+                REGISTRY.dispose()
+                SQLAlchemyManager(file_db, USER).unit_obj.get_logins()
+
+            def orm_get():
+                REGISTRY.dispose()
+                unit_obj = SQLAlchemyManager(file_db, USER).unit_obj
+                unit_obj.check_login(login, 'default')
+                unit_obj.get_password(USER, PASSWORD, login, 'default')
+
+            def orm_ushow():
+                REGISTRY.dispose()
+                SQLAlchemyManager(file_db).user_obj.all_users()
+
+            def reader_call(method, *args):
+                def call():
+                    connection = connect(file_db)
+                    getattr(SQLiteReader(connection, USER), method)(*args)
+                    connection.close()
+                return call
+
+            def reader_get():
+                connection = connect(file_db)
+                reader = SQLiteReader(connection, USER)
+                reader.check_login(login, 'default')
+                reader.get_password(USER, PASSWORD, login, 'default')
+                connection.close()
+
+            print(f'{count} units:')
+            for title, orm_func, reader_func in (
+                    ('show', orm_show, reader_call('get_logins')),
+                    ('get', orm_get, reader_get),
+                    ('ushow', orm_ushow, reader_call('all_users'))):
+                orm_ms = measure(orm_func, rounds)
+                reader_ms = measure(reader_func, rounds)
+                print(f'    {title:<6} orm {orm_ms:9.2f} ms   sqlite3 {reader_ms:9.2f} ms   '
+                      f'x{orm_ms / reader_ms:.1f}')
+            REGISTRY.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+# Масштабирование перешифрования по числу процессов
+#
+# $ python -m benchmarks.bench_reencrypt_workers [количество шифротекстов]
+import sys
+import time
+
+from encryption_manager.models import encrypt_many, get_secret_obj, reencrypt
+
+WORKERS = (1, 2, 4, 8)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    old_secret_obj = get_secret_obj('bench-user', 'old-password')
+    new_secret_obj = get_secret_obj('bench-user', 'new-password')
+    ciphertexts = encrypt_many([f'password-{i}' for i in range(count)], old_secret_obj,
+                               workers=max(WORKERS))
+
+    base_time = None
+    for workers in WORKERS:
+        start = time.perf_counter()
+        reencrypt(ciphertexts, old_secret_obj, new_secret_obj, workers=workers)
+        elapsed = time.perf_counter() - start
+        base_time = base_time or elapsed
+        print(f'workers: {workers}  {elapsed:7.2f} s  {count / elapsed:10.0f} units/s  '
+              f'speedup: {base_time / elapsed:4.2f}x')
+
+
+if __name__ == '__main__':
+    main()
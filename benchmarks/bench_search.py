@@ -0,0 +1,66 @@
+# Поиск units: полнотекстовый индекс FTS5 и LIKE по всем units пользователя
+#
+# $ python -m benchmarks.bench_search
+import pathlib
+import sqlite3
+import tempfile
+import time
+
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from database_manager.sqlite_reader import SQLiteReader, connect
+
+USER = 'bench-user'
+PASSWORD = 'bench-password'
+SIZES = (1000, 10000, 100000)
+QUERIES = ('login-4242', 'site-7 work', 'example')
+
+
+def fill_vault(file_db, count):
+    """БД с одним пользователем и count units, индекс units_fts заполняют триггеры"""
+    manager_obj = SQLAlchemyManager(file_db, USER)
+    manager_obj.user_obj.add_user(PASSWORD)
+    manager_obj.unit_obj.add_unit(USER, PASSWORD, 'login-0', 'secret', category='work')
+    REGISTRY.dispose()
+
+    connection = sqlite3.connect(file_db)
+    user_id, category_id, password = connection.execute(
+        'SELECT user_id, category_id, password FROM units').fetchone()
+    connection.executemany(
+        'INSERT INTO units (user_id, login, name, url, category_id, password) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        ((user_id, f'login-{i}', f'site-{i % 100}', f'https://site-{i}.example.org/',
+          category_id, password) for i in range(1, count)))
+    connection.commit()
+    connection.close()
+
+
+def measure(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    for count in SIZES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_db = str(pathlib.Path(tmp_dir) / 'bench.sqlite')
+            fill_vault(file_db, count)
+            connection = connect(file_db)
+            fts_reader = SQLiteReader(connection, USER)
+            like_reader = SQLiteReader(connection, USER)
+            # тот же запрос без индекса
+            like_reader._fts = False
+            rounds = max(3, 10000 // count)
+
+            print(f'{count} units:')
+            for query in QUERIES:
+                fts_ms = measure(lambda: fts_reader.search(query), rounds)
+                like_ms = measure(lambda: like_reader.search(query), rounds)
+                print(f'    {query:<12} fts {fts_ms:9.2f} ms   like {like_ms:9.2f} ms')
+            connection.close()
+            REGISTRY.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Время холодного старта cli и самые дорогие импорты по данным -X importtime
+#
+# $ python -m benchmarks.bench_startup
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from database_manager.models import REGISTRY, SQLAlchemyManager
+
+CLI_PATH = pathlib.Path(__file__).resolve().parent.parent / 'cli.py'
+ROUNDS = 10
+TOP_IMPORTS = 15
+
+
+def run_cli(args, cwd):
+    """Запуск cli в новом процессе, возвращает (время, импорты {модуль: мкс})"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', str(CLI_PATH)] + args,
+                            cwd=cwd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    imports = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            imports[module.strip()] = int(cumulative)
+    return elapsed, imports
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_db = str(pathlib.Path(tmp_dir) / 'bench.sqlite')
+        manager_obj = SQLAlchemyManager(file_db, 'bench-user')
+        manager_obj.user_obj.add_user('bench-password')
+        REGISTRY.dispose()
+
+        commands = {
+            '--help': ['--help'],
+            'get': ['get', '-u', 'bench-user', '-p', 'bench-password',
+                    '-l', 'missing-login', '-n', 'default', '--db', file_db],
+        }
+        for title, args in commands.items():
+            runs = [run_cli(args, tmp_dir) for _ in range(ROUNDS)]
+            best_time = min(item[0] for item in runs)
+            imports = runs[-1][1]
+            # модули верхнего уровня, без вложенных
+            top = sorted(((us, module) for module, us in imports.items() if '.' not in module),
+                         reverse=True)[:TOP_IMPORTS]
+            print(f'pwdone {title}: best of {ROUNDS} {best_time * 1000:.1f} ms, '
+                  f'{len(imports)} modules imported')
+            for us, module in top:
+                print(f'    {us / 1000:8.1f} ms  {module}')
+
+
+if __name__ == '__main__':
+    main()
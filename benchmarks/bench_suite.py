@@ -0,0 +1,175 @@
+# Набор бенчмарков операций хранилища на синтетическом хранилище (benchmarks.vault)
+# в 1k, 10k и 100k units: UserManager, UnitManager, перешифрование update_user
+# и вывод UnitsComposition. Результаты сохраняются в json, чтобы сравнивать коммиты.
+#
+# $ python -m benchmarks.bench_suite                  # -> benchmarks/results/<коммит>.json
+# $ python -m benchmarks.bench_suite --sizes 1000 10000 --output before.json
+# $ python -m benchmarks.bench_suite --compare before.json benchmarks/results/<коммит>.json
+import argparse
+import contextlib
+import datetime as dt
+import io
+import itertools
+import json
+import pathlib
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.vault import (CATEGORIES, PASSWORD, SEED, generate_vault,
+                              make_units)
+
+ROOT_PATH = pathlib.Path(__file__).resolve().parent.parent
+RESULTS_PATH = ROOT_PATH / 'benchmarks' / 'results'
+SIZES = (1000, 10000, 100000)
+USERS = 2
+RUNS = 20
+# операции над всеми units пользователя повторяются реже
+HEAVY_RUNS = 5
+FLAGS = {'name': True, 'category': True, 'url': True}
+# замедление больше чем на столько при сравнении отмечается
+REGRESSION_THRESHOLD = 1.2
+
+
+def measure(func, runs, setup=None):
+    """Время runs вызовов func в мс: медиана, минимум, максимум; setup не замеряется"""
+    times = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(times), 4), 'min_ms': round(min(times), 4),
+            'max_ms': round(max(times), 4), 'runs': runs}
+
+
+def render(logins):
+    """Вывод show в память"""
+    from units_manager.models import UnitsComposition
+
+    units_composition_obj = UnitsComposition(logins)
+    units_composition_obj.prepare_data()
+    units_composition_obj.write(io.StringIO(), FLAGS, 'table')
+
+
+def bench_size(file_db, size, users, categories, runs):
+    """Время операций на хранилище users пользователей по size units, {операция: время}"""
+    from database_manager.models import (REGISTRY, SQLAlchemyManager,
+                                         UserManager)
+
+    start = time.perf_counter()
+    user = generate_vault(file_db, users, size, categories)[0]
+    print(f'{size} units: vault of {users} users in {time.perf_counter() - start:.1f} s')
+
+    manager_obj = SQLAlchemyManager(file_db, user)
+    session = manager_obj.session_for_user
+    user_obj, unit_obj = manager_obj.user_obj, manager_obj.unit_obj
+    # случайные units пользователя: тот же seed, что и у generate_vault
+    samples = random.Random(SEED).sample(list(make_units(size, categories, SEED)), runs)
+    new_users, new_units, existing_units = itertools.count(), itertools.count(), iter(samples)
+    added_units = (f'bench-login-{i}' for i in itertools.count())
+
+    results = {
+        'add_user': measure(
+            lambda: UserManager(session, f'new-user-{next(new_users)}').add_user(PASSWORD), runs),
+        'check_user_password': measure(lambda: user_obj.check_user_password(PASSWORD), runs),
+        'add_unit': measure(lambda: unit_obj.add_unit(
+            user, PASSWORD, f'bench-login-{next(new_units)}', 'secret'), runs),
+        # сессия без загруженных объектов, как у нового запуска cli
+        'get_logins': measure(unit_obj.get_logins, HEAVY_RUNS, session.expunge_all),
+        'get_password': measure(lambda: (lambda unit_: unit_obj.get_password(
+            user, PASSWORD, unit_['login'], unit_['name']))(next(existing_units)), runs),
+    }
+    existing_units = iter(samples)
+    results['update_unit'] = measure(lambda: (lambda unit_: unit_obj.update_unit(
+        user, PASSWORD, unit_['login'], unit_['name'], None, 'new-secret'))(next(existing_units)),
+        runs)
+    results['delete_unit'] = measure(lambda: unit_obj.delete_unit(next(added_units), 'default'),
+                                     runs)
+    logins = unit_obj.get_logins()
+    results['render_table'] = measure(lambda: render(logins), HEAVY_RUNS)
+    # перешифрование всех units, один раз: пользователь переименовывается
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['update_user'] = measure(
+            lambda: user_obj.update_user(file_db, PASSWORD, user + '-renamed', 'new-password'), 1)
+    REGISTRY.dispose()
+
+    for operation, result in results.items():
+        print(f'    {operation:<20} {result["median_ms"]:10.3f} ms'
+              f'   min {result["min_ms"]:10.3f} ms')
+    return results
+
+
+def get_environment():
+    """Коммит и окружение, на которых получены результаты"""
+    def git(*args):
+        try:
+            return subprocess.run(['git'] + list(args), cwd=ROOT_PATH, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import sqlalchemy
+
+    return {'commit': git('rev-parse', '--short', 'HEAD'),
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+            'date': dt.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform()}
+
+
+def compare(old_path, new_path):
+    """Таблица медиан двух файлов результатов, замедления отмечаются"""
+    old, new = (json.loads(pathlib.Path(path).read_text()) for path in (old_path, new_path))
+    print(f'{old["environment"]["commit"]} -> {new["environment"]["commit"]}')
+    for size, operations in new['results'].items():
+        print(f'{size} units:')
+        for operation, result in operations.items():
+            old_result = old['results'].get(size, {}).get(operation)
+            if old_result is None:
+                print(f'    {operation:<20} {"":>10}    {result["median_ms"]:10.3f} ms')
+                continue
+            ratio = result['median_ms'] / old_result['median_ms'] if old_result['median_ms'] else 1
+            mark = '  regression' if ratio > REGRESSION_THRESHOLD else ''
+            print(f'    {operation:<20} {old_result["median_ms"]:10.3f}'
+                  f' -> {result["median_ms"]:10.3f} ms   x{ratio:.2f}{mark}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pwdone benchmark suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--users', type=int, default=USERS)
+    parser.add_argument('--categories', type=int, default=CATEGORIES)
+    parser.add_argument('--runs', type=int, default=RUNS)
+    parser.add_argument('--output', default=None,
+                        help='json file, by default benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), default=None,
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    environment = get_environment()
+    results = {}
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results[str(size)] = bench_size(str(pathlib.Path(tmp_dir) / 'bench.sqlite'), size,
+                                            args.users, args.categories, min(args.runs, size))
+
+    output = pathlib.Path(args.output or RESULTS_PATH / f'{environment["commit"] or "local"}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({'environment': environment, 'results': results}, indent=2))
+    print(f'Results are saved to {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Нагрузочный тест локального API (pwdone serve): задержка p50/p99 и запросов в секунду
+# для GET /units/password при разном числе клиентов, для сравнения - запуск pwdone
+# на каждый запрос, как это делают скрипты без API (search: get пишет в буфер обмена).
+# Сервер запускается отдельным процессом на временной БД, клиенты - потоки
+# со своим keep-alive соединением.
+#
+# $ python -m benchmarks.load_test_api
+# на запущенном сервере (units login-0..login-N пользователя USER должны быть в БД):
+# $ python -m benchmarks.load_test_api --port 8765 --units 1000
+import argparse
+import base64
+import http.client
+import json
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CLI_PATH = pathlib.Path(__file__).resolve().parent.parent / 'cli.py'
+USER = 'bench-user'
+PASSWORD = 'bench-password'
+UNITS = 1000
+CLIENTS = (1, 4, 16)
+REQUESTS = 2000
+CLI_ROUNDS = 10
+
+
+def percentile(values, percent):
+    """Перцентиль отсортированного списка"""
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def create_vault(file_db, units):
+    """БД с пользователем USER и units login-0..login-{units - 1}"""
+    from database_manager.models import REGISTRY, SQLAlchemyManager
+
+    manager_obj = SQLAlchemyManager(file_db, USER)
+    manager_obj.user_obj.add_user(PASSWORD)
+    manager_obj.unit_obj.import_units(USER, PASSWORD, (
+        {'login': f'login-{i}', 'password': f'secret-{i}', 'name': 'default',
+         'category': 'default', 'url': None} for i in range(units)))
+    REGISTRY.dispose()
+
+
+def start_server(file_db, cwd):
+    """Процесс pwdone serve на свободном порту, возвращает (процесс, порт)"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, str(CLI_PATH), 'serve', '--port', str(port),
+                                '--db', file_db], cwd=cwd, stdout=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/ping')
+            connection.getresponse().read()
+            connection.close()
+            return process, port
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('API server did not start')
+
+
+def client(port, units, requests, latencies, errors):
+    """Поток клиента: requests запросов паролей случайных units по одному соединению"""
+    authorization = 'Basic ' + base64.b64encode(f'{USER}:{PASSWORD}'.encode()).decode()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    for _ in range(requests):
+        number = random.randrange(units)
+        start = time.perf_counter()
+        connection.request('GET', f'/units/password?login=login-{number}',
+                           headers={'Authorization': authorization})
+        response = connection.getresponse()
+        data = json.loads(response.read())
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200 or data['password'] != f'secret-{number}':
+            errors.append(number)
+    connection.close()
+
+
+def run(port, units, clients, requests):
+    """Нагрузка clients потоками, возвращает (задержки, ошибок, секунд)"""
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client,
+                                args=(port, units, requests // clients, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), len(errors), time.perf_counter() - start
+
+
+def run_cli(file_db, units, cwd):
+    """Задержки запуска pwdone на каждый запрос, как у скриптов без API"""
+    latencies = []
+    for _ in range(CLI_ROUNDS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(CLI_PATH), 'search', f'login-{random.randrange(units)}',
+                        '-u', USER, '-p', PASSWORD, '--db', file_db],
+                       cwd=cwd, capture_output=True, check=True)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def report(title, latencies, errors, elapsed):
+    print(f'{title:<22} p50 {percentile(latencies, 50) * 1000:7.2f} ms   '
+          f'p99 {percentile(latencies, 99) * 1000:7.2f} ms   '
+          f'{len(latencies) / elapsed:8.1f} req/s   errors {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of pwdone serve')
+    parser.add_argument('--port', type=int, default=None, help='port of a running server')
+    parser.add_argument('--units', type=int, default=UNITS)
+    parser.add_argument('--requests', type=int, default=REQUESTS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        process = None
+        port = args.port
+        if port is None:
+            file_db = str(pathlib.Path(tmp_dir) / 'bench.sqlite')
+            create_vault(file_db, args.units)
+            process, port = start_server(file_db, tmp_dir)
+        try:
+            # прогрев: кеш ключа и соединения пула
+            run(port, args.units, 1, 10)
+            for clients in CLIENTS:
+                latencies, errors, elapsed = run(port, args.units, clients, args.requests)
+                report(f'API, {clients} clients:', latencies, errors, elapsed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        if process is not None:
+            latencies = run_cli(file_db, args.units, tmp_dir)
+            report('pwdone per request:', latencies, 0, sum(latencies))
+
+
+if __name__ == '__main__':
+    main()
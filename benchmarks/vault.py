@@ -0,0 +1,72 @@
+# Генератор синтетического хранилища для бенчмарков: users пользователей,
+# у каждого units units в categories категориях. Units добавляются через
+# UnitManager.import_units, поэтому индексы поиска и подсказок заполнены, как в жизни.
+#
+# $ python -m benchmarks.vault vault.sqlite --users 3 --units 10000 --categories 20
+import argparse
+import random
+import time
+
+PASSWORD = 'bench-password'
+USERS = 1
+UNITS = 1000
+CATEGORIES = 20
+SEED = 1
+
+SITES = ('github', 'gitlab', 'google', 'yandex', 'mail', 'bank', 'shop', 'cloud', 'jira', 'slack')
+DOMAINS = ('com', 'ru', 'org', 'io', 'net')
+
+
+def make_user(number):
+    return f'bench-user-{number}'
+
+
+def make_units(units, categories, seed=SEED):
+    """units словарей (login, password, name, category, url), одинаковых при одном seed"""
+    generator = random.Random(seed)
+    for i in range(units):
+        site = generator.choice(SITES)
+        domain = generator.choice(DOMAINS)
+        yield {'login': f'user{i}@{site}.{domain}',
+               'password': f'{generator.getrandbits(64):016x}',
+               'name': f'{site}-{i % 7}',
+               'category': f'category-{generator.randrange(categories)}',
+               'url': f'https://{site}.{domain}/login' if generator.random() < 0.8 else None}
+
+
+def generate_vault(file_db, users=USERS, units=UNITS, categories=CATEGORIES, seed=SEED):
+    """
+    Хранилище в файле file_db: пользователи make_user(0..users - 1) с паролем PASSWORD,
+    у каждого units units. Возвращает список пользователей
+    """
+    from database_manager.models import REGISTRY, SQLAlchemyManager
+
+    user_names = []
+    for number in range(users):
+        user = make_user(number)
+        manager_obj = SQLAlchemyManager(file_db, user)
+        manager_obj.user_obj.add_user(PASSWORD)
+        manager_obj.unit_obj.import_units(user, PASSWORD,
+                                          make_units(units, categories, seed + number))
+        user_names.append(user)
+    REGISTRY.dispose()
+    return user_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic pwdone vault')
+    parser.add_argument('file_db')
+    parser.add_argument('--users', type=int, default=USERS)
+    parser.add_argument('--units', type=int, default=UNITS, help='units of every user')
+    parser.add_argument('--categories', type=int, default=CATEGORIES)
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    user_names = generate_vault(args.file_db, args.users, args.units, args.categories, args.seed)
+    print(f'{len(user_names)} users x {args.units} units in {time.perf_counter() - start:.1f} s, '
+          f'password "{PASSWORD}": {", ".join(user_names)}')
+
+
+if __name__ == '__main__':
+    main()
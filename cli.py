@@ -1,15 +1,107 @@
 # cli.py
-import os
-import re
-from logging import ERROR, INFO
+import time
+
+# начало отсчета pwdone --profile: фаза "import cli" - время импортов ниже
+_STARTED_AT = time.perf_counter()
+
+import functools  # noqa: E402
+import hashlib  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import re  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+from logging import DEBUG, ERROR, INFO, WARNING  # noqa: E402
+
+import click  # noqa: E402
+
+from agent_manager.models import (AGENT_SUPPORTED, AgentClient,  # noqa: E402
+                                  AgentServer)
+from log_manager.models import log_and_print, log_operation  # noqa: E402
+from log_manager.operations import (FIELDS, format_stats,  # noqa: E402
+                                    get_log_files, get_stats, iter_operations)
+from profile_manager.models import PROFILER, span  # noqa: E402
+from settings import (API_HOST, API_POOL_SIZE, API_PORT,  # noqa: E402
+                      CRYPTO_WORKERS, FILE_DB, IMPORT_BATCH_SIZE,
+                      OPERATIONS_LOG, OPERATIONS_LOG_PATH, PAGE_SIZE,
+                      SEARCH_LIMIT)
+from units_manager.models import UnitsComposition  # noqa: E402
+from units_manager.transfer import (ExportWriter, UnitsReader,  # noqa: E402
+                                    atomic_write)
+
+
+def get_manager(db, user=None):
+    """
+    DB manager. sqlalchemy and Crypto are imported here, not at module load,
+    so commands that don't use the DB (e.g. --help) start fast
+    """
+    with span('import'):
+        from database_manager.models import SQLAlchemyManager
+    return SQLAlchemyManager(db, user)
 
-import click
-import pyperclip
 
-from database_manager.models import SQLAlchemyManager
-from log_manager.models import log_and_print
-from settings import FILE_DB
-from units_manager.models import UnitsComposition
+def get_reader(db, user=None):
+    """
+    Read-only fast path on stdlib sqlite3 without ORM, one connection per invocation.
+    None if the DB has to be created or upgraded through get_manager first
+    """
+    with span('import'):
+        from database_manager.sqlite_reader import SQLiteReader, connect
+
+    ctx = click.get_current_context()
+    connections = ctx.obj.setdefault('READERS', {})
+    key = os.path.abspath(db)
+    if key not in connections:
+        connections[key] = connect(db)
+        if connections[key] is not None:
+            ctx.call_on_close(connections[key].close)
+    if connections[key] is None:
+        return None
+    return SQLiteReader(connections[key], user)
+
+
+def copy_to_clipboard(text):
+    """
+    Place text on the clipboard, pyperclip is imported only when it is needed
+    """
+    with span('clipboard'):
+        import pyperclip
+        pyperclip.copy(text)
+
+
+def agent_request(command, user, db, check=True, **params):
+    """
+    Request to the agent, which keeps the vault unlocked. The agent may exit after the password
+    prompt was skipped (session expired, stopped), then the command ends with an error.
+    With check an error answer of the agent also ends the command
+    """
+    response = AgentClient().request(command, user, db, **params)
+    if response is None:
+        log_and_print('Agent is not running anymore, run the command again and enter the password',
+                      level=ERROR)
+        exit(-1)
+    if check and response['status'] != 'ok':
+        log_and_print(f'Agent error: {response["message"]}', level=ERROR)
+        exit(-1)
+    return response
+
+
+def count_units(count):
+    """
+    Number of units touched by the command, for the operations log
+    """
+    click.get_current_context().obj['UNITS'] = count
+
+
+def log_not_exists(login, name, suggestions):
+    """
+    Error for a missing login with the nearest logins, if there are any
+    """
+    message = f'login "{login}" with "{name}" name not exists'
+    if suggestions:
+        message += '. Did you mean: ' + ', '.join(
+            f'login "{login_}" with "{name_}" name' for login_, name_ in suggestions) + '?'
+    log_and_print(message, level=ERROR)
 
 
 def validate_new_user(ctx, param, value):
@@ -28,13 +120,14 @@ def validate_user(ctx, param, value):
     """
     Check user exists
     """
-    manager_obj = SQLAlchemyManager(FILE_DB, value)
+    db = ctx.params.get('db', FILE_DB)
+    user_obj = get_reader(db, value) or get_manager(db, value).user_obj
 
-    if not manager_obj.user_obj.check_user():
+    if not user_obj.check_user():
         log_and_print(f'User named "{value}" not exists', level=ERROR)
         exit(-1)
     elif 'PASSWORD' in ctx.obj.keys() \
-            and not manager_obj.user_obj.check_user_password(ctx.obj['PASSWORD']):
+            and not user_obj.check_user_password(ctx.obj['PASSWORD']):
         log_and_print(f'Incorrect password for user named "{value}"', level=ERROR)
         exit(-1)
     else:
@@ -46,20 +139,49 @@ def validate_password(ctx, param, value):
     """
     Check password
     """
+    if value is None:
+        # пароль не запрашивался: хранилище разблокировано агентом
+        return value
     if 'USER' not in ctx.obj.keys():
         ctx.obj['PASSWORD'] = value
         return value
 
     user = ctx.obj['USER']
-    manager_obj = SQLAlchemyManager(FILE_DB, user)
+    db = ctx.params.get('db', FILE_DB)
+    user_obj = get_reader(db, user) or get_manager(db, user).user_obj
 
-    if not manager_obj.user_obj.check_user_password(value):
+    if not user_obj.check_user_password(value):
         log_and_print(f'Incorrect password for user named "{user}"', level=ERROR)
         exit(-1)
     else:
         return value
 
 
+def stop_agent(ctx, param, value):
+    """
+    Stop the agent
+    """
+    if not value or ctx.resilient_parsing:
+        return
+    if AgentClient().request('stop') is None:
+        log_and_print('Agent is not running', level=ERROR)
+        exit(-1)
+    log_and_print('Agent stopped', level=INFO)
+    ctx.exit()
+
+
+class AgentPasswordOption(click.Option):
+    """
+    Password option, which is not prompted when the agent keeps the user's vault unlocked
+    """
+
+    def prompt_for_value(self, ctx):
+        if 'USER' in ctx.obj.keys() \
+                and AgentClient().is_unlocked(ctx.obj['USER'], ctx.params.get('db', FILE_DB)):
+            return None
+        return super().prompt_for_value(ctx)
+
+
 user_argument = click.option('--user', '-u', prompt="Username",
                              help="Provide your username",
                              callback=validate_user,
@@ -67,14 +189,76 @@ user_argument = click.option('--user', '-u', prompt="Username",
 password_argument = click.option('--password', '-p', help="Provide your password",
                                  callback=validate_password,
                                  prompt=True, hide_input=True)
+agent_password_argument = click.option('--password', '-p', help="Provide your password",
+                                       cls=AgentPasswordOption,
+                                       callback=validate_password,
+                                       prompt=True, hide_input=True)
+# --db обрабатывается первым, чтобы callbacks проверяли ту же БД, что и команда
+db_argument = click.option("--db", default=FILE_DB, required=False, hidden=True,
+                           is_eager=True)
+
+
+def log_statements(snapshot):
+    """
+    Log the number and time of the command's DB statements
+    """
+    from database_manager.statements import STATS
+
+    count, seconds = STATS.snapshot()
+    if count > snapshot[0]:
+        log_and_print(f'{count - snapshot[0]} SQL statements '
+                      f'in {(seconds - snapshot[1]) * 1000:.2f} ms',
+                      print_need=False, level=DEBUG)
+
+
+def finish_profile(profile_output):
+    """
+    Print the time of command phases to stderr and save the profile file
+    """
+    PROFILER.stop()
+    click.echo(PROFILER.format_report(), err=True)
+    if profile_output:
+        PROFILER.dump(profile_output)
+        click.echo(f'Profile is saved to "{profile_output}"', err=True)
+
+
+def finish_operation(ctx, snapshot, start):
+    """
+    Write the command record to the operations log: command, user hash, units,
+    time of the command, of its SQL statements and of key derivation in ms
+    """
+    from database_manager.statements import STATS
+
+    PROFILER.stop()
+    count, seconds = STATS.snapshot()
+    user = ctx.obj.get('USER')
+    log_operation({
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'command': ctx.invoked_subcommand,
+        'user': hashlib.sha256(user.encode('utf-8')).hexdigest()[:16] if user else None,
+        'units': ctx.obj.get('UNITS', 0),
+        'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+        'sql_statements': count - snapshot[0],
+        'sql_ms': round((seconds - snapshot[1]) * 1000, 3),
+        'key_ms': round(PROFILER.get_phases().get('key', (0, 0.0, 0.0))[1] * 1000, 3),
+    })
 
 
 @click.group()
 # @click.option('-n/-not-name', help='print or not name')
 @click.option('-c/-not-category', help='print or not category')
 @click.option('-u/-not-url', help='print or not url')
+@click.option('--profile', is_flag=True,
+              help='Print the time of command phases (imports, engine, schema, key, sql, aes, '
+                   'clipboard) to stderr')
+@click.option('--profile-output', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Save cProfile stats to FILE (FILE.folded: collapsed stacks of phases '
+                   'for flame graphs), implies --profile')
+@click.option('--operations-log/--no-operations-log', default=OPERATIONS_LOG,
+              help=f'Write a json line per command to "{OPERATIONS_LOG_PATH.name}" in the logs '
+                   'directory, see "pwdone stats"; also PWDONE_OPERATIONS_LOG=1')
 @click.pass_context
-def cli(ctx, c, u):
+def cli(ctx, c, u, profile, profile_output, operations_log):
     """
     pwdone is a multi-user, multi-platform command-line utility
     for storing and organizing passwords and another info for logins
@@ -112,6 +296,19 @@ def cli(ctx, c, u):
             'url': u
         }
     }
+    from database_manager.statements import STATS
+
+    ctx.call_on_close(functools.partial(log_statements, STATS.snapshot()))
+    if operations_log:
+        # время вывода ключа берется из фаз профайлера
+        ctx.call_on_close(functools.partial(finish_operation, ctx, STATS.snapshot(),
+                                            time.perf_counter()))
+    if profile or profile_output:
+        PROFILER.start(profile_output is not None and not profile_output.endswith('.folded'),
+                       _STARTED_AT)
+        ctx.call_on_close(lambda: finish_profile(profile_output))
+    elif operations_log:
+        PROFILER.start(started_at=_STARTED_AT)
 
 
 @cli.command()
@@ -121,12 +318,12 @@ def cli(ctx, c, u):
               default=os.getlogin)
 @click.option('--password', '-p', help="Provide your password",
               prompt=True, hide_input=True)
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@db_argument
 def uadd(user, password, db):
     """
     add user command
     """
-    manager_obj = SQLAlchemyManager(db, user)
+    manager_obj = get_manager(db, user)
 
     if manager_obj.user_obj.check_user():
         log_and_print(f'User named "{user}" already exists', level=ERROR)
@@ -146,45 +343,47 @@ def uadd(user, password, db):
               default='',
               help="Provide new password for user", hide_input=True)
 @click.confirmation_option(prompt='Are you sure you want to update user data?')
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@click.option('-w', '--workers', type=int, default=CRYPTO_WORKERS,
+              help='Number of processes for re-encryption of logins, optional')
+@db_argument
 def uupdate(user, password,
-            new_username, new_password, db):
+            new_username, new_password, workers, db):
     """
     update username (and password) command
     """
-    manager_obj = SQLAlchemyManager(db, user)
+    manager_obj = get_manager(db, user)
 
     new_password = None if new_password == '' else new_password
     if manager_obj.user_obj.check_user(new_username) and not new_password:
         log_and_print(f'User named "{new_username}" already exists '
                       f'and no new password is given', level=ERROR)
     else:
-        manager_obj.user_obj.update_user(db, password, new_username, new_password)
+        manager_obj.user_obj.update_user(db, password, new_username, new_password, workers)
 
 
 @cli.command()
 @user_argument
 @password_argument
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@db_argument
 def udelete(user, password, db):
     """
     delete user command
     """
-    manager_obj = SQLAlchemyManager(db, user)
+    manager_obj = get_manager(db, user)
 
     manager_obj.user_obj.del_user()
     log_and_print(f'User named "{user}" deleted', level=INFO)
 
 
 @cli.command()
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@db_argument
 def ushow(db):
     """
     show users command
     """
-    manager_obj = SQLAlchemyManager(db)
+    user_obj = get_reader(db) or get_manager(db).user_obj
 
-    users = manager_obj.user_obj.all_users()
+    users = user_obj.all_users()
     for user in users:
         print(user)
     log_and_print(f'Show users command is done', print_need=False, level=INFO)
@@ -192,45 +391,198 @@ def ushow(db):
 
 @cli.command()
 @user_argument
-@password_argument
+@agent_password_argument
 @click.option('-c', "--category", help='"default" for default category, '
                                        'skip for all logins, optional',
               default=None, required=False)
+@click.option('--limit', type=click.IntRange(min=0), default=None,
+              help='Show at most LIMIT logins, optional')
+@click.option('--offset', type=click.IntRange(min=0), default=0,
+              help='Skip first OFFSET logins, optional')
+@click.option('--page-size', type=click.IntRange(min=1), default=None,
+              help='Show logins by pages of PAGE_SIZE sorted by login and name, '
+                   'the next page cursor is printed to stderr, optional')
+@click.option('--cursor', default=None,
+              help='Show the page after CURSOR from the previous page, optional')
+@click.option('-f', '--format', 'output_format', type=click.Choice(['table', 'json']),
+              default='table', help='"json" prints json lines for scripts, default "table"')
 @click.pass_context
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
-def show(ctx, user, password, category, db):
+@db_argument
+def show(ctx, user, password, category, limit, offset, page_size, cursor, output_format, db):
     """
     show logins command
     """
-    manager_obj = SQLAlchemyManager(db, user)
-
-    logins = manager_obj.unit_obj.get_logins(category)
+    paged = page_size is not None or cursor is not None
+    if paged and (limit is not None or offset):
+        log_and_print('Use either --page-size/--cursor or --limit/--offset', level=ERROR)
+        exit(-1)
+    page_size = page_size or PAGE_SIZE
+    next_cursor = None
+
+    try:
+        if password is None and paged:
+            response = agent_request('page', user, db, category=category, cursor=cursor,
+                                     limit=page_size)
+            logins, next_cursor = response['logins'], response['cursor']
+        elif password is None:
+            logins = agent_request('logins', user, db, category=category,
+                                   limit=limit, offset=offset)['logins']
+        elif paged:
+            unit_obj = get_reader(db, user) or get_manager(db, user).unit_obj
+            logins, next_cursor = unit_obj.get_page(category, cursor, page_size)
+        else:
+            unit_obj = get_reader(db, user) or get_manager(db, user).unit_obj
+            logins = unit_obj.get_logins(category, limit, offset)
+    except ValueError as exc:
+        log_and_print(str(exc), level=ERROR)
+        exit(-1)
+    count_units(len(logins['logins']))
     units_composition_obj = UnitsComposition(logins)
     units_composition_obj.prepare_data()
-    res_str = units_composition_obj.make_str_logins(ctx.obj['FLAGS'])
-    print(res_str)
+    units_composition_obj.write(sys.stdout, ctx.obj['FLAGS'], output_format)
+    if next_cursor:
+        # в stderr, чтобы не смешивать с выдачей для скриптов
+        click.echo(f'Next page: --cursor {next_cursor}', err=True)
     log_and_print(f'Show logins command is done', print_need=False, level=INFO)
 
 
 @cli.command()
+@click.argument('query')
 @user_argument
-@password_argument
+@agent_password_argument
+@click.option('-c', "--category", help='Search only in the category, optional',
+              default=None, required=False)
+@click.option('--limit', type=click.IntRange(min=1), default=SEARCH_LIMIT,
+              help=f'Show at most LIMIT logins, default {SEARCH_LIMIT}')
+@click.option('-f', '--format', 'output_format', type=click.Choice(['table', 'json']),
+              default='table', help='"json" prints json lines for scripts, default "table"')
+@click.pass_context
+@db_argument
+def search(ctx, query, user, password, category, limit, output_format, db):
+    """
+    search logins by words from QUERY in login, name, url and category,
+    every word matches a word prefix
+    """
+    if password is None:
+        logins = agent_request('search', user, db, query=query,
+                               category=category, limit=limit)['logins']
+    else:
+        unit_obj = get_reader(db, user) or get_manager(db, user).unit_obj
+        logins = unit_obj.search(query, category, limit)
+    count_units(len(logins['logins']))
+    units_composition_obj = UnitsComposition(logins)
+    units_composition_obj.prepare_data()
+    units_composition_obj.write(sys.stdout, ctx.obj['FLAGS'], output_format)
+    log_and_print('Search logins command is done', print_need=False, level=INFO)
+
+
+@cli.command()
+@user_argument
+@agent_password_argument
 @click.option('-l', "--login", prompt="Login", help="Provide login")
 @click.option('-n', "--name", prompt="Name", help='name', default='default')
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
-def get(user, password, login, name, db):
+@click.option('--fuzzy', is_flag=True,
+              help='Take the nearest login and name if there is no exact match')
+@db_argument
+def get(user, password, login, name, fuzzy, db):
     """
     get password by login command
     """
-    manager_obj = SQLAlchemyManager(db, user)
+    if password is None:
+        response = agent_request('get', user, db, check=False, login=login, name=name)
+        if response['status'] != 'ok' and not response.get('missing'):
+            log_and_print(f'Agent error: {response["message"]}', level=ERROR)
+            exit(-1)
+        if response['status'] != 'ok':
+            suggestions = agent_request('suggest', user, db, login=login, name=name)['suggestions']
+            if not fuzzy or not suggestions:
+                log_not_exists(login, name, suggestions)
+                return
+            login, name = suggestions[0]
+            log_and_print(f'Using login "{login}" with "{name}" name', level=INFO)
+            response = agent_request('get', user, db, login=login, name=name)
+        count_units(1)
+        copy_to_clipboard(response['password'])
+        log_and_print('Password is placed on the clipboard', level=INFO)
+        return
+
+    unit_obj = get_reader(db, user) or get_manager(db, user).unit_obj
+
+    if not unit_obj.check_login(login, name):
+        suggestions = unit_obj.suggest(login, name)
+        if not fuzzy or not suggestions:
+            log_not_exists(login, name, suggestions)
+            return
+        login, name = suggestions[0]
+        log_and_print(f'Using login "{login}" with "{name}" name', level=INFO)
+    count_units(1)
+    copy_to_clipboard(unit_obj.get_password(user, password, login, name))
+    log_and_print(f'Password is placed on the clipboard', level=INFO)
+
+
+def parse_mapping(ctx, param, value):
+    """
+    Check --map options VAR=login:name, returns a list of (VAR, login, name)
+    """
+    mappings = []
+    for mapping in value:
+        var, _, unit_ = mapping.partition('=')
+        login, separator, name = unit_.rpartition(':')
+        if not separator:
+            login, name = unit_, 'default'
+        if not re.match('^[A-Za-z_][A-Za-z0-9_]*$', var) or not login or not name:
+            raise click.BadParameter(f'"{mapping}", use VAR=login:name or VAR=login')
+        mappings.append((var, login, name))
+    return mappings
+
+
+@cli.command(name='exec')
+@user_argument
+@agent_password_argument
+@click.option('-m', '--map', 'mappings', multiple=True, required=True, callback=parse_mapping,
+              help='VAR=login:name, put the password of login with name into the environment '
+                   'variable VAR, name is "default" if skipped; repeat for every password')
+@click.argument('command', nargs=-1, required=True, type=click.UNPROCESSED)
+@click.pass_context
+@db_argument
+def exec_command(ctx, user, password, mappings, command, db):
+    """
+    run COMMAND with passwords in its environment, all of them are read at once:
 
-    if manager_obj.unit_obj.check_login(login, name):
-        pyperclip.copy(manager_obj.unit_obj
-                       .get_password(user, password, login, name))
-        log_and_print(f'Password is placed on the clipboard', level=INFO)
+    \b
+    $ pwdone exec -m DB_PASSWORD=admin:db -m API_TOKEN=ci:github -- ./deploy.sh
+    """
+    pairs = sorted({(login, name) for _, login, name in mappings})
+    if password is None:
+        response = agent_request('passwords', user, db, pairs=pairs)
+        passwords = {(login, name): password_ for login, name, password_ in response['passwords']}
+        unit_obj = None
     else:
-        log_and_print(f'login "{login}" with "{name}"'
-                      f' name not exists', level=ERROR)
+        unit_obj = get_reader(db, user) or get_manager(db, user).unit_obj
+        passwords = unit_obj.get_passwords(user, password, pairs)
+
+    missing = [pair for pair in pairs if pair not in passwords]
+    if missing:
+        for login, name in missing:
+            if unit_obj is None:
+                response = agent_request('suggest', user, db, login=login, name=name)
+                suggestions = response['suggestions']
+            else:
+                suggestions = unit_obj.suggest(login, name)
+            log_not_exists(login, name, suggestions)
+        exit(-1)
+    count_units(len(passwords))
+
+    env = dict(os.environ)
+    env.update((var, passwords[(login, name)]) for var, login, name in mappings)
+    log_and_print(f'Exec command with {", ".join(var for var, _, _ in mappings)}',
+                  print_need=False, level=INFO)
+    try:
+        returncode = subprocess.run(list(command), env=env).returncode
+    except OSError as exc:
+        log_and_print(f'Command "{command[0]}" can not be run: {exc}', level=ERROR)
+        exit(-1)
+    ctx.exit(returncode)
 
 
 @cli.command()
@@ -238,19 +590,19 @@ def get(user, password, login, name, db):
 @password_argument
 @click.option('-l', "--login", prompt="Login", help="Provide login")
 @click.option('-n', "--name", prompt="Name", help='name', default='default')
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@db_argument
 def delete(user, password, login, name, db):
     """
     delete login and password command
     """
-    manager_obj = SQLAlchemyManager(db, user)
+    manager_obj = get_manager(db, user)
 
     if manager_obj.unit_obj.check_login(login, name):
         manager_obj.unit_obj.delete_unit(login, name)
+        count_units(1)
         log_and_print(f'Login "{login}" deleted', level=INFO)
     else:
-        log_and_print(f'login "{login}" with "{name}"'
-                      f' name not exists', level=ERROR)
+        log_not_exists(login, name, manager_obj.unit_obj.suggest(login, name))
 
 
 @cli.command()
@@ -263,12 +615,12 @@ def delete(user, password, login, name, db):
 @click.option('-c', "--category", help='"default" or skip for default category, optional',
               default=None, required=False)
 @click.option('-ur', "--url", help='url, optional', default=None, required=False)
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@db_argument
 def add(user, password, login, password_for_login, category, url, name, db):
     """
     add login and password command
     """
-    manager_obj = SQLAlchemyManager(db, user)
+    manager_obj = get_manager(db, user)
 
     if manager_obj.unit_obj.check_login(login, name):
         log_and_print(f'login "{login}" with "{name}"'
@@ -277,6 +629,7 @@ def add(user, password, login, password_for_login, category, url, name, db):
         category = 'default' if category is None else category
         manager_obj.unit_obj\
             .add_unit(user, password, login, password_for_login, name, category, url)
+        count_units(1)
         log_and_print(f'Login "{login}" added', level=INFO)
 
 
@@ -295,18 +648,17 @@ def add(user, password, login, password_for_login, category, url, name, db):
 @click.option('-nc', "--new-category", help='"default" or skip for old category, optional',
               default=None, required=False)
 @click.option('-ur', "--url", help='url, optional', default=None, required=False)
-@click.option("--db", default=FILE_DB, required=False, hidden=True)
+@db_argument
 def update(user, password, login, name,
            new_login, new_name, password_for_login, new_category, url, db):
     """Update unit"""
 
-    manager_obj = SQLAlchemyManager(db, user)
+    manager_obj = get_manager(db, user)
 
     new_login = login if new_login is None else new_login
 
     if not manager_obj.unit_obj.check_login(login, name):
-        log_and_print(f'login "{login}" with "{name}"'
-                      f' name not exists', level=ERROR)
+        log_not_exists(login, name, manager_obj.unit_obj.suggest(login, name))
     elif manager_obj.unit_obj.check_login(new_login, new_name) \
             and (login != new_login or name != new_name):
         log_and_print(f'login "{login}" with "{name}"'
@@ -317,8 +669,169 @@ def update(user, password, login, name,
             .update_unit(user, password, login, name,
                          new_login, password_for_login,
                          new_category, url, new_name)
+        count_units(1)
         log_and_print(f'Login "{login}" updated', level=INFO)
 
 
+IMPORT_FORMATS = ['csv', 'json', 'jsonl', 'pwdone']
+
+
+@cli.command(name='import')
+@user_argument
+@password_argument
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('-f', '--format', 'file_format', type=click.Choice(IMPORT_FORMATS),
+              default=None, help='File format, by file extension if skipped')
+@click.option('-ep', '--export-password', default=None, hide_input=True,
+              help='Password of the pwdone export file, asked if needed')
+@click.option('-b', '--batch-size', type=click.IntRange(min=1), default=IMPORT_BATCH_SIZE,
+              help='Number of logins per transaction, optional')
+@db_argument
+def import_logins(user, password, file, file_format, export_password, batch_size, db):
+    """
+    import logins from csv (pwdone, browser exports), json, json lines
+    or pwdone export file
+    """
+    if file_format is None:
+        file_format = os.path.splitext(file)[1].lstrip('.').lower()
+        if file_format not in IMPORT_FORMATS:
+            log_and_print(f'Unknown format of file "{file}", use --format', level=ERROR)
+            exit(-1)
+    if file_format == 'pwdone' and export_password is None:
+        export_password = click.prompt('Export password', hide_input=True)
+
+    manager_obj = get_manager(db, user)
+    start = time.perf_counter()
+    with open(file, encoding='utf-8-sig', newline='') as stream:
+        units_reader = UnitsReader(stream, file_format, export_password)
+        try:
+            added = manager_obj.unit_obj.import_units(user, password, units_reader, batch_size)
+        except ValueError as exc:
+            log_and_print(f'Import of "{file}" failed: {exc}', level=ERROR)
+            exit(-1)
+    elapsed = time.perf_counter() - start
+    count_units(added)
+
+    total = units_reader.count
+    log_and_print(f'Imported {added} logins in {elapsed:.2f} s '
+                  f'({total / elapsed if elapsed else 0:.0f} rows/s), '
+                  f'skipped: {total - added} existing, '
+                  f'{units_reader.invalid} without login or password', level=INFO)
+
+
+@cli.command()
+@user_argument
+@password_argument
+@click.argument('file', type=click.Path(dir_okay=False, writable=True))
+@click.option('-ep', '--export-password', prompt=True, hide_input=True,
+              confirmation_prompt=True, help='Password to encrypt the export file')
+@db_argument
+def export(user, password, file, export_password, db):
+    """
+    export all logins to an encrypted file, restore with "pwdone import FILE.pwdone"
+    """
+    manager_obj = get_manager(db, user)
+    start = time.perf_counter()
+    # файл заменяется только целиком записанным экспортом
+    with atomic_write(file) as stream, ExportWriter(stream, export_password) as export_writer:
+        for unit_ in manager_obj.unit_obj.iter_units(user, password):
+            export_writer.write(unit_)
+    elapsed = time.perf_counter() - start
+    count_units(export_writer.count)
+
+    log_and_print(f'Exported {export_writer.count} logins to "{file}" in {elapsed:.2f} s',
+                  level=INFO)
+
+
+@cli.command()
+@click.option('--stop', is_flag=True, is_eager=True, expose_value=False,
+              callback=stop_agent, help='Stop the running agent')
+@user_argument
+@password_argument
+@db_argument
+def agent(user, password, db):
+    """
+    keep the vault unlocked in the background for the session time
+    (run as "pwdone agent &"), get and show use it without password
+    """
+    if not AGENT_SUPPORTED:
+        log_and_print('Agent is not supported on this platform', level=ERROR)
+        exit(-1)
+    if AgentClient().request('ping') is not None:
+        log_and_print('Agent is already running', level=ERROR)
+        exit(-1)
+
+    try:
+        agent_obj = AgentServer(get_manager(db, user), password)
+    except (OSError, ValueError) as exc:
+        log_and_print(f'Agent can not start: {exc}', level=ERROR)
+        exit(-1)
+    log_and_print(f'Agent for user "{user}" started', level=INFO)
+    agent_obj.serve_forever()
+    log_and_print(f'Agent for user "{user}" stopped', level=INFO)
+
+
+@cli.command()
+@click.option('--host', default=API_HOST, help=f'Address to listen on, default {API_HOST}')
+@click.option('--port', type=click.IntRange(0, 65535), default=API_PORT,
+              help=f'Port to listen on, default {API_PORT}')
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False), default=None,
+              help='Listen on the unix socket SOCKET instead of host and port, optional')
+@click.option('--pool-size', type=click.IntRange(min=1), default=API_POOL_SIZE,
+              help=f'Number of DB connections in the pool, default {API_POOL_SIZE}')
+@db_argument
+def serve(host, port, socket_path, pool_size, db):
+    """
+    serve the local HTTP/JSON API for scripts and tools, every request
+    is authenticated by the user's password (HTTP Basic), see README
+    """
+    from api_manager.models import ApiServer
+
+    if socket_path and not AGENT_SUPPORTED:
+        log_and_print('Unix sockets are not supported on this platform', level=ERROR)
+        exit(-1)
+    if not socket_path and host not in ('127.0.0.1', 'localhost', '::1'):
+        # пароли передаются без TLS
+        log_and_print(f'API listens on "{host}", passwords are sent unencrypted', level=WARNING)
+    try:
+        server_obj = ApiServer(db, host, port, socket_path, pool_size)
+    except (OSError, ValueError) as exc:
+        log_and_print(f'API server can not start: {exc}', level=ERROR)
+        exit(-1)
+    address = server_obj.address if socket_path else 'http://{}:{}'.format(*server_obj.address)
+    log_and_print(f'API server started on {address}', level=INFO)
+    try:
+        server_obj.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    log_and_print('API server stopped', level=INFO)
+
+
+@cli.command()
+@click.option('--field', type=click.Choice(FIELDS),
+              default='duration_ms', help='Field of the operations log, default "duration_ms"')
+@click.option('--command', default=None, help='Only this command, optional')
+@click.option('--file', 'log_file', type=click.Path(exists=True, dir_okay=False), multiple=True,
+              help='Operations log file, repeat for several; '
+                   'by default the log and its rotated copies')
+@click.option('-f', '--format', 'output_format', type=click.Choice(['table', 'json']),
+              default='table', help='"json" prints json for scripts, default "table"')
+def stats(field, command, log_file, output_format):
+    """
+    percentiles of command time (or another field) from the operations log,
+    written with "pwdone --operations-log"; works offline, without the DB
+    """
+    paths = log_file or get_log_files(OPERATIONS_LOG_PATH)
+    if not paths:
+        log_and_print(f'No operations log "{OPERATIONS_LOG_PATH}", '
+                      'run commands with --operations-log', level=ERROR)
+        exit(-1)
+    stats_ = get_stats(iter_operations(paths), field, command)
+    if output_format == 'json':
+        print(json.dumps(stats_, indent=2))
+    else:
+        print(format_stats(stats_, field))
+
+
 if __name__ == '__main__':
     cli()
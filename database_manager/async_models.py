@@ -0,0 +1,152 @@
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+from database_manager.models import REGISTRY, UnitManager, UserManager
+from encryption_manager.models import get_secret_obj
+from settings import (ASYNC_DB_THREADS, FILE_DB, PAGE_SIZE, SEARCH_LIMIT,
+                      SUGGEST_LIMIT)
+
+# общий пул для шифрования всех менеджеров процесса, создается при первом обращении
+_CRYPTO_EXECUTOR = None
+
+
+def get_crypto_executor():
+    """Пул потоков для вывода ключей и AES"""
+    global _CRYPTO_EXECUTOR
+    if _CRYPTO_EXECUTOR is None:
+        _CRYPTO_EXECUTOR = ThreadPoolExecutor(thread_name_prefix='pwdone-crypto')
+    return _CRYPTO_EXECUTOR
+
+
+class AsyncSQLAlchemyManager:
+    """Асинхронный менеджер БД для сервисов на asyncio
+
+    IN:
+        Файл БД и пользователь, как у SQLAlchemyManager
+    OUT:
+        Корутины с методами UserManager и UnitManager. Запросы выполняются в db_threads
+        потоках, у каждого потока своя сессия: Session и соединение sqlite используются
+        и закрываются только в своем потоке. Шифрование - в отдельном пуле,
+        поэтому цикл событий не блокируется ни БД, ни AES
+    """
+
+    def __init__(self, file_db=FILE_DB, user=None, db_threads=ASYNC_DB_THREADS,
+                 crypto_executor=None):
+        self._user = user
+        # engine и проверка схемы - сразу, как у SQLAlchemyManager: одна проверка на процесс
+        self._session_maker = sessionmaker(bind=REGISTRY.get_engine(file_db))
+        # по потоку на сессию, запросы раздаются потокам по очереди
+        self._db_threads = [{'executor': ThreadPoolExecutor(1, thread_name_prefix='pwdone-db'),
+                             'session': None} for _ in range(db_threads)]
+        self._next_db_thread = itertools.cycle(self._db_threads)
+        self._crypto_executor = crypto_executor or get_crypto_executor()
+
+    @property
+    def user(self):
+        return self._user
+
+    def _call(self, db_thread, manager, method, *args):
+        """Вызов метода UserManager или UnitManager в потоке БД db_thread"""
+        if db_thread['session'] is None:
+            db_thread['session'] = self._session_maker()
+            db_thread['user_obj'] = UserManager(db_thread['session'], self._user)
+            db_thread['unit_obj'] = UnitManager(db_thread['session'], self._user)
+        return getattr(db_thread[manager], method)(*args)
+
+    async def _run(self, executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(func, *args))
+
+    async def _run_db(self, manager, method, *args):
+        db_thread = next(self._next_db_thread)
+        return await self._run(db_thread['executor'], self._call, db_thread, manager, method, *args)
+
+    async def _run_user(self, method, *args):
+        return await self._run_db('user_obj', method, *args)
+
+    async def _run_unit(self, method, *args):
+        return await self._run_db('unit_obj', method, *args)
+
+    async def _get_secret_obj(self, user, password):
+        return await self._run(self._crypto_executor, get_secret_obj, user, password)
+
+    async def check_user(self):
+        """Проверка существования пользователя"""
+        return await self._run_user('check_user')
+
+    async def check_user_password(self, password):
+        """Проверка пароля пользователя"""
+        return await self._run_user('check_user_password', password)
+
+    async def all_users(self):
+        """Список пользователей"""
+        return await self._run_user('all_users')
+
+    async def check_login(self, login, name):
+        """Проверка существования логина"""
+        return await self._run_unit('check_login', login, name)
+
+    async def get_logins(self, category=None, limit=None, offset=0):
+        """Выдача units, как UnitManager.get_logins"""
+        return await self._run_unit('get_logins', category, limit, offset)
+
+    async def get_page(self, category=None, cursor=None, limit=PAGE_SIZE):
+        """Страница units и токен следующей, как UnitManager.get_page"""
+        return await self._run_unit('get_page', category, cursor, limit)
+
+    async def search(self, query, category=None, limit=SEARCH_LIMIT):
+        """Поиск units, как UnitManager.search"""
+        return await self._run_unit('search', query, category, limit)
+
+    async def suggest(self, login, name=None, limit=SUGGEST_LIMIT):
+        """Ближайшие units, как UnitManager.suggest"""
+        return await self._run_unit('suggest', login, name, limit)
+
+    async def get_password(self, user, password, login, name):
+        """Пароль unit, None если unit нет"""
+        encrypted_password = await self._run_unit('get_encrypted_password', login, name)
+        if encrypted_password is None:
+            return None
+        secret_obj = await self._get_secret_obj(user, password)
+        return await self._run(self._crypto_executor, secret_obj.decrypt, encrypted_password)
+
+    async def add_unit(self, user, password, login, password_for_login, name='default',
+                       category='default', url=None):
+        """Добавление unit, пароль шифруется вне потоков БД"""
+        secret_obj = await self._get_secret_obj(user, password)
+        encrypted_password = await self._run(self._crypto_executor, secret_obj.encrypt,
+                                             password_for_login)
+        await self._run_unit('add_encrypted_unit', login, encrypted_password, name, category, url)
+
+    async def update_unit(self, user, password, login, name, new_login=None,
+                          password_for_login=None, new_category=None, url=None, new_name=None):
+        """Обновление unit, как UnitManager.update_unit; пароль шифруется вне потоков БД"""
+        encrypted_password = None
+        if password_for_login:
+            secret_obj = await self._get_secret_obj(user, password)
+            encrypted_password = await self._run(self._crypto_executor, secret_obj.encrypt,
+                                                 password_for_login)
+        await self._run_unit('update_encrypted_unit', login, name, new_login, encrypted_password,
+                             new_category, url, new_name)
+
+    async def delete_unit(self, login, name):
+        """Удаление unit"""
+        await self._run_unit('delete_unit', login, name)
+
+    async def close(self):
+        """Закрываем сессии в их потоках и останавливаем потоки БД"""
+        for db_thread in self._db_threads:
+            if db_thread['session'] is not None:
+                await self._run(db_thread['executor'], db_thread['session'].close)
+                db_thread['session'] = None
+            db_thread['executor'].shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
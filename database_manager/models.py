@@ -1,16 +1,36 @@
-from logging import INFO
+import os
+from logging import INFO, WARNING
 
-from sqlalchemy import (Column, ForeignKey, Integer, String, UniqueConstraint,
-                        create_engine)
+from sqlalchemy import (Column, ForeignKey, Index, Integer, String,
+                        UniqueConstraint, column, create_engine, event, func,
+                        or_, table, text, tuple_)
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
-
-from encryption_manager.models import get_hash, get_secret_obj
+from sqlalchemy.orm import contains_eager, relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from database_manager.search import (SQL_FTS_CREATE, SQL_FTS_EXISTS,
+                                     SQL_TRIGRAMS_TRIGGERS, make_fts_query,
+                                     make_like_patterns, make_suggest_query,
+                                     make_trigrams, rank_suggestions)
+from database_manager.sqlite_reader import (MAX_SQL_PARAMETERS,
+                                            make_pragma_statements)
+from database_manager.statements import StatementCounter, watch_engine
+from encryption_manager.models import (decrypt_many, encrypt_many, get_hash,
+                                       get_secret_obj, reencrypt)
 from log_manager.models import log_and_print
-from settings import FILE_DB
+from profile_manager.models import PROFILER, span
+from settings import (CRYPTO_WORKERS, EXPORT_CHUNK_SIZE, FILE_DB,
+                      IMPORT_BATCH_SIZE, PAGE_SIZE, SEARCH_LIMIT, SQLITE_BEGIN,
+                      SQLITE_PRAGMAS, SUGGEST_LIMIT)
+from units_manager.models import decode_cursor, encode_cursor
+from units_manager.transfer import batched
 
 Base = declarative_base()
 
+# полнотекстовый индекс units (миграция 3), в моделях не описан: это виртуальная таблица FTS5
+UNITS_FTS = table('units_fts', column('rowid'))
+
 
 class User(Base):
     """Определение таблицы users"""
@@ -41,6 +61,9 @@ class Unit(Base):
     login_name = UniqueConstraint(user_id, login, name)
     category = relationship("Category", back_populates="units")
     user = relationship("User", back_populates="units")
+    __table_args__ = (
+        Index('ix_units_category_id', 'category_id'),
+    )
 
     def __init__(self, login, password, url=None, name='default'):
         self.login = login
@@ -62,6 +85,131 @@ class Category(Base):
         self.category = category
 
 
+class UnitTrigram(Base):
+    """Определение таблицы unit_trigrams: триграммы login и name unit для подсказок"""
+    __tablename__ = 'unit_trigrams'
+    unit_id = Column(ForeignKey('units.id', ondelete="CASCADE"), primary_key=True)
+    trigram = Column(String, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    __table_args__ = (
+        # подсказки ищутся по триграммам в рамках пользователя, unit_id берется из индекса
+        Index('ix_unit_trigrams_user_trigram', 'user_id', 'trigram', 'unit_id'),
+    )
+
+
+class SchemaVersion(Base):
+    """Определение таблицы schema_version, по строке на примененную миграцию"""
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True)
+
+    def __init__(self, version):
+        self.version = version
+
+
+def migration_create_tables(connection):
+    """Миграция 1: создание таблиц users, units, categories"""
+    Base.metadata.create_all(connection)
+    # триггеры таблиц из моделей создаются здесь же, их миграция для новой БД - повтор
+    for statement in SQL_TRIGRAMS_TRIGGERS:
+        connection.execute(text(statement))
+
+
+def migration_add_unit_indexes(connection):
+    """
+    Миграция 2: индекс units по category_id. Поиск unit по (user_id, login, name)
+    идет по индексу UNIQUE login_name (sqlite_autoindex_units_1), повторяющий его
+    ix_units_user_login_name удаляется, если был создан
+    """
+    connection.execute(text('DROP INDEX IF EXISTS ix_units_user_login_name'))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_units_category_id ON units (category_id)'))
+
+
+def migration_add_units_fts(connection):
+    """
+    Миграция 3: полнотекстовый индекс units_fts (FTS5) и триггеры, которые держат
+    его в соответствии с units. Если sqlite собран без FTS5, индекс не создается
+    и поиск работает через LIKE
+    """
+    try:
+        connection.execute(text(SQL_FTS_CREATE[0]))
+    except OperationalError as exc:
+        log_and_print(f'Full-text search is not available: {exc}', print_need=False, level=WARNING)
+        return
+    for statement in SQL_FTS_CREATE[1:]:
+        connection.execute(text(statement))
+
+
+def make_trigram_rows(units):
+    """Строки unit_trigrams для units - кортежей (id, user_id, login, name)"""
+    return [{'unit_id': unit_id, 'user_id': user_id, 'trigram': trigram}
+            for unit_id, user_id, login, name in units
+            for trigram in make_trigrams(login, name)]
+
+
+def migration_add_unit_trigrams(connection):
+    """Миграция 4: индекс триграмм login и name (unit_trigrams) для подсказок при промахе"""
+    UnitTrigram.__table__.create(connection, checkfirst=True)
+    for statement in SQL_TRIGRAMS_TRIGGERS:
+        connection.execute(text(statement))
+    connection.execute(UnitTrigram.__table__.delete())
+    units = connection.execute(text('SELECT id, user_id, login, name FROM units')).fetchall()
+    for batch in batched(units, IMPORT_BATCH_SIZE):
+        rows = make_trigram_rows(batch)
+        if rows:
+            connection.execute(UnitTrigram.__table__.insert(), rows)
+
+
+# Миграции применяются по порядку, номер миграции - ее позиция в списке начиная с 1.
+# Миграции должны быть идемпотентными: для пустой БД первая миграция создает
+# таблицы уже по актуальным моделям
+MIGRATIONS = [
+    migration_create_tables,
+    migration_add_unit_indexes,
+    migration_add_units_fts,
+    migration_add_unit_trigrams,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection):
+    """Текущая версия схемы БД, 0 для пустой БД или БД без schema_version"""
+    try:
+        return connection.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+    except OperationalError:
+        return 0
+
+
+def apply_migrations(connection, version):
+    """Применяем миграции, начиная со следующей за version"""
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(connection)
+        connection.execute(SchemaVersion.__table__.insert().values(version=number))
+        log_and_print(f'Database schema upgraded to version {number}',
+                      print_need=False, level=INFO)
+
+
+def upgrade_schema(engine):
+    """
+    Приводим схему БД к SCHEMA_VERSION. Для актуальной БД это одно чтение версии,
+    DDL выполняется только для пустой или устаревшей БД. Возвращает True, если
+    миграции применялись
+    """
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version >= SCHEMA_VERSION:
+        return False
+
+    with engine.begin() as connection:
+        # драйвер не начинает транзакцию перед DDL: миграции - в одной транзакции,
+        # параллельный процесс ждет ее окончания
+        connection.execute(text('BEGIN IMMEDIATE'))
+        # перечитываем версию: схему мог обновить параллельный процесс
+        apply_migrations(connection, get_schema_version(connection))
+    return True
+
+
 class UserManager:
     """Класс работы с user"""
     _session = None
@@ -95,6 +243,10 @@ class UserManager:
             return True
         return False
 
+    def get_password_hash(self):
+        """Хеш пароля пользователя из БД, None если пользователя нет"""
+        return self._session.query(User.password).filter(User.user == self._user).scalar()
+
     def add_user(self, password):
         """
         add user to BD
@@ -105,32 +257,36 @@ class UserManager:
         self._session.commit()
         self._session.close()
 
-    def update_user(self, db, password, new_user, new_password=None):
+    def update_user(self, db, password, new_user, new_password=None, workers=CRYPTO_WORKERS):
         """
         update username (and password) in BD
+
+        Все units пользователя читаются одним запросом, ключи выводятся один раз,
+        перешифрование идет в памяти (в workers процессах), запись - одним bulk UPDATE
+        в той же транзакции, что и обновление пользователя. Параметр db оставлен
+        для совместимости
         """
         if not new_password:
             new_password = password
-        new_manager_obj = SQLAlchemyManager(db, self._user)
-        logins = new_manager_obj.unit_obj.get_logins()
-        logins_list = logins.get('logins')
-        name_list = logins.get('name')
-        for i in range(len(logins_list)):
-            password_for_login = new_manager_obj.unit_obj.get_password(self._user, password, logins_list[i],
-                                                                       name_list[i])
-            new_manager_obj.unit_obj \
-                .update_unit(new_user, new_password,
-                             logins_list[i], password_for_login=password_for_login, name=name_list[i])
-
-        if new_password:
-            secret_password = new_user + new_password
-        else:
-            secret_password = new_user + password
-        pass_hash = get_hash(secret_password.encode("utf-8"))
-        self._session.query(User) \
-            .filter(User.user == self._user).update({"user": new_user, "password": pass_hash})
-
-        self._session.commit()
+        try:
+            user_id = self._session.query(User.id).filter(User.user == self._user).scalar()
+            units = self._session.query(Unit.id, Unit.password)\
+                .filter(Unit.user_id == user_id).all()
+            new_passwords = reencrypt([unit_.password for unit_ in units],
+                                      get_secret_obj(self._user, password),
+                                      get_secret_obj(new_user, new_password),
+                                      workers)
+            self._session.bulk_update_mappings(
+                Unit, [{'id': unit_.id, 'password': new_password_for_login}
+                       for unit_, new_password_for_login in zip(units, new_passwords)])
+
+            pass_hash = get_hash((new_user + new_password).encode("utf-8"))
+            self._session.query(User) \
+                .filter(User.id == user_id).update({"user": new_user, "password": pass_hash})
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
         log_and_print(f'User "{self._user}" updated. New username is "{new_user}"',
                       level=INFO)
 
@@ -138,11 +294,12 @@ class UserManager:
         """
         delete user from BD
         """
+        user_id = self._session.query(User.id).filter(User.user == self._user).scalar()
         self._session.query(Unit) \
-            .filter(Unit.user.has(User.user == self._user))\
+            .filter(Unit.user_id == user_id)\
             .delete(synchronize_session='fetch')
         self._session.query(User) \
-            .filter(User.user == self._user).delete()
+            .filter(User.id == user_id).delete()
         self._session.commit()
 
     def all_users(self):
@@ -161,49 +318,118 @@ class UnitManager:
     """Класс работы с unit"""
     _session = None
     _user = None
+    _user_id = None
+    _fts = None
 
     def __init__(self, session, user):
         self._session = session
         self._user = user
 
-    def get_logins(self, category=None):
-        """Выдача units"""
-
-        def make_logins_obj(units_list):
-            """Выдача логинов, из списка"""
-            units_obj = {
-                "logins": [],
-                "category": [],
-                "url": [],
-                "name": []
-            }
-
-            if units_list:
-                for unit_ in units_list:
-                    units_obj['logins'].append(unit_.login)
-                    units_obj['category']\
-                        .append(unit_.category.category if unit_.category.category else 'default')
-                    units_obj['url']\
-                        .append(unit_.url if unit_.url else '')
-                    units_obj['name']\
-                        .append(unit_.name if unit_.name else '')
-            return units_obj
-
+    @staticmethod
+    def _make_logins_obj(units_list):
+        """Выдача логинов, из списка"""
+        units_obj = {
+            "logins": [],
+            "category": [],
+            "url": [],
+            "name": []
+        }
+
+        if units_list:
+            for unit_ in units_list:
+                units_obj['logins'].append(unit_.login)
+                units_obj['category']\
+                    .append(unit_.category.category if unit_.category else 'default')
+                units_obj['url']\
+                    .append(unit_.url if unit_.url else '')
+                units_obj['name']\
+                    .append(unit_.name if unit_.name else '')
+        return units_obj
+
+    def _query_logins(self, category=None):
+        """Запрос units пользователя вместе с категориями"""
+        # категории подгружаются тем же запросом, без отдельного запроса на каждый unit
+        query = self._session.query(Unit)\
+            .outerjoin(Unit.category)\
+            .options(contains_eager(Unit.category))\
+            .filter(Unit.user_id == self.get_user_id())
         if category:
-            units = self._session.query(Unit)\
-                .filter(Unit.user.has(User.user == self._user)
-                        & Unit.category.has(Category.category == category)).all()
-            return make_logins_obj(units)
+            query = query.filter(Category.category == category)
+        return query
+
+    def has_fts(self):
+        """Есть ли в БД полнотекстовый индекс units_fts"""
+        if self._fts is None:
+            self._fts = self._session.execute(text(SQL_FTS_EXISTS)).first() is not None
+        return self._fts
+
+    def search(self, query, category=None, limit=SEARCH_LIMIT):
+        """
+        Поиск units по словам из query в login, name, url и category: каждое слово -
+        префикс слова в полях. Выдача как у get_logins, в порядке (login, name).
+        Без FTS5 - поиск подстрок через LIKE по всем units пользователя
+        """
+        if not make_fts_query(query):
+            return self._make_logins_obj([])
+        units_query = self._query_logins(category)
+        if self.has_fts():
+            units_query = units_query\
+                .join(UNITS_FTS, UNITS_FTS.c.rowid == Unit.id)\
+                .filter(text('units_fts MATCH :fts_query'))\
+                .params(fts_query=make_fts_query(query))
         else:
-            units = self._session.query(Unit)\
-                .filter(Unit.user.has(User.user == self._user)).all()
-            return make_logins_obj(units)
+            for pattern in make_like_patterns(query):
+                units_query = units_query.filter(or_(
+                    *(field.like(pattern, escape='\\')
+                      for field in (Unit.login, Unit.name, Unit.url, Category.category))))
+        return self._make_logins_obj(units_query.order_by(Unit.login, Unit.name).limit(limit).all())
+
+    def get_logins(self, category=None, limit=None, offset=0):
+        """Выдача units, limit и offset - страница выдачи в порядке добавления"""
+        query = self._query_logins(category).order_by(Unit.id)
+        if limit is not None or offset:
+            query = query.limit(limit).offset(offset)
+        return self._make_logins_obj(query.all())
+
+    def get_page(self, category=None, cursor=None, limit=PAGE_SIZE):
+        """
+        Страница units в порядке (login, name) и токен следующей страницы (None на последней).
+        Страница ищется по индексу от ключа из cursor, без OFFSET: время выдачи
+        не зависит от номера страницы и размера хранилища
+        """
+        query = self._query_logins(category)
+        if cursor:
+            query = query.filter(tuple_(Unit.login, Unit.name) > tuple_(*decode_cursor(cursor)))
+        # лишний unit - признак того, что есть следующая страница
+        units_list = query.order_by(Unit.login, Unit.name).limit(limit + 1).all()
+        next_cursor = None
+        if len(units_list) > limit:
+            units_list = units_list[:limit]
+            next_cursor = encode_cursor(units_list[-1].login, units_list[-1].name)
+        return self._make_logins_obj(units_list), next_cursor
+
+    def get_user_id(self):
+        """
+        id пользователя: по нему unit ищется через индекс (user_id, login, name).
+        Запрашивается один раз на менеджер
+        """
+        if self._user_id is None:
+            self._user_id = self._session.query(User.id).filter(User.user == self._user).scalar()
+        return self._user_id
+
+    def _query_unit(self, login, name):
+        """Запрос unit пользователя по login и name"""
+        return self._session.query(Unit)\
+            .filter((Unit.user_id == self.get_user_id()) & (Unit.login == login)
+                    & (Unit.name == name))
 
     def check_login(self, login, name):
         """Проверка существования логина"""
-        return self._session.query(Unit)\
-            .filter(Unit.user.has(User.user == self._user) & (Unit.login == login)
-                    & (Unit.name == name)).all()
+        return self._query_unit(login, name).all()
+
+    def get_unit(self, login, name):
+        """Выдаем unit по login и name, None если его нет"""
+        return self._query_unit(login, name).first()
 
     def get_category(self, category):
         """Выдаем категорию, если есть, иначе создаем"""
@@ -222,54 +448,301 @@ class UnitManager:
                  category='default', url=None):
         """Добавление unit"""
         secret_obj = get_secret_obj(user, password)
-        unit_for_add = Unit(login, secret_obj.encrypt(password_for_login), url, name)
+        with span('aes'):
+            encrypted_password = secret_obj.encrypt(password_for_login)
+        self.add_encrypted_unit(login, encrypted_password, name, category, url)
+
+    def add_encrypted_unit(self, login, encrypted_password, name='default', category='default',
+                           url=None):
+        """Добавление unit с уже зашифрованным паролем"""
+        # категория создается через INSERT OR IGNORE: первая запись открывает транзакцию
+        # (BEGIN IMMEDIATE), поэтому другой процесс не вставит ту же категорию между
+        # проверкой и вставкой. unit вставляется сразу с категорией, без UPDATE после
+        self._session.execute(Category.__table__.insert().prefix_with('OR IGNORE')
+                              .values(category=category))
+        unit_for_add = Unit(login, encrypted_password, url, name)
+        unit_for_add.user_id = self.get_user_id()
+        unit_for_add.category_id = self._session.query(Category.id)\
+            .filter(Category.category == category).scalar()
         self._session.add(unit_for_add)
-        unit_for_add.category = self.get_category(category)
-        unit_for_add.user = self.get_user()
+        self._session.flush()
+        self._add_trigrams([(unit_for_add.id, unit_for_add.user_id, login, name)])
         self._session.commit()
 
+    def _add_trigrams(self, units):
+        """Триграммы units - запроса или списка (id, user_id, login, name) - в индекс подсказок"""
+        rows = make_trigram_rows(units)
+        if rows:
+            self._session.execute(UnitTrigram.__table__.insert().prefix_with('OR IGNORE'), rows)
+
+    def suggest(self, login, name=None, limit=SUGGEST_LIMIT):
+        """
+        Ближайшие к login и name units пользователя, список (login, name).
+        Кандидаты - units с наибольшим числом общих редких триграмм, по индексу,
+        без обхода всех units; кандидаты ранжируются по сходству строк
+        """
+        trigrams = make_trigrams(login, name)
+        if not trigrams:
+            return []
+        sql, parameters = make_suggest_query(self.get_user_id(), trigrams)
+        units_list = self._session.execute(text(sql), parameters).fetchall()
+        return rank_suggestions(login, name, units_list, limit)
+
+    def _get_category_id(self, category, categories):
+        """id категории с кешем categories, отсутствующая категория создается"""
+        if category not in categories:
+            category_id = self._session.query(Category.id)\
+                .filter(Category.category == category).scalar()
+            if category_id is None:
+                category_id = self._session.execute(
+                    Category.__table__.insert().values(category=category)).inserted_primary_key[0]
+            categories[category] = category_id
+        return categories[category]
+
+    def count_units(self):
+        """Количество units пользователя"""
+        return self._session.query(Unit.id).filter(Unit.user_id == self.get_user_id()).count()
+
+    def import_units(self, user, password, units, batch_size=IMPORT_BATCH_SIZE):
+        """
+        Массовое добавление units из итератора словарей (login, password, name, category, url).
+        Ключ выводится один раз, категории кешируются, units шифруются и вставляются
+        пачками по batch_size через executemany, каждая пачка в своей транзакции.
+        Уже существующие login + name пропускаются. Возвращает число добавленных units
+        """
+        secret_obj = get_secret_obj(user, password)
+        user_id = self.get_user_id()
+        categories = {}
+        insert_unit = Unit.__table__.insert().prefix_with('OR IGNORE')
+        count_before = self.count_units()
+        last_id = self._session.query(func.max(Unit.id)).scalar() or 0
+
+        for batch in batched(units, batch_size):
+            passwords = encrypt_many([unit_['password'] for unit_ in batch], secret_obj)
+            try:
+                rows = [{'user_id': user_id,
+                         'login': unit_['login'],
+                         'name': unit_['name'],
+                         'url': unit_['url'],
+                         'category_id': self._get_category_id(unit_['category'], categories),
+                         'password': encrypted}
+                        for unit_, encrypted in zip(batch, passwords)]
+                self._session.execute(insert_unit, rows)
+                # триграммы добавленных units, пропущенные дубли в выборку не попадают
+                self._add_trigrams(self._session.query(Unit.id, Unit.user_id, Unit.login, Unit.name)
+                                   .filter(Unit.id > last_id, Unit.user_id == user_id))
+                last_id = self._session.query(func.max(Unit.id)).scalar() or last_id
+                self._session.commit()
+            except Exception:
+                self._session.rollback()
+                raise
+        return self.count_units() - count_before
+
+    def iter_units(self, user, password, batch_size=EXPORT_CHUNK_SIZE):
+        """
+        Units пользователя с расшифрованными паролями, по одному. Строки читаются
+        курсором по batch_size (yield_per), пароли расшифровываются по мере обхода,
+        ключ выводится один раз
+        """
+        secret_obj = get_secret_obj(user, password)
+        rows = self._session.query(Unit.login, Unit.password, Unit.name,
+                                   Category.category, Unit.url)\
+            .outerjoin(Category, Category.id == Unit.category_id)\
+            .filter(Unit.user_id == self.get_user_id())\
+            .order_by(Unit.id).yield_per(batch_size)
+        for row in rows:
+            yield {'login': row.login,
+                   'password': secret_obj.decrypt(row.password),
+                   'name': row.name,
+                   'category': row.category or 'default',
+                   'url': row.url}
+
+    def get_encrypted_password(self, login, name):
+        """Зашифрованный пароль unit, None если unit нет"""
+        return self._session.query(Unit.password).filter(
+            Unit.user_id == self.get_user_id(), Unit.login == login, Unit.name == name).scalar()
+
     def get_password(self, user, password, login, name):
         """Получение пароля"""
         secret_obj = get_secret_obj(user, password)
-        unit_obj = self._session.query(Unit)\
-            .filter(Unit.user.has(User.user == self._user) &
-                    (Unit.login == login) & (Unit.name == name)).first()
-        return secret_obj.decrypt(unit_obj.password)
+        encrypted_password = self.get_encrypted_password(login, name)
+        with span('aes'):
+            return secret_obj.decrypt(encrypted_password)
+
+    def get_encrypted_passwords(self, pairs):
+        """
+        Зашифрованные пароли units по списку (login, name): словарь {(login, name): пароль},
+        units, которых нет, в словарь не попадают. Один запрос IN по логинам через
+        индекс (user_id, login, name) вместо запроса на каждый unit
+        """
+        pairs = {tuple(pair) for pair in pairs}
+        encrypted_passwords = {}
+        for logins in batched(sorted({login for login, _ in pairs}), MAX_SQL_PARAMETERS):
+            rows = self._session.query(Unit.login, Unit.name, Unit.password)\
+                .filter(Unit.user_id == self.get_user_id(), Unit.login.in_(logins))
+            encrypted_passwords.update(((row.login, row.name), row.password)
+                                       for row in rows if (row.login, row.name) in pairs)
+        return encrypted_passwords
+
+    def get_passwords(self, user, password, pairs):
+        """
+        Пароли units по списку (login, name), как get_encrypted_passwords;
+        ключ выводится один раз
+        """
+        encrypted_passwords = self.get_encrypted_passwords(pairs)
+        secret_obj = get_secret_obj(user, password)
+        return dict(zip(encrypted_passwords,
+                        decrypt_many(encrypted_passwords.values(), secret_obj)))
 
     def update_unit(self, user, password, login, name, new_login=None, password_for_login=None,
                     new_category=None, url=None, new_name=None):
         """Обновление unit"""
+        encrypted_password = None
+        if password_for_login:
+            secret_obj = get_secret_obj(user, password)
+            with span('aes'):
+                encrypted_password = secret_obj.encrypt(password_for_login)
+        self.update_encrypted_unit(login, name, new_login, encrypted_password, new_category, url,
+                                   new_name)
+
+    def update_encrypted_unit(self, login, name, new_login=None, encrypted_password=None,
+                              new_category=None, url=None, new_name=None):
+        """Обновление unit с уже зашифрованным паролем"""
         update_dict = {'login': login}
         if new_login:
             update_dict['login'] = new_login
-        if password_for_login:
-            secret_obj = get_secret_obj(user, password)
-            update_dict['password'] = secret_obj.encrypt(password_for_login)
+        if encrypted_password:
+            update_dict['password'] = encrypted_password
         if url:
             update_dict['url'] = url
         if new_name:
             update_dict['name'] = new_name
 
         if new_category:
-            self._session.query(Unit)\
-                .filter(Unit.user.has(User.user == self._user)
-                        & (Unit.login == login) & (Unit.name == name))\
-                .first().category = self.get_category(new_category)
-        self._session.query(Unit)\
-            .filter(Unit.user.has(User.user == self._user)
-                    & (Unit.login == login) & (Unit.name == name))\
-            .update(update_dict, synchronize_session='fetch')
+            self._query_unit(login, name).first().category = self.get_category(new_category)
+        # объекты сессии не синхронизируются: commit ниже все равно их устаревает,
+        # а 'fetch' в sqlalchemy 1.3 - лишний SELECT
+        self._query_unit(login, name).update(update_dict, synchronize_session=False)
+        # триггер удалил триграммы unit при обновлении login или name
+        self._add_trigrams(self._session.query(Unit.id, Unit.user_id, Unit.login, Unit.name)
+                           .filter(Unit.user_id == self.get_user_id(),
+                                   Unit.login == update_dict['login'],
+                                   Unit.name == update_dict.get('name', name)))
         self._session.commit()
 
     def delete_unit(self, login, name):
         """Удаление unit"""
-        self._session.query(Unit) \
-            .filter(Unit.user.has(User.user == self._user)
-                    & (Unit.login == login) & (Unit.name == name))\
-            .delete(synchronize_session='fetch')
+        self._query_unit(login, name).delete(synchronize_session=False)
         self._session.commit()
 
 
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Настройка нового соединения sqlite: pragmas из SQLITE_PRAGMAS и вид транзакций.
+    Драйвер sqlite3 начинает транзакцию (BEGIN SQLITE_BEGIN) перед первой записью,
+    чтение до нее транзакцию не открывает и блокировок не держит
+    """
+    cursor = dbapi_connection.cursor()
+    for statement in make_pragma_statements(SQLITE_PRAGMAS):
+        cursor.execute(statement)
+    cursor.close()
+    dbapi_connection.isolation_level = SQLITE_BEGIN
+
+
+def create_sqlite_engine(file_db, **kwargs):
+    """
+    Engine для файла БД с настройкой соединений set_sqlite_pragmas, схему не проверяет.
+    Пул задается явно: в sqlalchemy 1.3 у файловой БД по умолчанию NullPool, и каждое
+    обращение открывало бы новое соединение и заново выполняло pragmas. Соединение пула
+    может достаться другому потоку (агент, API), поэтому check_same_thread выключен
+    """
+    kwargs.setdefault('poolclass', QueuePool)
+    kwargs.setdefault('connect_args', {'check_same_thread': False})
+    engine = create_engine(f'sqlite:///{os.path.abspath(os.fspath(file_db))}', echo=False, **kwargs)
+    event.listen(engine, 'connect', set_sqlite_pragmas)
+    watch_engine(engine)
+    if PROFILER.enabled:
+        # выполнение запросов - фаза sql (pwdone --profile), без профилирования обработчиков нет
+        event.listen(engine, 'before_cursor_execute', lambda *args: PROFILER.begin('sql'))
+        event.listen(engine, 'after_cursor_execute', lambda *args: PROFILER.end())
+        event.listen(engine, 'handle_error', lambda *args: PROFILER.end())
+    return engine
+
+
+class EngineRegistry:
+    """Реестр движков и сессий процесса, ключ - путь к файлу БД
+
+    Все SQLAlchemyManager и click-callbacks одного запуска cli получают
+    один и тот же engine и одну сессию на файл БД, а проверка схемы
+    выполняется один раз на engine
+    """
+
+    def __init__(self):
+        self._engines = {}
+        self._sessions = {}
+        self.stats = {'engines': 0, 'connections': 0, 'schema_checks': 0}
+
+    @staticmethod
+    def _make_key(file_db):
+        return os.path.abspath(os.fspath(file_db))
+
+    @staticmethod
+    def _file_id(path):
+        """Идентификатор файла БД, чтобы заметить удаление/подмену файла"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _count_connection(self, dbapi_connection, connection_record):
+        self.stats['connections'] += 1
+
+    def get_engine(self, file_db=FILE_DB):
+        """Выдаем engine для файла БД, при первом обращении создаем его и схему"""
+        key = self._make_key(file_db)
+        if key in self._engines:
+            engine, file_id = self._engines[key]
+            if file_id is not None and file_id == self._file_id(key):
+                return engine
+            self.dispose(file_db)
+
+        with span('engine'):
+            engine = create_sqlite_engine(key)
+        event.listen(engine, 'connect', self._count_connection)
+        self.stats['engines'] += 1
+
+        # Создание файла БД, если его нет, и миграции схемы
+        with span('schema'):
+            upgrade_schema(engine)
+        self.stats['schema_checks'] += 1
+
+        self._engines[key] = (engine, self._file_id(key))
+        return engine
+
+    def get_session(self, file_db=FILE_DB):
+        """Выдаем общую сессию для файла БД"""
+        engine = self.get_engine(file_db)
+        key = self._make_key(file_db)
+        if key not in self._sessions:
+            self._sessions[key] = sessionmaker(bind=engine)()
+        return self._sessions[key]
+
+    def dispose(self, file_db=None):
+        """Закрываем сессии и соединения для файла БД, без аргумента - для всех"""
+        keys = list(self._engines) if file_db is None else [self._make_key(file_db)]
+        for key in keys:
+            session = self._sessions.pop(key, None)
+            if session is not None:
+                session.close()
+            engine, _ = self._engines.pop(key, (None, None))
+            if engine is not None:
+                engine.dispose()
+
+
+REGISTRY = EngineRegistry()
+
+
 class SQLAlchemyManager:
     """Менеджер управления БД, предположительно будет отвечать за установление
     коннектов с базой, CRUD(Create, Read, Update, Delete) по хранящимся юнитам"""
@@ -303,13 +776,15 @@ class SQLAlchemyManager:
         self._user = user
         self._file_user_db = file_db
 
-        # Инициализация User
-        engine = create_engine(f'sqlite:///{self.file_user_db}', echo=False)
-
-        # Создание файла БД, если его нет
-        Base.metadata.create_all(engine)
-
-        self._session_for_user = sessionmaker(bind=engine)()
+        # Engine и сессия общие для всего процесса
+        self._session_for_user = REGISTRY.get_session(file_db)
 
         self.user_obj = UserManager(self.session_for_user, self.user)
         self.unit_obj = UnitManager(self.session_for_user, self.user)
+
+    def count_statements(self):
+        """
+        Запросы менеджера за время блока with:
+        with manager_obj.count_statements() as stats: ... stats.count, stats.seconds
+        """
+        return StatementCounter(self.session_for_user.get_bind())
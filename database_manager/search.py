@@ -0,0 +1,137 @@
+import re
+from difflib import SequenceMatcher
+
+from settings import (SUGGEST_CANDIDATES, SUGGEST_CUTOFF, SUGGEST_MAX_TRIGRAMS,
+                      SUGGEST_TRIGRAM_CAP)
+
+# Полнотекстовый индекс units на sqlite FTS5: rowid - id unit, user_id не нужен,
+# фильтр по пользователю - через join с units. Индекс поддерживается триггерами,
+# поэтому запись через ORM, Core insert импорта и sqlite3 одинаково попадает в поиск
+SQL_FTS_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'units_fts'"
+SQL_FTS_CREATE = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS units_fts USING fts5(login, name, url, category)',
+    # пароль не индексируется, поэтому перешифрование не трогает индекс
+    'CREATE TRIGGER IF NOT EXISTS units_fts_insert AFTER INSERT ON units BEGIN '
+    'INSERT INTO units_fts (rowid, login, name, url, category) VALUES (new.id, new.login, '
+    'new.name, new.url, (SELECT category FROM categories WHERE id = new.category_id)); END',
+    'CREATE TRIGGER IF NOT EXISTS units_fts_delete AFTER DELETE ON units BEGIN '
+    'DELETE FROM units_fts WHERE rowid = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS units_fts_update '
+    'AFTER UPDATE OF login, name, url, category_id ON units BEGIN '
+    'DELETE FROM units_fts WHERE rowid = old.id; '
+    'INSERT INTO units_fts (rowid, login, name, url, category) VALUES (new.id, new.login, '
+    'new.name, new.url, (SELECT category FROM categories WHERE id = new.category_id)); END',
+    'CREATE TRIGGER IF NOT EXISTS units_fts_category AFTER UPDATE OF category ON categories BEGIN '
+    'UPDATE units_fts SET category = new.category '
+    'WHERE rowid IN (SELECT id FROM units WHERE category_id = new.id); END',
+    # индекс перестраивается целиком, чтобы миграция оставалась идемпотентной
+    'DELETE FROM units_fts',
+    'INSERT INTO units_fts (rowid, login, name, url, category) '
+    'SELECT units.id, units.login, units.name, units.url, categories.category '
+    'FROM units LEFT OUTER JOIN categories ON categories.id = units.category_id',
+]
+
+SQL_SEARCH = (
+    'SELECT units.login, categories.category, units.url, units.name '
+    'FROM units_fts JOIN units ON units.id = units_fts.rowid '
+    'LEFT OUTER JOIN categories ON categories.id = units.category_id '
+    'WHERE units_fts MATCH ? AND units.user_id = ?')
+SQL_SEARCH_LIKE = (
+    'SELECT units.login, categories.category, units.url, units.name '
+    'FROM units LEFT OUTER JOIN categories ON categories.id = units.category_id '
+    'WHERE units.user_id = ?')
+SQL_SEARCH_LIKE_TERM = (
+    " AND (units.login LIKE ? ESCAPE '\\' OR units.name LIKE ? ESCAPE '\\' "
+    "OR units.url LIKE ? ESCAPE '\\' OR categories.category LIKE ? ESCAPE '\\')")
+SQL_SEARCH_CATEGORY = ' AND categories.category = ?'
+# порядок (login, name), как у страниц show, а не bm25: ранжирование по rank считает
+# релевантность каждого совпадения и на коротких запросах по 100k units в разы медленнее
+SQL_SEARCH_ORDER = ' ORDER BY units.login, units.name LIMIT ?'
+
+
+def split_terms(query):
+    """Слова запроса: по пробелам, без пустых"""
+    return [term for term in re.split(r'\s+', query) if term]
+
+
+def make_fts_query(query):
+    """
+    Запрос FTS5 из строки пользователя: каждое слово - префикс, все слова обязательны.
+    Слова берутся в кавычки, поэтому операторы FTS5 и спецсимволы ищутся как текст
+    """
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in split_terms(query))
+
+
+def make_like_patterns(query):
+    """Шаблоны LIKE (подстрока) для каждого слова запроса, без FTS5"""
+    return ['%' + re.sub(r'([\\%_])', r'\\\1', term) + '%' for term in split_terms(query)]
+
+
+# Триграммы login и name для подсказок при промахе (get, update, delete).
+# Триграммы считаются в python при добавлении, изменении и импорте units,
+# триггеры удаляют устаревшие строки, чтобы в индексе не оставалось удаленных units
+SQL_TRIGRAMS_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS unit_trigrams_delete AFTER DELETE ON units BEGIN '
+    'DELETE FROM unit_trigrams WHERE unit_id = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS unit_trigrams_update AFTER UPDATE OF login, name ON units BEGIN '
+    'DELETE FROM unit_trigrams WHERE unit_id = old.id; END',
+]
+# Частые триграммы (com, mai, ...) встречаются почти у всех units, их строки индекса
+# не читаются: для каждой триграммы запроса число строк считается с LIMIT :cap,
+# кандидаты ищутся только по более редким, и чем реже триграмма, тем больше ее вес.
+# Работа ограничена числом триграмм запроса и cap, а не размером хранилища
+SQL_SUGGEST_COUNT = (
+    'SELECT :trigram_{0} AS trigram, (SELECT COUNT(*) FROM (SELECT 1 FROM unit_trigrams '
+    'WHERE user_id = :user_id AND trigram = :trigram_{0} LIMIT :cap)) AS postings')
+SQL_SUGGEST = (
+    'WITH counts AS ({}) '
+    'SELECT units.login, units.name FROM ('
+    'SELECT unit_trigrams.unit_id, SUM(1.0 / counts.postings) AS score '
+    'FROM counts JOIN unit_trigrams ON unit_trigrams.user_id = :user_id '
+    'AND unit_trigrams.trigram = counts.trigram '
+    'WHERE counts.postings < :cap '
+    'GROUP BY unit_trigrams.unit_id ORDER BY score DESC LIMIT :candidates) AS candidates '
+    'JOIN units ON units.id = candidates.unit_id')
+
+
+def make_trigrams(*texts):
+    """
+    Триграммы слов текстов. Перед словом добавляется пробел: триграмма начала слова
+    отличается от той же триграммы в середине, а слова из двух букв тоже попадают в индекс
+    """
+    trigrams = set()
+    for text in texts:
+        for word in re.findall(r'\w+', (text or '').lower()):
+            word = ' ' + word
+            trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+def make_suggest_query(user_id, trigrams):
+    """
+    Запрос кандидатов подсказок и его именованные параметры, для sqlite3 и sqlalchemy.
+    Для длинных login и name берутся первые SUGGEST_MAX_TRIGRAMS триграмм,
+    триграммы начала слов (с пробелом) идут первыми
+    """
+    trigrams = sorted(trigrams)[:SUGGEST_MAX_TRIGRAMS]
+    parameters = {'user_id': user_id, 'cap': SUGGEST_TRIGRAM_CAP, 'candidates': SUGGEST_CANDIDATES}
+    parameters.update((f'trigram_{i}', trigram) for i, trigram in enumerate(trigrams))
+    counts = ' UNION ALL '.join(SQL_SUGGEST_COUNT.format(i) for i in range(len(trigrams)))
+    return SQL_SUGGEST.format(counts), parameters
+
+
+def rank_suggestions(login, name, candidates, limit, cutoff=SUGGEST_CUTOFF):
+    """
+    Ближайшие к (login, name) units из кандидатов индекса триграмм: сходство по difflib,
+    логин весит больше имени. Список (login, name) не длиннее limit
+    """
+    def similarity(candidate):
+        score = SequenceMatcher(None, login.lower(), candidate[0].lower()).ratio()
+        if name:
+            name_score = SequenceMatcher(None, name.lower(), candidate[1].lower()).ratio()
+            score = 0.7 * score + 0.3 * name_score
+        return score
+
+    scored = sorted(((similarity(candidate), tuple(candidate)) for candidate in candidates),
+                    key=lambda item: (-item[0], item[1]))
+    return [candidate for score, candidate in scored[:limit] if score >= cutoff]
@@ -0,0 +1,248 @@
+import os
+import pathlib
+import re
+import sqlite3
+import time
+
+from database_manager.search import (SQL_FTS_EXISTS, SQL_SEARCH,
+                                     SQL_SEARCH_CATEGORY, SQL_SEARCH_LIKE,
+                                     SQL_SEARCH_LIKE_TERM, SQL_SEARCH_ORDER,
+                                     make_fts_query, make_like_patterns,
+                                     make_suggest_query, make_trigrams,
+                                     rank_suggestions)
+from database_manager.statements import STATS
+from profile_manager.models import span
+from settings import PAGE_SIZE, SEARCH_LIMIT, SQLITE_PRAGMAS, SUGGEST_LIMIT
+from units_manager.models import decode_cursor, encode_cursor
+from units_manager.transfer import batched
+
+# минимальная версия схемы, под которую написаны запросы ниже
+READER_SCHEMA_VERSION = 4
+
+# pragmas соединения для чтения: режим журнала и синхронизацию задает писатель
+READER_PRAGMAS = ('busy_timeout', 'cache_size', 'mmap_size')
+
+# параметров в одном запросе: у sqlite до 3.32 не больше 999
+MAX_SQL_PARAMETERS = 900
+
+SQL_SCHEMA_VERSION = 'SELECT MAX(version) FROM schema_version'
+SQL_ALL_USERS = 'SELECT user FROM users ORDER BY user'
+SQL_USER = 'SELECT id, password FROM users WHERE user = ?'
+SQL_LOGINS = (
+    'SELECT units.login, categories.category, units.url, units.name '
+    'FROM units LEFT OUTER JOIN categories ON categories.id = units.category_id '
+    'WHERE units.user_id = ? ORDER BY units.id LIMIT ? OFFSET ?')
+SQL_LOGINS_CATEGORY = (
+    'SELECT units.login, categories.category, units.url, units.name '
+    'FROM units JOIN categories ON categories.id = units.category_id '
+    'WHERE units.user_id = ? AND categories.category = ? ORDER BY units.id LIMIT ? OFFSET ?')
+SQL_PAGE = (
+    'SELECT units.login, categories.category, units.url, units.name '
+    'FROM units LEFT OUTER JOIN categories ON categories.id = units.category_id '
+    'WHERE units.user_id = ?')
+SQL_PAGE_CATEGORY = ' AND categories.category = ?'
+SQL_PAGE_AFTER = ' AND (units.login, units.name) > (?, ?)'
+SQL_PAGE_ORDER = ' ORDER BY units.login, units.name LIMIT ?'
+SQL_UNIT_PASSWORD = 'SELECT password FROM units WHERE user_id = ? AND login = ? AND name = ?'
+SQL_UNITS_PASSWORDS = 'SELECT login, name, password FROM units WHERE user_id = ? AND login IN ({})'
+
+
+def make_pragma_statements(pragmas):
+    """Команды PRAGMA из словаря, значения проверяются: они могут прийти из окружения"""
+    statements = []
+    for name, value in pragmas.items():
+        if not re.match(r'^-?[A-Za-z0-9_]+$', str(value)):
+            raise ValueError(f'Incorrect value "{value}" for sqlite pragma {name}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def connect(file_db):
+    """
+    Connection to the DB for reading on stdlib sqlite3.
+    None if the DB doesn't exist yet or its schema is older than READER_SCHEMA_VERSION:
+    such DB has to be created or upgraded through SQLAlchemyManager first
+    """
+    path = pathlib.Path(os.path.abspath(os.fspath(file_db)))
+    if not path.exists():
+        return None
+    # mode=rw: файл БД не создается
+    connection = sqlite3.connect(path.as_uri() + '?mode=rw', uri=True)
+    connection.execute('PRAGMA query_only = ON')
+    for statement in make_pragma_statements(
+            {name: value for name, value in SQLITE_PRAGMAS.items() if name in READER_PRAGMAS}):
+        connection.execute(statement)
+    try:
+        version = connection.execute(SQL_SCHEMA_VERSION).fetchall()[0][0] or 0
+    except sqlite3.OperationalError:
+        version = 0
+    if version < READER_SCHEMA_VERSION:
+        connection.close()
+        return None
+    return connection
+
+
+class SQLiteReader:
+    """Чтение из БД без ORM: заранее подготовленные запросы на sqlite3
+
+    Методы повторяют UserManager и UnitManager для команд чтения (show, get, ushow),
+    запись остается на SQLAlchemyManager
+    """
+    _connection = None
+    _user = None
+    _user_row = None
+    _fts = None
+
+    def __init__(self, connection, user=None):
+        self._connection = connection
+        self._user = user
+
+    def _fetchall(self, sql, parameters=()):
+        # fetchall, чтобы курсор не держал блокировку чтения
+        with span('sql'):
+            start = time.perf_counter()
+            rows = self._connection.execute(sql, parameters).fetchall()
+            STATS.add(sql, time.perf_counter() - start)
+            return rows
+
+    def _get_user_row(self):
+        """(id, хеш пароля) пользователя, None если его нет"""
+        if self._user_row is None:
+            rows = self._fetchall(SQL_USER, (self._user,))
+            self._user_row = rows[0] if rows else None
+        return self._user_row
+
+    def get_user_id(self):
+        """id пользователя"""
+        user_row = self._get_user_row()
+        return user_row[0] if user_row else None
+
+    def check_user(self):
+        """
+        check user existence in BD
+        """
+        return self._get_user_row() is not None
+
+    def check_user_password(self, password):
+        """
+        check user password in BD
+        """
+        from encryption_manager.models import get_hash
+
+        user_row = self._get_user_row()
+        return user_row is not None \
+            and user_row[1] == get_hash((self._user + password).encode("utf-8"))
+
+    def all_users(self):
+        """
+        list of users
+        """
+        return [row[0] for row in self._fetchall(SQL_ALL_USERS)]
+
+    @staticmethod
+    def _make_logins_obj(rows):
+        """Выдача логинов из строк (login, category, url, name)"""
+        return {
+            "logins": [row[0] for row in rows],
+            "category": [row[1] if row[1] else 'default' for row in rows],
+            "url": [row[2] if row[2] else '' for row in rows],
+            "name": [row[3] if row[3] else '' for row in rows]
+        }
+
+    def get_logins(self, category=None, limit=None, offset=0):
+        """Выдача units в том же виде, что и UnitManager.get_logins"""
+        # LIMIT -1 в sqlite - без ограничения
+        page = (-1 if limit is None else limit, offset)
+        if category:
+            rows = self._fetchall(SQL_LOGINS_CATEGORY, (self.get_user_id(), category) + page)
+        else:
+            rows = self._fetchall(SQL_LOGINS, (self.get_user_id(),) + page)
+        return self._make_logins_obj(rows)
+
+    def get_page(self, category=None, cursor=None, limit=PAGE_SIZE):
+        """Страница units и токен следующей, как UnitManager.get_page"""
+        sql, parameters = SQL_PAGE, [self.get_user_id()]
+        if category:
+            sql += SQL_PAGE_CATEGORY
+            parameters.append(category)
+        if cursor:
+            sql += SQL_PAGE_AFTER
+            parameters.extend(decode_cursor(cursor))
+        rows = self._fetchall(sql + SQL_PAGE_ORDER, parameters + [limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][0], rows[-1][3])
+        return self._make_logins_obj(rows), next_cursor
+
+    def has_fts(self):
+        """Есть ли в БД полнотекстовый индекс units_fts"""
+        if self._fts is None:
+            self._fts = bool(self._fetchall(SQL_FTS_EXISTS))
+        return self._fts
+
+    def search(self, query, category=None, limit=SEARCH_LIMIT):
+        """Поиск units, как UnitManager.search"""
+        fts_query = make_fts_query(query)
+        if not fts_query:
+            return self._make_logins_obj([])
+        if self.has_fts():
+            sql, parameters = SQL_SEARCH, [fts_query, self.get_user_id()]
+        else:
+            sql, parameters = SQL_SEARCH_LIKE, [self.get_user_id()]
+            for pattern in make_like_patterns(query):
+                sql += SQL_SEARCH_LIKE_TERM
+                parameters.extend([pattern] * 4)
+        if category:
+            sql += SQL_SEARCH_CATEGORY
+            parameters.append(category)
+        return self._make_logins_obj(self._fetchall(sql + SQL_SEARCH_ORDER, parameters + [limit]))
+
+    def suggest(self, login, name=None, limit=SUGGEST_LIMIT):
+        """Ближайшие к login и name units, как UnitManager.suggest"""
+        trigrams = make_trigrams(login, name)
+        if not trigrams:
+            return []
+        rows = self._fetchall(*make_suggest_query(self.get_user_id(), trigrams))
+        return rank_suggestions(login, name, rows, limit)
+
+    def get_encrypted_password(self, login, name):
+        """Зашифрованный пароль unit, None если unit нет"""
+        rows = self._fetchall(SQL_UNIT_PASSWORD, (self.get_user_id(), login, name))
+        return rows[0][0] if rows else None
+
+    def get_encrypted_passwords(self, pairs):
+        """
+        Зашифрованные пароли units по списку (login, name),
+        как UnitManager.get_encrypted_passwords
+        """
+        pairs = {tuple(pair) for pair in pairs}
+        encrypted_passwords = {}
+        for logins in batched(sorted({login for login, _ in pairs}), MAX_SQL_PARAMETERS):
+            rows = self._fetchall(SQL_UNITS_PASSWORDS.format(', '.join('?' * len(logins))),
+                                  [self.get_user_id()] + logins)
+            encrypted_passwords.update(((login, name), password)
+                                       for login, name, password in rows if (login, name) in pairs)
+        return encrypted_passwords
+
+    def get_passwords(self, user, password, pairs):
+        """Пароли units по списку (login, name), как UnitManager.get_passwords"""
+        from encryption_manager.models import decrypt_many, get_secret_obj
+
+        encrypted_passwords = self.get_encrypted_passwords(pairs)
+        secret_obj = get_secret_obj(user, password)
+        return dict(zip(encrypted_passwords,
+                        decrypt_many(encrypted_passwords.values(), secret_obj)))
+
+    def check_login(self, login, name):
+        """Проверка существования логина"""
+        return self.get_encrypted_password(login, name) is not None
+
+    def get_password(self, user, password, login, name):
+        """Получение пароля"""
+        from encryption_manager.models import get_secret_obj
+
+        secret_obj = get_secret_obj(user, password)
+        encrypted_password = self.get_encrypted_password(login, name)
+        with span('aes'):
+            return secret_obj.decrypt(encrypted_password)
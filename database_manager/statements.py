@@ -0,0 +1,116 @@
+# Учет запросов к БД: число и время. sqlalchemy импортируется в функциях,
+# модуль нужен и быстрому пути чтения на sqlite3, и cli до импорта ORM
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StatementStats:
+    """Число и время запросов к БД
+
+    IN:
+        Запросы регистрируются через add: движки EngineRegistry - событиями
+        before/after_cursor_execute, SQLiteReader - в _fetchall
+    OUT:
+        count, seconds и, по желанию, тексты запросов в statements
+        и их параметры в parameters
+    """
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_statements else None
+        self.parameters = [] if keep_statements else None
+
+    def add(self, statement, seconds, parameters=None):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append(statement)
+            self.parameters.append(parameters)
+
+    def snapshot(self):
+        """(число, секунды) на текущий момент"""
+        return self.count, self.seconds
+
+
+# все запросы процесса: pwdone пишет их число и время в лог после каждой команды
+STATS = StatementStats()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    STATS.add(statement, time.perf_counter() - conn.info['statement_start'].pop())
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('statement_start') \
+        if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def watch_engine(engine):
+    """Учет запросов engine в STATS"""
+    from sqlalchemy import event
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+class StatementCounter:
+    """Запросы engine за время блока with, например одного вызова менеджера
+
+    IN:
+        engine; по умолчанию учитываются только запросы потока, открывшего блок,
+        чтобы соседние потоки сервера не попадали в счет
+    OUT:
+        StatementStats с текстами запросов: count, seconds, statements, parameters
+    """
+
+    def __init__(self, engine, all_threads=False):
+        self._engine = engine
+        self._thread = None if all_threads else threading.get_ident()
+        self._starts = {}
+        self.stats = StatementStats(keep_statements=True)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self._thread is None or self._thread == threading.get_ident():
+            self._starts[id(cursor)] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = self._starts.pop(id(cursor), None)
+        if start is not None:
+            self.stats.add(statement, time.perf_counter() - start, parameters)
+
+    def __enter__(self):
+        from sqlalchemy import event
+
+        event.listen(self._engine, 'before_cursor_execute', self._before)
+        event.listen(self._engine, 'after_cursor_execute', self._after)
+        return self.stats
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        from sqlalchemy import event
+
+        event.remove(self._engine, 'before_cursor_execute', self._before)
+        event.remove(self._engine, 'after_cursor_execute', self._after)
+
+
+@contextmanager
+def assert_max_queries(engine, maximum):
+    """
+    Бюджет запросов для тестов: AssertionError со списком запросов,
+    если в блоке with их выполнено больше maximum
+    """
+    with StatementCounter(engine) as stats:
+        yield stats
+    if stats.count > maximum:
+        statements = '\n'.join(f'{i + 1}. {statement}'
+                               for i, statement in enumerate(stats.statements))
+        raise AssertionError(f'{stats.count} statements executed, '
+                             f'expected at most {maximum}:\n{statements}')
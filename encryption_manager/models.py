@@ -1,9 +1,22 @@
+import atexit
 import base64
 import hashlib
+import hmac
+import math
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from itertools import chain, repeat
 
 from Crypto import Random
 from Crypto.Cipher import AES
 
+from profile_manager.models import span
+from settings import (CRYPTO_WORKERS, KEY_CACHE_SIZE, KEY_CACHE_TTL,
+                      PARALLEL_CRYPTO_THRESHOLD)
+
 
 def get_hash(password):
     """
@@ -24,7 +37,27 @@ class AESCipher(object):
     """
     def __init__(self, key):
         self.bs = 32
-        self.key = hashlib.sha256(AESCipher.str_to_bytes(key)).digest()
+        # bytearray, чтобы ключ можно было затереть в памяти
+        self.key = bytearray(hashlib.sha256(AESCipher.str_to_bytes(key)).digest())
+
+    @classmethod
+    def from_key(cls, key):
+        """
+        Creates a cipher with the ready key, without hashing it again
+        """
+        secret_obj = cls.__new__(cls)
+        secret_obj.bs = 32
+        secret_obj.key = bytearray(key)
+        return secret_obj
+
+    def wipe(self):
+        """
+        Overwrites the key with zeros. The cipher can not be used after that
+        """
+        if self.key is not None:
+            for i in range(len(self.key)):
+                self.key[i] = 0
+            self.key = None
 
     @staticmethod
     def str_to_bytes(data):
@@ -53,9 +86,224 @@ class AESCipher(object):
         return self._unpad(cipher.decrypt(enc[AES.block_size:])).decode('utf-8')
 
 
+def derive_secret_obj(key1, key2):
+    """
+    This function derives a new instance of AESCipher encoded by key = hash of (key1 + key2)
+    """
+    with span('key'):
+        return AESCipher(get_hash((key1 + key2).encode("utf-8")))
+
+
+class ExportCipher:
+    """
+    Encryption of a pwdone export file. The AES and HMAC keys are derived from the export
+    password with PBKDF2-HMAC-SHA256 and the salt of the file. Every line is encrypted
+    and then authenticated with HMAC over its label (position in the file) and ciphertext
+    """
+
+    def __init__(self, password, salt, iterations):
+        with span('key'):
+            key = hashlib.pbkdf2_hmac('sha256', AESCipher.str_to_bytes(password), salt, iterations,
+                                      dklen=64)
+        self._secret_obj = AESCipher.from_key(key[:32])
+        self._mac_key = key[32:]
+
+    def _mac(self, enc, label):
+        return hmac.new(self._mac_key, f'{label}:{enc}'.encode('ascii'), hashlib.sha256).hexdigest()
+
+    def encrypt(self, raw, label):
+        """Encrypted line: ciphertext and its HMAC through a space"""
+        enc = self._secret_obj.encrypt(raw)
+        return f'{enc} {self._mac(enc, label)}'
+
+    def verify(self, line, label):
+        """
+        Checks HMAC of the line, ValueError if the line is changed
+        or the password is incorrect
+        """
+        enc, _, mac = line.partition(' ')
+        if not hmac.compare_digest(mac, self._mac(enc, label)):
+            raise ValueError('Incorrect export password or damaged export file')
+        return enc
+
+    def decrypt(self, line, label):
+        """Decrypted line, only after the HMAC check"""
+        return self._secret_obj.decrypt(self.verify(line, label))
+
+
+class CipherLease:
+    """
+    A reference to a cipher of KeyCache with the same encrypt/decrypt.
+    While at least one lease is alive, the cipher is not wiped, even if it is evicted
+    or expired; the last dropped lease of a dropped entry wipes it
+    """
+
+    def __init__(self, entry, release):
+        self._secret_obj = entry.secret_obj
+        weakref.finalize(self, release, entry)
+
+    @property
+    def key(self):
+        return self._secret_obj.key
+
+    def encrypt(self, raw):
+        return self._secret_obj.encrypt(raw)
+
+    def decrypt(self, enc):
+        return self._secret_obj.decrypt(enc)
+
+    def __reduce__(self):
+        # в процессы ProcessPoolExecutor передаётся копия шифра, а не ссылка на кэш
+        return AESCipher.from_key, (bytes(self._secret_obj.key),)
+
+
+class _KeyCacheEntry:
+    __slots__ = ('secret_obj', 'leases', 'dropped')
+
+    def __init__(self, secret_obj):
+        self.secret_obj = secret_obj
+        self.leases = 0
+        self.dropped = False
+
+
+class KeyCache:
+    """
+    Bounded LRU cache of AESCipher instances with TTL.
+    Entries are looked up by HMAC of the credentials with a random per-process salt,
+    so neither the credentials nor the key are kept as dict keys.
+    get hands out CipherLease references and counts them: expired and evicted ciphers
+    are wiped at once if nobody holds them, otherwise when the last lease is dropped
+    """
+
+    def __init__(self, maxsize=KEY_CACHE_SIZE, ttl=KEY_CACHE_TTL):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._salt = os.urandom(32)
+        self._entries = OrderedDict()
+        # RLock: lease может быть собран сборщиком мусора внутри get того же потока
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _digest(self, key1, key2):
+        return hmac.new(self._salt, (key1 + key2).encode("utf-8"), hashlib.sha256).digest()
+
+    def _drop(self, entry):
+        """Wipes the dropped entry, if it is not leased"""
+        entry.dropped = True
+        if not entry.leases:
+            entry.secret_obj.wipe()
+
+    def _release(self, entry):
+        with self._lock:
+            entry.leases -= 1
+            if entry.dropped and not entry.leases:
+                entry.secret_obj.wipe()
+
+    def _expire(self, now):
+        """Drops expired entries, the oldest ones are at the beginning"""
+        while self._entries:
+            digest, (expires_at, entry) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[digest]
+            self._drop(entry)
+
+    def get(self, key1, key2):
+        """
+        Returns a CipherLease of the cached AESCipher for (key1 + key2),
+        deriving it on a miss
+        """
+        digest = self._digest(key1, key2)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            item = self._entries.pop(digest, None)
+            entry = item[1] if item else _KeyCacheEntry(derive_secret_obj(key1, key2))
+            # продлеваем жизнь записи при обращении
+            self._entries[digest] = (now + self._ttl, entry)
+            entry.leases += 1
+            lease = CipherLease(entry, self._release)
+            while len(self._entries) > self._maxsize:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._drop(evicted)
+            return lease
+
+    def clear(self):
+        """
+        Wipes all cached ciphers, leased ones too
+        """
+        with self._lock:
+            while self._entries:
+                _, (_, entry) = self._entries.popitem()
+                entry.dropped = True
+                entry.secret_obj.wipe()
+
+
+KEY_CACHE = KeyCache()
+atexit.register(KEY_CACHE.clear)
+
+
 def get_secret_obj(key1, key2):
     """
-    This function returns an instance of AESCipher encoded by key = hash of (key1 + key2)
+    This function returns a lease of AESCipher encoded by key = hash of (key1 + key2).
+    Ciphers are taken from KEY_CACHE, so repeated calls skip key derivation;
+    keep the lease while the cipher is used
+    """
+    return KEY_CACHE.get(key1, key2)
+
+
+def _encrypt_chunk(raws, secret_obj):
+    return [secret_obj.encrypt(raw) for raw in raws]
+
+
+def _decrypt_chunk(ciphertexts, secret_obj):
+    return [secret_obj.decrypt(enc) for enc in ciphertexts]
+
+
+def _reencrypt_chunk(ciphertexts, old_secret_obj, new_secret_obj):
+    return [new_secret_obj.encrypt(old_secret_obj.decrypt(enc)) for enc in ciphertexts]
+
+
+def _map_chunks(func, items, secret_objs, workers):
+    """
+    Applies func(chunk, *secret_objs) to the items. With workers > 1 and enough items
+    the items are split into chunks between a pool of processes, results are merged
+    back in the same order
+    """
+    items = list(items)
+    if workers <= 1 or len(items) < PARALLEL_CRYPTO_THRESHOLD:
+        with span('aes'):
+            return func(items, *secret_objs)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # несколько чанков на процесс, чтобы выровнять нагрузку
+    chunk_size = math.ceil(len(items) / (workers * 4))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with span('aes'), ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(func, chunks, *[repeat(obj) for obj in secret_objs])
+        return list(chain.from_iterable(results))
+
+
+def encrypt_many(raws, secret_obj, workers=CRYPTO_WORKERS):
+    """
+    This function encrypts the given strings with secret_obj, keeping the order
+    """
+    return _map_chunks(_encrypt_chunk, raws, (secret_obj,), workers)
+
+
+def decrypt_many(ciphertexts, secret_obj, workers=CRYPTO_WORKERS):
+    """
+    This function decrypts the given ciphertexts with secret_obj, keeping the order
+    """
+    return _map_chunks(_decrypt_chunk, ciphertexts, (secret_obj,), workers)
+
+
+def reencrypt(ciphertexts, old_secret_obj, new_secret_obj, workers=CRYPTO_WORKERS):
+    """
+    This function decrypts the given ciphertexts with old_secret_obj and encrypts them
+    again with new_secret_obj, keeping the order
     """
-    key = get_hash((key1 + key2).encode("utf-8"))
-    return AESCipher(key)
+    return _map_chunks(_reencrypt_chunk, ciphertexts, (old_secret_obj, new_secret_obj), workers)
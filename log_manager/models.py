@@ -1,7 +1,12 @@
+import atexit
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler)
 
-from settings import LOGS_PATH
+from settings import (LOGS_PATH, OPERATIONS_LOG_BACKUPS,
+                      OPERATIONS_LOG_MAX_BYTES, OPERATIONS_LOG_PATH)
 
 
 def change_filename(filename):
@@ -15,45 +20,108 @@ def change_filename(filename):
         exit(-1)
 
 
+# префиксы выводимых сообщений по уровню, таблица строится один раз
+MESSAGE_PREFIXES = {
+    logging.DEBUG: '',
+    logging.INFO: '',
+    logging.WARNING: 'Warning: ',
+    logging.ERROR: 'Error: ',
+    logging.CRITICAL: 'Critical error: ',
+}
+
+
 def log_and_print(message, level=logging.DEBUG, print_need=True):
     """Loging and print message"""
-    message_without_new_lines = message.replace('\n', ' ')
-    data_messages = {
-        logging.DEBUG: {
-            'func': LOG.debug,
-            'msg_prefix': ''},
-        logging.INFO: {
-            'func': LOG.info,
-            'msg_prefix': ''},
-        logging.WARNING: {
-            'func': LOG.warning,
-            'msg_prefix': 'Warning: '},
-        logging.ERROR: {
-            'func': LOG.error,
-            'msg_prefix': 'Error: '},
-        logging.CRITICAL: {
-            'func': LOG.critical,
-            'msg_prefix': 'Critical error: '}
-    }
-
     if print_need:
-        print(data_messages[level]['msg_prefix'] + message)
+        print(MESSAGE_PREFIXES[level] + message)
 
-    data_messages[level]['func'](message_without_new_lines)
+    log = get_log()
+    # уровень проверяется до подготовки сообщения
+    if log.isEnabledFor(level):
+        log.log(level, message.replace('\n', ' '))
 
 
 LOG = logging.getLogger('cli')
 
+# журнал операций (pwdone --operations-log): json объект на команду, отдельно от лога cli
+OPERATIONS_LOG = logging.getLogger('operations')
+OPERATIONS_LOG.propagate = False
+
+# сообщения уходят в очередь, в файл их пишет фоновый поток QueueListener:
+# команды не ждут записи и ротации файла лога. {имя логгера: (QueueListener, QueueHandler)}
+LISTENERS = {}
+
 FORMATTER = \
     logging.Formatter('%(asctime)s - %(levelname)s -  %(name)s - %(message)s ')
 
-ROTATION_LOGGING_HANDLER = \
-    TimedRotatingFileHandler(
-        LOGS_PATH, when='D', interval=1, backupCount=5, encoding='utf-8')
-ROTATION_LOGGING_HANDLER.setFormatter(FORMATTER)
-ROTATION_LOGGING_HANDLER.setLevel(logging.DEBUG)
-ROTATION_LOGGING_HANDLER.namer = change_filename
+LOG.setLevel(logging.DEBUG)
+OPERATIONS_LOG.setLevel(logging.INFO)
 
-LOG.addHandler(ROTATION_LOGGING_HANDLER)
 
-LOG.setLevel(logging.DEBUG)
+def make_rotation_handler():
+    """
+    Rotating file handler of the log, the logs directory is created if needed.
+    The file is opened on the first record, in the thread of the log listener
+    """
+    if not LOGS_PATH.parent.exists():
+        LOGS_PATH.parent.mkdir(parents=True)
+    handler = TimedRotatingFileHandler(
+        LOGS_PATH, when='D', interval=1, backupCount=5, encoding='utf-8', delay=True)
+    handler.setFormatter(FORMATTER)
+    handler.setLevel(logging.DEBUG)
+    handler.namer = change_filename
+    return handler
+
+
+def make_operations_handler():
+    """
+    Handler of the operations log: json lines without a prefix, rotated by size
+    """
+    OPERATIONS_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(OPERATIONS_LOG_PATH, maxBytes=OPERATIONS_LOG_MAX_BYTES,
+                                  backupCount=OPERATIONS_LOG_BACKUPS, encoding='utf-8', delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
+
+
+def start_listener(log, make_handler):
+    """
+    log with the queue handler and the listener thread writing to make_handler(),
+    they are created on the first message, so commands without logging (e.g. --help)
+    don't touch the filesystem
+    """
+    if log.name not in LISTENERS:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, make_handler(), respect_handler_level=True)
+        queue_handler = QueueHandler(log_queue)
+        log.addHandler(queue_handler)
+        listener.start()
+        LISTENERS[log.name] = (listener, queue_handler)
+    return log
+
+
+def get_log():
+    """Logger of the cli"""
+    return start_listener(LOG, make_rotation_handler)
+
+
+def log_operation(record):
+    """Write the dict record of a command to the operations log as a json line"""
+    logger = start_listener(OPERATIONS_LOG, make_operations_handler)
+    logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def flush_log():
+    """
+    Write all queued messages to the files and stop the writer threads,
+    the next message starts them again
+    """
+    while LISTENERS:
+        name, (listener, queue_handler) = LISTENERS.popitem()
+        logging.getLogger(name).removeHandler(queue_handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(flush_log)
@@ -0,0 +1,69 @@
+# Чтение журнала операций (log_manager.models.log_operation) и перцентили
+# времени команд для pwdone stats, без обращения к хранилищу
+import json
+import math
+from collections import defaultdict
+
+PERCENTILES = (50, 90, 95, 99)
+
+# числовые поля записи журнала
+FIELDS = ('duration_ms', 'sql_ms', 'key_ms', 'sql_statements', 'units')
+
+
+def get_log_files(path):
+    """Файл журнала и его ротированные копии (path.1, path.2...), от старых к новым"""
+    backups = [file for file in path.parent.glob(path.name + '.*') if file.suffix[1:].isdigit()]
+    backups.sort(key=lambda file: int(file.suffix[1:]), reverse=True)
+    return backups + ([path] if path.exists() else [])
+
+
+def iter_operations(paths):
+    """
+    Записи журнала из файлов paths; строки, которые не разбираются
+    (оборванная запись), пропускаются
+    """
+    for path in paths:
+        with open(path, encoding='utf-8') as stream:
+            for line in stream:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'command' in record:
+                    yield record
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу отсортированного списка values"""
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def get_stats(records, field='duration_ms', command=None):
+    """
+    {команда: {'count': n, 'p50': .., 'p90': .., 'p95': .., 'p99': .., 'max': ..}} по полю field,
+    команды по алфавиту; записи без поля не учитываются
+    """
+    values = defaultdict(list)
+    for record in records:
+        value = record.get(field)
+        if value is not None and (command is None or record['command'] == command):
+            values[record['command']].append(value)
+
+    stats = {}
+    for command_, command_values in sorted(values.items()):
+        command_values.sort()
+        stats[command_] = {'count': len(command_values),
+                           **{f'p{percent}': percentile(command_values, percent)
+                              for percent in PERCENTILES},
+                           'max': command_values[-1]}
+    return stats
+
+
+def format_stats(stats, field):
+    """Таблица get_stats"""
+    columns = ['count'] + [f'p{percent}' for percent in PERCENTILES] + ['max']
+    lines = [f'{"command":<12}' + ''.join(f'{column:>11}' for column in columns) + f'  ({field})']
+    for command, values in stats.items():
+        lines.append(f'{command:<12}{values["count"]:>11}'
+                     + ''.join(f'{values[column]:>11.2f}' for column in columns[1:]))
+    return '\n'.join(lines)
@@ -0,0 +1,140 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# фаза, в которую попадает время вне замеренных фаз
+OTHER_PHASE = 'other'
+
+
+class Profiler:
+    """Замеры фаз команды cli (pwdone --profile)
+
+    IN:
+        Именованные интервалы span (или begin/end) вокруг фаз: импорты, engine, схема,
+        вывод ключа, SQL, AES, буфер обмена. Интервалы могут быть вложенными
+    OUT:
+        По каждой фазе число вызовов, полное и собственное время (без вложенных фаз),
+        таблицей или в формате collapsed stacks для flamegraph; при cprofile -
+        еще и статистика cProfile. Выключенный профайлер ничего не замеряет
+    """
+
+    def __init__(self):
+        self._reset()
+        self._started_at = None
+        # от начала импорта cli считается только первый запуск, в одном процессе
+        # команды могут запускаться и несколько раз (тесты)
+        self._first_start = True
+
+    def _reset(self):
+        self.enabled = False
+        self._stack = []
+        self._phases = {}
+        self._stacks = defaultdict(float)
+        self._cprofile = None
+        self._wall = None
+
+    def start(self, cprofile=False, started_at=None):
+        """
+        Начало замеров; время с started_at (perf_counter в начале импорта cli)
+        до начала - фаза "import cli". cProfile импортируется, только если нужен
+        """
+        self._reset()
+        self.enabled = True
+        now = time.perf_counter()
+        self._started_at = started_at if self._first_start and started_at is not None else now
+        self._first_start = False
+        self._record(['import cli'], now - self._started_at, 0.0)
+        if cprofile:
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        """Конец замеров, незакрытые фазы закрываются"""
+        if not self.enabled:
+            return
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        while self._stack:
+            self.end()
+        self._wall = time.perf_counter() - self._started_at
+        self._started_at = None
+        self.enabled = False
+
+    def begin(self, name):
+        """Начало фазы name"""
+        if self.enabled:
+            self._stack.append([name, time.perf_counter(), 0.0])
+
+    def end(self):
+        """Конец последней начатой фазы"""
+        if not self.enabled or not self._stack:
+            return
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        self._record([item[0] for item in self._stack] + [name], elapsed, children)
+
+    @contextmanager
+    def span(self, name):
+        """Фаза name на время блока with"""
+        if not self.enabled:
+            yield
+            return
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def _record(self, path, elapsed, children):
+        phase = self._phases.setdefault(path[-1], [0, 0.0, 0.0])
+        phase[0] += 1
+        # вложенный вызов той же фазы уже учтен во внешнем
+        if path[-1] not in path[:-1]:
+            phase[1] += elapsed
+        phase[2] += elapsed - children
+        self._stacks[';'.join(path)] += elapsed - children
+
+    def get_phases(self):
+        """{фаза: (вызовов, полное время, собственное время)} в секундах, с OTHER_PHASE"""
+        phases = {name: tuple(values) for name, values in self._phases.items()}
+        other = (self._wall or 0.0) - sum(values[2] for values in phases.values())
+        phases[OTHER_PHASE] = (1, other, other)
+        return phases
+
+    def format_report(self):
+        """Таблица фаз по убыванию собственного времени"""
+        lines = [f'{"phase":<14}{"calls":>7}{"total ms":>11}{"self ms":>11}{"self %":>8}']
+        wall = self._wall or 0.0
+        for name, (calls, total, self_time) in sorted(self.get_phases().items(),
+                                                      key=lambda item: -item[1][2]):
+            percent = self_time / wall * 100 if wall else 0.0
+            lines.append(f'{name:<14}{calls:>7}{total * 1000:>11.2f}{self_time * 1000:>11.2f}'
+                         f'{percent:>7.1f}%')
+        lines.append(f'{"wall":<14}{"":>7}{wall * 1000:>11.2f}')
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """
+        Статистика cProfile (если замерялась) или collapsed stacks фаз
+        (строки "фаза;вложенная мкс") для flamegraph.pl и speedscope
+        """
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(path)
+            return
+        stacks = dict(self._stacks)
+        stacks[OTHER_PHASE] = self.get_phases()[OTHER_PHASE][2]
+        with open(path, 'w', encoding='utf-8') as stream:
+            for stack, seconds in stacks.items():
+                stream.write(f'{stack} {max(0, round(seconds * 1e6))}\n')
+
+
+PROFILER = Profiler()
+
+
+def span(name):
+    """Фаза name общего профайлера на время блока with"""
+    return PROFILER.span(name)
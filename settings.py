@@ -1,11 +1,86 @@
+import os
 import pathlib
 
 FILE_DB = pathlib.Path(__file__).parent / 'database.sqlite'
 
 LOGS_PATH = pathlib.Path.cwd() / 'logs' / 'common.log'
 
+# журнал операций: json строка на команду (команда, хеш пользователя, число units,
+# время, число запросов SQL, время вывода ключа) для pwdone stats. Включается
+# pwdone --operations-log или PWDONE_OPERATIONS_LOG=1; ротация по размеру файла в байтах
+OPERATIONS_LOG = os.environ.get('PWDONE_OPERATIONS_LOG', '') not in ('', '0')
+OPERATIONS_LOG_PATH = LOGS_PATH.parent / 'operations.jsonl'
+OPERATIONS_LOG_MAX_BYTES = 5 * 1024 * 1024
+OPERATIONS_LOG_BACKUPS = 5
+
+# pragmas соединений sqlite, в порядке применения; значение можно переопределить
+# переменной окружения PWDONE_SQLITE_<PRAGMA>, например PWDONE_SQLITE_BUSY_TIMEOUT=10000.
+# WAL: читатели не блокируют писателя и наоборот; busy_timeout (мс): писатель ждет
+# освобождения блокировки вместо ошибки "database is locked"; synchronous=NORMAL
+# в режиме WAL не теряет целостность БД; cache_size < 0 - размер кеша в КиБ
+SQLITE_PRAGMAS = {
+    'busy_timeout': '5000',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': '-16000',
+    'mmap_size': str(64 * 1024 * 1024),
+    'foreign_keys': 'ON',
+}
+# значение pragma можно переопределить переменной окружения PWDONE_SQLITE_<PRAGMA>
+SQLITE_PRAGMAS = {name: os.environ.get(f'PWDONE_SQLITE_{name.upper()}', default)
+                  for name, default in SQLITE_PRAGMAS.items()}
+# транзакции начинаются перед первой записью с BEGIN IMMEDIATE: блокировка записи
+# берется сразу и ожидается по busy_timeout, а не отказывает посреди транзакции.
+# Чтение транзакцию не открывает, поэтому долгие сессии (агент) не держат блокировку
+SQLITE_BEGIN = os.environ.get('PWDONE_SQLITE_BEGIN', 'IMMEDIATE')
+
 TIME_SESSION_CLOSE = 15 * 60  # дефолтное время в секундах, отведенное на длительность сессии
 
-if not LOGS_PATH.parent.exists():
-    LOGS_PATH.parent.mkdir(parents=True)
-    LOGS_PATH.touch()
+# сокет агента (pwdone agent), который держит хранилище разблокированным на время сессии.
+# По умолчанию agent.sock в $XDG_RUNTIME_DIR или в каталоге pwdone-<uid> временного каталога,
+# доступном только владельцу (agent_manager.models.get_socket_path)
+AGENT_SOCKET_PATH = os.environ.get('PWDONE_AGENT_SOCK')
+
+# кеш выведенных ключей шифрования: размер и время жизни записи в секундах
+KEY_CACHE_SIZE = 32
+KEY_CACHE_TTL = TIME_SESSION_CLOSE
+
+# размер пачки units при импорте: одна транзакция и один executemany на пачку
+IMPORT_BATCH_SIZE = 1000
+
+# число units в одной зашифрованной части файла экспорта и в одной выборке из БД
+EXPORT_CHUNK_SIZE = 1000
+
+# число итераций PBKDF2 при выводе ключей файла экспорта из пароля экспорта
+EXPORT_KDF_ITERATIONS = 600000
+
+# число units на странице выдачи с курсором (pwdone show --page-size)
+PAGE_SIZE = 50
+
+# максимум units в выдаче поиска (pwdone search)
+SEARCH_LIMIT = 50
+
+# подсказки при промахе get/update/delete: число подсказок, кандидатов из индекса
+# триграмм и минимальное сходство (0..1) для подсказки и для get --fuzzy
+SUGGEST_LIMIT = 3
+SUGGEST_CANDIDATES = 50
+SUGGEST_CUTOFF = 0.6
+# триграммы, которые есть у стольких units и больше, для поиска кандидатов не используются
+SUGGEST_TRIGRAM_CAP = 5000
+# триграмм запроса подсказок не больше стольких: по SELECT на триграмму в UNION ALL,
+# меньше лимита sqlite на составной SELECT (500) и MAX_SQL_PARAMETERS
+SUGGEST_MAX_TRIGRAMS = 150
+
+# число потоков БД у AsyncSQLAlchemyManager: у каждого своя сессия и соединение sqlite
+ASYNC_DB_THREADS = 4
+
+# локальный HTTP/JSON API (pwdone serve): адрес, порт и число соединений с БД в пуле,
+# столько же запросов обращаются к БД одновременно, остальные ждут соединения
+API_HOST = '127.0.0.1'
+API_PORT = int(os.environ.get('PWDONE_API_PORT', 8765))
+API_POOL_SIZE = 8
+
+# число процессов для массового шифрования (перешифрование при смене пользователя/пароля)
+CRYPTO_WORKERS = int(os.environ.get('PWDONE_CRYPTO_WORKERS', 1))
+# меньшие объемы шифруются в текущем процессе: запуск пула дороже самой работы
+PARALLEL_CRYPTO_THRESHOLD = 5000
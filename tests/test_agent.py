@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+import cli as cli_module
+from agent_manager.models import (AGENT_SUPPORTED, AgentClient, AgentServer,
+                                  get_socket_path)
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from encryption_manager.models import get_secret_obj
+
+
+@unittest.skipUnless(AGENT_SUPPORTED, 'unix sockets are not supported')
+class TestAgent(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+    _test_login = 'test-login'
+    _test_pwd_login = 'T_l!456'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+        self.socket_path = os.path.join(self._tmp_dir.name, 'agent.sock')
+
+        self._manager_obj = SQLAlchemyManager(self.file_path, self._test_user)
+        self._manager_obj.user_obj.add_user(self._test_pwd_user)
+        self._manager_obj.unit_obj.add_unit(self._test_user, self._test_pwd_user,
+                                            self._test_login, self._test_pwd_login)
+        self.client = AgentClient(self.socket_path)
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def start_agent(self, time_session=None):
+        agent_obj = AgentServer(self._manager_obj, self._test_pwd_user,
+                                self.socket_path, time_session)
+        thread = threading.Thread(target=agent_obj.serve_forever, daemon=True)
+        thread.start()
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        return agent_obj, thread
+
+    def test_requests(self):
+        """
+        check agent answers and stop
+        """
+        agent_obj, thread = self.start_agent()
+
+        self.assertEqual(True, self.client.is_unlocked(self._test_user, self.file_path))
+        self.assertEqual(False, self.client.is_unlocked('another-user', self.file_path))
+        response = self.client.request('get', self._test_user, self.file_path,
+                                       login=self._test_login, name='default')
+        self.assertEqual(self._test_pwd_login, response['password'])
+        response = self.client.request('get', self._test_user, self.file_path,
+                                       login='non-existent-login', name='default')
+        self.assertEqual('error', response['status'])
+        response = self.client.request('passwords', self._test_user, self.file_path,
+                                       pairs=[[self._test_login, 'default'],
+                                              ['non-existent-login', 'default']])
+        self.assertEqual([[self._test_login, 'default', self._test_pwd_login]],
+                         response['passwords'])
+        response = self.client.request('logins', self._test_user, self.file_path)
+        self.assertEqual([self._test_login], response['logins']['logins'])
+
+        self.assertEqual('ok', self.client.request('stop')['status'])
+        thread.join(5)
+        self.assertEqual(False, thread.is_alive())
+        self.assertEqual(False, os.path.exists(self.socket_path))
+        self.assertIsNone(self.client.request('ping', self._test_user, self.file_path))
+
+    def test_session_expired(self):
+        """
+        check that the agent stops and wipes the key when the session expires
+        """
+        agent_obj, thread = self.start_agent(time_session=0.2)
+        thread.join(5)
+        self.assertEqual(False, thread.is_alive())
+        self.assertIsNone(agent_obj._secret_obj.key)
+        self.assertEqual(False, os.path.exists(self.socket_path))
+
+    def test_cli_without_password(self):
+        """
+        check that show does not ask the password while the agent is unlocked
+        """
+        agent_obj, thread = self.start_agent()
+        try:
+            with mock.patch('agent_manager.models.AGENT_SOCKET_PATH', self.socket_path):
+                result = CliRunner().invoke(cli_module.cli, ['show', '-u', self._test_user,
+                                                             '--db', self.file_path])
+        finally:
+            self.client.request('stop')
+            thread.join(5)
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertNotIn('Password', result.output)
+        self.assertIn(self._test_login, result.output)
+
+    def test_changes_of_other_processes(self):
+        """
+        check that the agent returns a password updated by another process
+        and stops when the user's password is changed
+        """
+        agent_obj, thread = self.start_agent()
+        response = self.client.request('get', self._test_user, self.file_path,
+                                       login=self._test_login, name='default')
+        self.assertEqual(self._test_pwd_login, response['password'])
+
+        other_manager_obj = SQLAlchemyManager(self.file_path, self._test_user)
+        encrypted = get_secret_obj(self._test_user, self._test_pwd_user).encrypt('new-secret')
+        with sqlite3.connect(self.file_path) as connection:
+            connection.execute('UPDATE units SET password = ? WHERE login = ?',
+                               (encrypted, self._test_login))
+        response = self.client.request('get', self._test_user, self.file_path,
+                                       login=self._test_login, name='default')
+        self.assertEqual('new-secret', response['password'])
+
+        other_manager_obj.user_obj.update_user(self.file_path, self._test_pwd_user, self._test_user,
+                                               'new-password')
+        response = self.client.request('ping', self._test_user, self.file_path)
+        self.assertEqual('error', response['status'])
+        self.assertIn('user was changed', response['message'])
+        thread.join(5)
+        self.assertEqual(False, thread.is_alive())
+        self.assertIsNone(agent_obj._secret_obj.key)
+
+    def test_cli_agent_exited(self):
+        """
+        check a clean error when the agent exits between the ping and the request of a command
+        """
+        with mock.patch('agent_manager.models.AGENT_SOCKET_PATH', self.socket_path), \
+                mock.patch.object(AgentClient, 'is_unlocked', return_value=True):
+            for args in (['show'], ['search', 'login'],
+                         ['get', '-l', self._test_login, '-n', 'default'],
+                         ['exec', '-m', f'VAR={self._test_login}', '--', 'true']):
+                with self.subTest(args[0]):
+                    result = CliRunner().invoke(cli_module.cli, args[:1] + [
+                        '-u', self._test_user, '--db', self.file_path] + args[1:])
+                    self.assertNotEqual(0, result.exit_code, result.output)
+                    self.assertIsInstance(result.exception, SystemExit)
+                    self.assertIn('Agent is not running anymore', result.output)
+
+    def test_foreign_socket(self):
+        """
+        check that the client ignores a socket of another user and the agent
+        does not replace a file which is not its socket
+        """
+        agent_obj, thread = self.start_agent()
+        try:
+            with mock.patch('agent_manager.models.os.getuid', return_value=os.getuid() + 1):
+                self.assertIsNone(self.client.request('ping', self._test_user, self.file_path))
+        finally:
+            self.client.request('stop')
+            thread.join(5)
+
+        with self.assertRaises(ValueError):
+            AgentServer(self._manager_obj, self._test_pwd_user, self.file_path)
+        self.assertEqual(True, self._manager_obj.user_obj.check_user())
+
+    def test_socket_path(self):
+        """
+        check the default socket directory: created for the owner only, an open one is refused
+        """
+        with mock.patch('agent_manager.models.AGENT_SOCKET_PATH', None), \
+                mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}), \
+                mock.patch('tempfile.tempdir', self._tmp_dir.name):
+            socket_path = get_socket_path(create=True)
+            directory = os.path.dirname(socket_path)
+            self.assertEqual(os.path.join(self._tmp_dir.name, f'pwdone-{os.getuid()}'), directory)
+            self.assertEqual(0o700, os.stat(directory).st_mode & 0o777)
+
+            os.chmod(directory, 0o777)
+            with self.assertRaises(ValueError):
+                get_socket_path()
+            self.assertIsNone(AgentClient().request('ping'))
+
+
+if __name__ == '__main__':
+    unittest.main()
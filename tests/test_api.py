@@ -0,0 +1,159 @@
+import base64
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from api_manager.models import ApiServer
+from database_manager.models import REGISTRY, SQLAlchemyManager
+
+
+class TestApiServer(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+    _test_login = 'test-login'
+    _test_pwd_login = 'T_l!456'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+
+        manager_obj = SQLAlchemyManager(self.file_path, self._test_user)
+        manager_obj.user_obj.add_user(self._test_pwd_user)
+        manager_obj.unit_obj.add_unit(self._test_user, self._test_pwd_user,
+                                      self._test_login, self._test_pwd_login)
+        self._servers = []
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        for server_obj, thread in self._servers:
+            server_obj.shutdown()
+            thread.join(5)
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def start_server(self, **kwargs):
+        server_obj = ApiServer(self.file_path, port=0, pool_size=2, **kwargs)
+        thread = threading.Thread(target=server_obj.serve_forever, daemon=True)
+        thread.start()
+        self._servers.append((server_obj, thread))
+        return server_obj
+
+    def request(self, connection, method, path, body=None, password=None):
+        credentials = f'{self._test_user}:{password or self._test_pwd_user}'
+        headers = {'Authorization': 'Basic ' + base64.b64encode(credentials.encode()).decode()}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_requests(self):
+        """
+        check units requests over one keep-alive connection
+        """
+        server_obj = self.start_server()
+        connection = http.client.HTTPConnection(*server_obj.address, timeout=5)
+        self.addCleanup(connection.close)
+
+        status, response = self.request(connection, 'GET',
+                                        f'/units/password?login={self._test_login}')
+        self.assertEqual((200, self._test_pwd_login), (status, response['password']))
+        new_unit = {'login': 'new-login', 'password': 'new-pwd', 'name': 'site'}
+        status, response = self.request(connection, 'POST', '/units', new_unit)
+        self.assertEqual(201, status)
+        status, response = self.request(connection, 'POST', '/units', new_unit)
+        self.assertEqual(409, status)
+        status, response = self.request(connection, 'GET', '/units')
+        self.assertEqual([self._test_login, 'new-login'], response['logins']['logins'])
+        status, response = self.request(connection, 'GET', '/units?page_size=1')
+        self.assertEqual(['new-login'], response['logins']['logins'])
+        self.assertIsNotNone(response['cursor'])
+        status, response = self.request(connection, 'GET', '/units/search?query=new')
+        self.assertEqual(['new-login'], response['logins']['logins'])
+
+        status, response = self.request(connection, 'PUT', '/units?login=new-login&name=site',
+                                        {'password': 'changed-pwd'})
+        self.assertEqual(200, status)
+        status, response = self.request(connection, 'GET',
+                                        '/units/password?login=new-login&name=site')
+        self.assertEqual('changed-pwd', response['password'])
+        status, response = self.request(connection, 'DELETE', '/units?login=new-login&name=site')
+        self.assertEqual(200, status)
+        status, response = self.request(connection, 'GET',
+                                        '/units/password?login=new-login&name=site')
+        self.assertEqual(404, status)
+
+        status, response = self.request(connection, 'GET', '/units/password?login=test-logn')
+        self.assertEqual((404, 'error'), (status, response['status']))
+        self.assertEqual([[self._test_login, 'default']], response['suggestions'])
+
+    def test_authorization(self):
+        """
+        check that requests without the user's password are rejected
+        """
+        server_obj = self.start_server()
+        connection = http.client.HTTPConnection(*server_obj.address, timeout=5)
+        self.addCleanup(connection.close)
+
+        status, response = self.request(connection, 'GET', '/units', password='wrong')
+        self.assertEqual((401, 'error'), (status, response['status']))
+        connection.request('GET', '/units')
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(401, response.status)
+        self.assertIn('Basic', response.getheader('WWW-Authenticate'))
+        connection.request('GET', '/ping')
+        self.assertEqual(200, connection.getresponse().status)
+
+    def test_bad_content_length(self):
+        """
+        check that a request with an incorrect Content-Length gets 400 and the connection is closed
+        """
+        server_obj = self.start_server()
+        for length in ('abc', '-1'):
+            with self.subTest(length=length):
+                connection = http.client.HTTPConnection(*server_obj.address, timeout=5)
+                self.addCleanup(connection.close)
+                connection.putrequest('POST', '/units')
+                connection.putheader('Content-Length', length)
+                connection.endheaders()
+                response = connection.getresponse()
+                self.assertEqual((400, 'error'),
+                                 (response.status, json.loads(response.read())['status']))
+                self.assertEqual('close', response.getheader('Connection'))
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'unix sockets are not supported')
+    def test_unix_socket(self):
+        """
+        check the API on a unix socket
+        """
+        socket_path = os.path.join(self._tmp_dir.name, 'api.sock')
+        self.start_server(socket_path=socket_path)
+        self.assertEqual(0o600, os.stat(socket_path).st_mode & 0o777)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(5)
+            client.connect(socket_path)
+            client.sendall(b'GET /ping HTTP/1.0\r\n\r\n')
+            with client.makefile('rb') as response:
+                self.assertIn(b'200', response.readline())
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'unix sockets are not supported')
+    def test_socket_path_is_file(self):
+        """
+        check that a socket path naming an existing file (e.g. the DB) is refused, not deleted
+        """
+        size = os.path.getsize(self.file_path)
+        with self.assertRaises(ValueError):
+            ApiServer(self.file_path, socket_path=self.file_path)
+        self.assertEqual(size, os.path.getsize(self.file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from database_manager.async_models import AsyncSQLAlchemyManager
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from encryption_manager.models import AESCipher
+
+
+class TestAsyncSQLAlchemyManager(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+        SQLAlchemyManager(self.file_path, self._test_user).user_obj.add_user(self._test_pwd_user)
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def test_units(self):
+        """
+        check add, get, update and delete of units through the event loop
+        """
+        async def scenario():
+            async with AsyncSQLAlchemyManager(self.file_path, self._test_user,
+                                              db_threads=2) as manager:
+                self.assertEqual(True, await manager.check_user())
+                self.assertEqual(True, await manager.check_user_password(self._test_pwd_user))
+                await manager.add_unit(self._test_user, self._test_pwd_user, 'login', 'password',
+                                       'name', 'category', 'https://test.ru/')
+                self.assertTrue(await manager.check_login('login', 'name'))
+                self.assertEqual({'logins': ['login'], 'category': ['category'],
+                                  'url': ['https://test.ru/'], 'name': ['name']},
+                                 await manager.get_logins())
+                self.assertEqual('password', await manager.get_password(
+                    self._test_user, self._test_pwd_user, 'login', 'name'))
+                self.assertEqual(None, await manager.get_password(
+                    self._test_user, self._test_pwd_user, 'login', 'default'))
+                await manager.update_unit(self._test_user, self._test_pwd_user, 'login', 'name',
+                                          password_for_login='new-password')
+                self.assertEqual('new-password', await manager.get_password(
+                    self._test_user, self._test_pwd_user, 'login', 'name'))
+                await manager.delete_unit('login', 'name')
+                self.assertFalse(await manager.check_login('login', 'name'))
+
+        asyncio.run(scenario())
+
+    def test_concurrent_lookups(self):
+        """
+        check that concurrent lookups are served outside of the event loop thread
+        """
+        logins = [f'login-{i}' for i in range(20)]
+        loop_thread = threading.get_ident()
+        threads = set()
+
+        async def lookup(manager, login):
+            loop = asyncio.get_running_loop()
+            threads.add(await loop.run_in_executor(None, threading.get_ident))
+            return await manager.get_password(self._test_user, self._test_pwd_user, login,
+                                              'default')
+
+        async def scenario():
+            async with AsyncSQLAlchemyManager(self.file_path, self._test_user) as manager:
+                await asyncio.gather(*(manager.add_unit(self._test_user, self._test_pwd_user,
+                                                        login, f'password-{login}')
+                                       for login in logins))
+                return await asyncio.gather(*(lookup(manager, login) for login in logins))
+
+        self.assertEqual([f'password-{login}' for login in logins], asyncio.run(scenario()))
+        self.assertNotIn(loop_thread, threads)
+
+    def test_update_encrypts_in_crypto_pool(self):
+        """
+        check that update_unit encrypts the new password in the crypto pool, not in a DB thread
+        """
+        threads = []
+        encrypt = AESCipher.encrypt
+
+        def spy(secret_obj, raw):
+            threads.append(threading.current_thread().name)
+            return encrypt(secret_obj, raw)
+
+        async def scenario(crypto_executor):
+            async with AsyncSQLAlchemyManager(self.file_path, self._test_user,
+                                              crypto_executor=crypto_executor) as manager:
+                await manager.add_unit(self._test_user, self._test_pwd_user, 'login', 'password',
+                                       'name')
+                with mock.patch.object(AESCipher, 'encrypt', spy):
+                    await manager.update_unit(self._test_user, self._test_pwd_user, 'login', 'name',
+                                              password_for_login='new-password')
+                return await manager.get_password(self._test_user, self._test_pwd_user, 'login',
+                                                  'name')
+
+        with ThreadPoolExecutor(thread_name_prefix='test-crypto') as crypto_executor:
+            self.assertEqual('new-password', asyncio.run(scenario(crypto_executor)))
+        self.assertEqual(1, len(threads))
+        self.assertTrue(threads[0].startswith('test-crypto'), threads)
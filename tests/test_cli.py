@@ -1,9 +1,12 @@
 # python -m unittest
-import unittest
 import pathlib
+import sys
+import unittest
+
 from click.testing import CliRunner
-from cli import cli
+
 import database_manager.models as models_db
+from cli import cli
 
 
 class TestCli(unittest.TestCase):
@@ -31,6 +34,8 @@ class TestCli(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         """Очистка сгенерированных тестовых данных"""
+        # закрываем соединения: при последнем закрытии sqlite удаляет файлы журнала WAL
+        models_db.REGISTRY.dispose()
         pathlib.Path.unlink(cls._path_project / 'test_users.sqlite')
     
     def test_uadd(self):
@@ -61,3 +66,26 @@ class TestCli(unittest.TestCase):
         res_str = result.output.split('\n')  # Делим вывод построчно
         # Проверяем нижнюю строку на соответсвии тексту ошибки
         self.assertEqual(res_str[-2], f'Error: User named "{self._login_user}" already exists')
+
+    def test_exec(self):
+        """
+        Test exec command
+        """
+        manager_obj = models_db.SQLAlchemyManager(self._file_user_db, 'exec-user')
+        manager_obj.user_obj.add_user(self._password_user)
+        manager_obj.unit_obj.add_unit('exec-user', self._password_user, 'admin', 'db-secret', 'db')
+        manager_obj.unit_obj.add_unit('exec-user', self._password_user, 'ci', 'ci-token')
+        args = ['exec', '-u', 'exec-user', '-p', self._password_user, '--db', self._file_user_db,
+                '-m', 'DB_PASSWORD=admin:db', '-m', 'CI_TOKEN=ci', '--', sys.executable, '-c',
+                'import os, sys; '
+                'sys.exit(os.environ["DB_PASSWORD"] != "db-secret" '
+                'or os.environ["CI_TOKEN"] != "ci-token")']
+
+        result = self.runner.invoke(cli, args)
+        self.assertEqual(0, result.exit_code, result.output)
+
+        # пароли нет: команда не запускается, выдаются подсказки
+        args[args.index('DB_PASSWORD=admin:db')] = 'DB_PASSWORD=admn:db'
+        result = self.runner.invoke(cli, args)
+        self.assertNotEqual(0, result.exit_code)
+        self.assertIn('Did you mean: login "admin" with "db" name?', result.output)
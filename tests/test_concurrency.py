@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from benchmarks.bench_concurrency import USER, create_vault, run
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from database_manager.sqlite_reader import connect, make_pragma_statements
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+        create_vault(self.file_path)
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def test_pragmas(self):
+        """
+        check that engine and reader connections get pragmas from settings
+        """
+        session = SQLAlchemyManager(self.file_path, USER).session_for_user
+        connection = session.connection().connection
+        self.assertEqual('wal', connection.execute('PRAGMA journal_mode').fetchone()[0])
+        self.assertEqual(5000, connection.execute('PRAGMA busy_timeout').fetchone()[0])
+        self.assertEqual(1, connection.execute('PRAGMA foreign_keys').fetchone()[0])
+        session.rollback()
+
+        reader_connection = connect(self.file_path)
+        self.assertEqual(5000, reader_connection.execute('PRAGMA busy_timeout').fetchone()[0])
+        reader_connection.close()
+
+        with self.assertRaises(ValueError):
+            make_pragma_statements({'journal_mode': 'WAL; DROP TABLE units'})
+
+    def test_read_does_not_lock(self):
+        """
+        check that a session which only reads doesn't keep the write lock
+        """
+        manager_obj = SQLAlchemyManager(self.file_path, USER)
+        self.assertEqual(True, manager_obj.user_obj.check_user())
+        manager_obj.unit_obj.get_logins()
+
+        connection = sqlite3.connect(self.file_path, timeout=0)
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute("INSERT INTO categories (category) VALUES ('category')")
+        connection.commit()
+        connection.close()
+
+    def test_processes(self):
+        """
+        check that several processes write and read the same DB without lock errors
+        """
+        done, errors, _ = run(self.file_path, 4, 25)
+        self.assertEqual(0, errors)
+        self.assertEqual(100, done)
+
+        connection = sqlite3.connect(self.file_path)
+        self.assertEqual(100, connection.execute('SELECT COUNT(*) FROM units').fetchone()[0])
+        connection.close()
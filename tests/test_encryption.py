@@ -1,7 +1,11 @@
+import pickle
 import random
+import time
 import unittest
 
-from encryption_manager.models import AESCipher, get_hash
+from encryption_manager.models import (AESCipher, KeyCache, decrypt_many,
+                                       get_hash, get_secret_obj, reencrypt)
+from settings import PARALLEL_CRYPTO_THRESHOLD
 
 PASSWORDCHARS = '+-/*!&$#?=@<>abcdefghijklnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890'
 STRCHARS = ' abcdefghijklnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890'
@@ -56,6 +60,98 @@ class TestEncryption(unittest.TestCase):
 
             self.assertEqual(str_for_test, result)
 
+    def test_parallel_reencrypt(self):
+        """
+        Тест проверяет, что перешифрование в пуле процессов сохраняет данные и порядок
+        """
+        old_cipher = AESCipher('old-password')
+        new_cipher = AESCipher('new-password')
+        strings = [f'string-{i}' for i in range(PARALLEL_CRYPTO_THRESHOLD + 1)]
+        encrypted = [old_cipher.encrypt(item) for item in strings]
+
+        reencrypted = reencrypt(encrypted, old_cipher, new_cipher, workers=2)
+
+        self.assertEqual(strings, decrypt_many(reencrypted, new_cipher, workers=1))
+        self.assertEqual(strings, decrypt_many(reencrypted, new_cipher, workers=2))
+
+    def test_key_cache(self):
+        """
+        Тест проверяет кеш ключей: повторное обращение без вывода ключа,
+        вытеснение и затирание ключей при clear
+        """
+        cache = KeyCache(maxsize=2, ttl=60)
+        first = cache.get('user', 'password')
+        self.assertIs(first.key, cache.get('user', 'password').key)
+        # ключ из кеша совпадает с выведенным без кеша
+        encrypted = first.encrypt('secret')
+        secret_obj = AESCipher(get_hash('userpassword'.encode('utf-8')))
+        self.assertEqual('secret', secret_obj.decrypt(encrypted))
+
+        cache.get('user', 'password-2')
+        cache.get('user', 'password-3')
+        self.assertEqual(2, len(cache))
+        self.assertIsNot(first.key, cache.get('user', 'password').key)
+
+        second = cache.get('user', 'password')
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertIsNone(second.key)
+
+    def test_key_cache_ttl(self):
+        """
+        Тест проверяет вытеснение ключей с истекшим временем жизни:
+        выданный ключ остается рабочим и затирается, когда его отпускают
+        """
+        cache = KeyCache(maxsize=2, ttl=0.01)
+        secret_obj = cache.get('user', 'password')
+        cipher = secret_obj._secret_obj
+        time.sleep(0.02)
+        self.assertIsNot(cipher, cache.get('user', 'password')._secret_obj)
+        self.assertEqual(1, len(cache))
+        self.assertEqual('secret', secret_obj.decrypt(secret_obj.encrypt('secret')))
+        del secret_obj
+        self.assertIsNone(cipher.key)
+
+    def test_key_cache_eviction(self):
+        """
+        Тест проверяет, что вытесненный ключ без ссылок затирается сразу,
+        а ключ, который держит вызывающий код (поток API, AsyncSQLAlchemyManager),
+        затирается только после того, как отпущена последняя ссылка
+        """
+        cache = KeyCache(maxsize=1, ttl=60)
+        unused = cache.get('user-a', 'password')._secret_obj
+        cache.get('user-b', 'password')
+        self.assertIsNone(unused.key)
+
+        first = cache.get('user-a', 'password')
+        second = cache.get('user-a', 'password')
+        cipher = first._secret_obj
+        encrypted = first.encrypt('secret')
+        cache.get('user-b', 'password')
+        self.assertEqual(1, len(cache))
+        self.assertEqual('secret', first.decrypt(encrypted))
+        del first
+        self.assertEqual('secret', second.decrypt(encrypted))
+        del second
+        self.assertIsNone(cipher.key)
+
+    def test_key_cache_pickle(self):
+        """
+        Тест проверяет, что в процессы передается копия ключа, а не ссылка на кеш
+        """
+        cache = KeyCache(maxsize=1, ttl=60)
+        secret_obj = cache.get('user', 'password')
+        copy = pickle.loads(pickle.dumps(secret_obj))
+        self.assertIsInstance(copy, AESCipher)
+        self.assertEqual('secret', copy.decrypt(secret_obj.encrypt('secret')))
+
+    def test_get_secret_obj(self):
+        """
+        Тест проверяет, что get_secret_obj переиспользует выведенный ключ
+        """
+        self.assertIs(get_secret_obj('user', 'password').key,
+                      get_secret_obj('user', 'password').key)
+
 
 # Запустить тестирование
 if __name__ == '__main__':
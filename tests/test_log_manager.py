@@ -0,0 +1,126 @@
+import contextlib
+import io
+import json
+import logging
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from cli import cli
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from log_manager import models
+from log_manager.operations import get_log_files, get_stats, iter_operations
+
+
+class TestLogManager(unittest.TestCase):
+
+    def setUp(self) -> None:
+        """Настройка окружения: лог во временном каталоге"""
+        models.flush_log()
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.log_path = pathlib.Path(self._tmp_dir.name) / 'logs' / 'pwdone.log'
+        self.operations_path = self.log_path.parent / 'operations.jsonl'
+        for name, value in (('LOGS_PATH', self.log_path),
+                            ('OPERATIONS_LOG_PATH', self.operations_path)):
+            patcher = mock.patch.object(models, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        models.flush_log()
+        self._tmp_dir.cleanup()
+
+    def test_log_and_print(self):
+        """
+        check printed prefixes and that queued records reach the file after flush_log
+        """
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            models.log_and_print('first\nline', logging.WARNING)
+            models.log_and_print('second', logging.ERROR, print_need=False)
+        self.assertEqual('Warning: first\nline\n', stream.getvalue())
+
+        models.flush_log()
+        lines = self.log_path.read_text(encoding='utf-8').splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertIn('WARNING', lines[0])
+        self.assertIn('first line', lines[0])
+        self.assertIn('second', lines[1])
+
+    def test_level(self):
+        """
+        check that messages under the level of the logger are not queued
+        """
+        models.LOG.setLevel(logging.INFO)
+        self.addCleanup(models.LOG.setLevel, logging.DEBUG)
+        with mock.patch.object(models.LOG, 'log') as log:
+            models.log_and_print('debug', logging.DEBUG, print_need=False)
+            models.log_and_print('info', logging.INFO, print_need=False)
+        log.assert_called_once_with(logging.INFO, 'info')
+
+    def test_operations_rotation(self):
+        """
+        check that the operations log is rotated by size and read back from all files, oldest first
+        """
+        with mock.patch.object(models, 'OPERATIONS_LOG_MAX_BYTES', 200):
+            for i in range(10):
+                models.log_operation({'command': 'get', 'duration_ms': i})
+            models.flush_log()
+        paths = get_log_files(self.operations_path)
+        self.assertGreater(len(paths), 1)
+        self.assertEqual(self.operations_path, paths[-1])
+        self.assertLessEqual(max(path.stat().st_size for path in paths), 200)
+
+        records = list(iter_operations(paths))
+        self.assertEqual(list(range(10)), [record['duration_ms'] for record in records])
+        # оборванная при записи строка пропускается
+        with open(self.operations_path, 'a', encoding='utf-8') as stream:
+            stream.write('{"command": "get", "durat')
+        self.assertEqual(10, len(list(iter_operations(paths))))
+
+    def test_stats(self):
+        """
+        check nearest rank percentiles by command
+        """
+        records = [{'command': 'get', 'duration_ms': value} for value in range(100, 0, -1)] + \
+            [{'command': 'show', 'duration_ms': 5}, {'command': 'show'}]
+        self.assertEqual({
+            'get': {'count': 100, 'p50': 50, 'p90': 90, 'p95': 95, 'p99': 99, 'max': 100},
+            'show': {'count': 1, 'p50': 5, 'p90': 5, 'p95': 5, 'p99': 5, 'max': 5},
+        }, get_stats(records))
+        self.assertEqual(['show'], list(get_stats(records, command='show')))
+
+    def test_cli(self):
+        """
+        check the operations log of cli commands and pwdone stats
+        """
+        file_db = str(pathlib.Path(self._tmp_dir.name) / 'users.sqlite')
+        manager_obj = SQLAlchemyManager(file_db, 'test-user')
+        manager_obj.user_obj.add_user('T_u!123')
+        manager_obj.unit_obj.add_unit('test-user', 'T_u!123', 'login', 'password')
+        self.addCleanup(REGISTRY.dispose)
+
+        runner = CliRunner()
+        for _ in range(2):
+            result = runner.invoke(cli, ['--operations-log', 'show', '-u', 'test-user',
+                                         '-p', 'T_u!123', '--db', file_db])
+            self.assertEqual(0, result.exit_code, result.output)
+        models.flush_log()
+        records = list(iter_operations([self.operations_path]))
+        self.assertEqual(2, len(records))
+        self.assertEqual('show', records[0]['command'])
+        self.assertEqual(1, records[0]['units'])
+        self.assertNotIn('test-user', json.dumps(records))
+        self.assertGreater(records[0]['sql_statements'], 0)
+
+        result = runner.invoke(cli, ['stats', '-f', 'json', '--file', str(self.operations_path)])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(2, json.loads(result.output)['show']['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+import unittest
+
+from click.testing import CliRunner
+
+from cli import cli
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from profile_manager.models import OTHER_PHASE, PROFILER, Profiler
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_spans(self):
+        """
+        check that nested phases are subtracted from the self time of outer ones
+        """
+        profiler = Profiler()
+        with profiler.span('disabled'):
+            pass
+        profiler.start()
+        with profiler.span('outer'):
+            time.sleep(0.02)
+            with profiler.span('inner'):
+                time.sleep(0.02)
+        profiler.begin('inner')
+        profiler.stop()
+
+        phases = profiler.get_phases()
+        self.assertNotIn('disabled', phases)
+        self.assertEqual(2, phases['inner'][0])
+        self.assertGreaterEqual(phases['outer'][1], 0.04)
+        self.assertLess(phases['outer'][2], phases['outer'][1] - 0.015)
+        self.assertIn(OTHER_PHASE, phases)
+        self.assertFalse(profiler.enabled)
+
+
+class TestProfileOption(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+        manager_obj = SQLAlchemyManager(self.file_path, self._test_user)
+        manager_obj.user_obj.add_user(self._test_pwd_user)
+        manager_obj.unit_obj.add_unit(self._test_user, self._test_pwd_user, 'test-login', 'secret')
+        REGISTRY.dispose()
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        PROFILER.stop()
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def test_profile(self):
+        """
+        check the phases report and the collapsed stacks file
+        """
+        output = os.path.join(self._tmp_dir.name, 'profile.folded')
+        result = CliRunner().invoke(cli, ['--profile-output', output, 'update',
+                                          '-u', self._test_user, '-p', self._test_pwd_user,
+                                          '-l', 'test-login', '-n', 'default',
+                                          '-pl', 'new-secret', '--db', self.file_path])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        for phase in ('engine', 'schema', 'sql', 'aes', 'wall'):
+            self.assertIn(phase, result.output)
+        with open(output, encoding='utf-8') as stream:
+            stacks = dict(line.rsplit(' ', 1) for line in stream.read().splitlines())
+        self.assertIn('schema;sql', stacks)
+        self.assertFalse(PROFILER.enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database_manager.models import REGISTRY, SCHEMA_VERSION, SQLAlchemyManager
+
+
+class TestSQLAlchemyManager(unittest.TestCase):
+    dir_path = 'tests' + os.sep + 'test_databases'
+    file_path = dir_path + os.sep + 'manager.sqlite'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        if not os.path.isdir(self.dir_path):
+            os.makedirs(self.dir_path)
+        REGISTRY.dispose()
+        REGISTRY.stats.update(engines=0, connections=0, schema_checks=0)
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        REGISTRY.dispose()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        """cleaning after finishing all tests"""
+        os.rmdir(cls.dir_path)
+
+    def test_shared_engine(self):
+        """
+        check that managers of one DB share engine, session and schema check
+        """
+        first = SQLAlchemyManager(self.file_path, 'first')
+        second = SQLAlchemyManager(self.file_path, 'second')
+        first.user_obj.check_user()
+        second.user_obj.check_user()
+
+        self.assertIs(first.session_for_user, second.session_for_user)
+        self.assertEqual(1, REGISTRY.stats['engines'])
+        self.assertEqual(1, REGISTRY.stats['schema_checks'])
+        self.assertEqual(1, REGISTRY.stats['connections'])
+
+    def test_recreated_file(self):
+        """
+        check that a removed DB file gets a new engine and schema
+        """
+        SQLAlchemyManager(self.file_path, 'first').user_obj.add_user('password')
+        os.remove(self.file_path)
+
+        manager_obj = SQLAlchemyManager(self.file_path, 'first')
+        self.assertEqual(False, manager_obj.user_obj.check_user())
+        self.assertEqual(2, REGISTRY.stats['engines'])
+
+    def test_warm_start(self):
+        """
+        check that a DB with actual schema costs one version read and no DDL
+        """
+        SQLAlchemyManager(self.file_path)
+        REGISTRY.dispose()
+
+        statements = []
+
+        def collect(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(Engine, 'before_cursor_execute', collect)
+        try:
+            SQLAlchemyManager(self.file_path)
+        finally:
+            event.remove(Engine, 'before_cursor_execute', collect)
+        self.assertEqual(['SELECT MAX(version) FROM schema_version'], statements)
+
+    def test_upgrade_old_db(self):
+        """
+        check that a DB created before schema versioning gets all migrations
+        """
+        connection = sqlite3.connect(self.file_path)
+        connection.execute('CREATE TABLE users (id INTEGER NOT NULL, user VARCHAR NOT NULL, '
+                           'password VARCHAR NOT NULL, PRIMARY KEY (id), '
+                           'UNIQUE (user) ON CONFLICT FAIL)')
+        connection.execute("INSERT INTO users (user, password) VALUES ('old-user', 'hash')")
+        connection.commit()
+        connection.close()
+
+        manager_obj = SQLAlchemyManager(self.file_path, 'old-user')
+        self.assertEqual(True, manager_obj.user_obj.check_user())
+
+        connection = sqlite3.connect(self.file_path)
+        versions = connection.execute('SELECT version FROM schema_version').fetchall()
+        connection.close()
+        self.assertEqual(list(range(1, SCHEMA_VERSION + 1)), [row[0] for row in versions])
+
+    def test_unit_indexes_migration(self):
+        """
+        check that the category index is added to a vault created without it
+        and the index repeating the unique constraint is dropped
+        """
+        connection = sqlite3.connect(self.file_path)
+        connection.executescript(
+            'CREATE TABLE units (id INTEGER NOT NULL, user_id INTEGER, login VARCHAR NOT NULL, '
+            'url VARCHAR, name VARCHAR NOT NULL, category_id INTEGER, password VARCHAR NOT NULL, '
+            'PRIMARY KEY (id), UNIQUE (user_id, login, name));'
+            'CREATE UNIQUE INDEX ix_units_user_login_name ON units (user_id, login, name);'
+            "INSERT INTO units (user_id, login, name, password) VALUES (1, 'login', 'name', 'a');"
+            "INSERT INTO units (user_id, login, name, password) "
+            "VALUES (1, 'login', 'name-2', 'b');")
+        connection.close()
+
+        SQLAlchemyManager(self.file_path)
+
+        connection = sqlite3.connect(self.file_path)
+        indexes = {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'units'")}
+        trigram_units = connection.execute(
+            'SELECT COUNT(DISTINCT unit_id) FROM unit_trigrams').fetchone()[0]
+        connection.close()
+        self.assertEqual({'sqlite_autoindex_units_1', 'ix_units_category_id'}, indexes)
+        # the trigram index is filled for existing units
+        self.assertEqual(2, trigram_units)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database_manager.models import REGISTRY, SQLAlchemyManager
+from database_manager.sqlite_reader import SQLiteReader, connect
+
+
+class TestSQLiteReader(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+
+        self._manager_obj = SQLAlchemyManager(self.file_path, self._test_user)
+        self._manager_obj.user_obj.add_user(self._test_pwd_user)
+        SQLAlchemyManager(self.file_path, 'another-user').user_obj.add_user('password')
+        unit_obj = self._manager_obj.unit_obj
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'login-1', 'password-1')
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'login-2', 'password-2',
+                          'name-2', category='category', url='https://test.ru/')
+        self._connection = connect(self.file_path)
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        self._connection.close()
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def test_same_as_orm(self):
+        """
+        check that reader answers the same as UserManager and UnitManager
+        """
+        reader = SQLiteReader(self._connection, self._test_user)
+        user_obj = self._manager_obj.user_obj
+        unit_obj = self._manager_obj.unit_obj
+
+        self.assertEqual(user_obj.all_users(), reader.all_users())
+        self.assertEqual(True, reader.check_user())
+        self.assertEqual(False, SQLiteReader(self._connection, 'non-existent-user').check_user())
+        self.assertEqual(True, reader.check_user_password(self._test_pwd_user))
+        self.assertEqual(False, reader.check_user_password('incorrect-password'))
+        for category in (None, 'default', 'category', 'non-existent-category'):
+            self.assertEqual(unit_obj.get_logins(category), reader.get_logins(category))
+        for limit, offset in ((1, 0), (1, 1), (None, 1), (0, 0)):
+            self.assertEqual(unit_obj.get_logins(None, limit, offset),
+                             reader.get_logins(None, limit, offset))
+        self.assertEqual(['login-2'], reader.get_logins(None, 5, 1)['logins'])
+        cursor = None
+        for category in (None, 'category'):
+            self.assertEqual(unit_obj.get_page(category, cursor, 1),
+                             reader.get_page(category, cursor, 1))
+        cursor = reader.get_page(None, None, 1)[1]
+        self.assertEqual(unit_obj.get_page(None, cursor, 1), reader.get_page(None, cursor, 1))
+        self.assertEqual(['login-2'], reader.get_page(None, cursor, 1)[0]['logins'])
+        self.assertEqual(True, reader.has_fts())
+        for query, category in (('login', None), ('test.ru', None), ('login', 'category'),
+                                ('none', None)):
+            self.assertEqual(unit_obj.search(query, category), reader.search(query, category))
+        self.assertEqual(['login-2'], reader.search('test.ru')['logins'])
+        for login, name in (('login-3', 'name-2'), ('logn', None), ('unknown', 'default')):
+            self.assertEqual(unit_obj.suggest(login, name), reader.suggest(login, name))
+        self.assertEqual([('login-2', 'name-2')], reader.suggest('login-3', 'name-2', 1))
+        self.assertEqual(True, reader.check_login('login-2', 'name-2'))
+        self.assertEqual(False, reader.check_login('login-2', 'default'))
+        self.assertEqual('password-2', reader.get_password(self._test_user, self._test_pwd_user,
+                                                           'login-2', 'name-2'))
+        pairs = [('login-1', 'default'), ('login-2', 'name-2'), ('login-2', 'default')]
+        self.assertEqual(unit_obj.get_encrypted_passwords(pairs),
+                         reader.get_encrypted_passwords(pairs))
+        self.assertEqual({('login-1', 'default'): 'password-1',
+                          ('login-2', 'name-2'): 'password-2'},
+                         reader.get_passwords(self._test_user, self._test_pwd_user, pairs))
+
+    def test_read_only(self):
+        """
+        check that reader connection can not write
+        """
+        with self.assertRaises(sqlite3.OperationalError):
+            self._connection.execute("DELETE FROM units")
+
+    def test_no_fast_path(self):
+        """
+        check that missing or outdated DB is left for ORM
+        """
+        missing_path = os.path.join(self._tmp_dir.name, 'missing.sqlite')
+        self.assertIsNone(connect(missing_path))
+        self.assertEqual(False, os.path.exists(missing_path))
+
+        outdated_path = os.path.join(self._tmp_dir.name, 'outdated.sqlite')
+        connection = sqlite3.connect(outdated_path)
+        connection.execute('CREATE TABLE users '
+                           '(id INTEGER PRIMARY KEY, user VARCHAR, password VARCHAR)')
+        connection.close()
+        self.assertIsNone(connect(outdated_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from database_manager.models import REGISTRY, SQLAlchemyManager
+
+CLI_PATH = pathlib.Path(__file__).resolve().parent.parent / 'cli.py'
+
+# бюджеты холодного старта в секундах, с запасом на медленные CI
+HELP_BUDGET = 1.0
+GET_BUDGET = 1.5
+
+
+class TestStartup(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+        SQLAlchemyManager(self.file_path, self._test_user).user_obj.add_user(self._test_pwd_user)
+        REGISTRY.dispose()
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        self._tmp_dir.cleanup()
+
+    def run_cli(self, args):
+        """Запуск cli в новом процессе, возвращает (результат, время, импортированные модули)"""
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', str(CLI_PATH)] + args,
+                                cwd=self._tmp_dir.name, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        modules = {line.split('|')[-1].strip() for line in result.stderr.splitlines()
+                   if line.startswith('import time:')}
+        return result, elapsed, modules
+
+    def test_help(self):
+        """
+        check that --help imports no DB, crypto, clipboard and cProfile modules and fits the budget
+        """
+        result, elapsed, modules = self.run_cli(['--help'])
+
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual(set(), modules & {'sqlalchemy', 'Crypto', 'pyperclip', 'cProfile'})
+        # --help doesn't touch the filesystem
+        self.assertEqual(False, os.path.exists(os.path.join(self._tmp_dir.name, 'logs')))
+        self.assertLess(elapsed, HELP_BUDGET)
+
+    def test_get(self):
+        """
+        check that get reads the DB without ORM, imports no clipboard module
+        until it is needed and fits the budget
+        """
+        result, elapsed, modules = self.run_cli(
+            ['get', '-u', self._test_user, '-p', self._test_pwd_user,
+             '-l', 'non-existent-login', '-n', 'default', '--db', self.file_path])
+
+        self.assertIn('not exists', result.stdout)
+        self.assertEqual(set(), modules & {'sqlalchemy', 'pyperclip'})
+        self.assertLess(elapsed, GET_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
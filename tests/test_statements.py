@@ -0,0 +1,134 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from click.testing import CliRunner
+from sqlalchemy.orm import sessionmaker
+
+from cli import cli
+from database_manager.models import (REGISTRY, SQLAlchemyManager, UnitManager,
+                                     UserManager)
+from database_manager.sqlite_reader import SQLiteReader, connect
+from database_manager.statements import (STATS, StatementCounter,
+                                         assert_max_queries)
+
+
+class TestStatements(unittest.TestCase):
+    _test_user = 'test-user'
+    _test_pwd_user = 'T_u!123'
+    # units в хранилище: бюджеты не должны зависеть от их числа
+    _units = 50
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._tmp_dir.name, 'users.sqlite')
+        self._manager_obj = SQLAlchemyManager(self.file_path, self._test_user)
+        self._manager_obj.user_obj.add_user(self._test_pwd_user)
+        self._manager_obj.unit_obj.import_units(self._test_user, self._test_pwd_user, (
+            {'login': f'login-{i}', 'password': f'password-{i}', 'name': f'name-{i % 3}',
+             'category': f'category-{i % 5}', 'url': None} for i in range(self._units)))
+        self._session = self._manager_obj.session_for_user
+        self._engine = self._session.get_bind()
+
+    def tearDown(self) -> None:
+        """Чистка, после завершения тестов"""
+        REGISTRY.dispose()
+        self._tmp_dir.cleanup()
+
+    def unit_obj(self):
+        """Новый менеджер без кеша id пользователя и объектов сессии, как у нового запуска cli"""
+        self._session.expunge_all()
+        return UnitManager(self._session, self._test_user)
+
+    def get_logins_in_new_session(self):
+        session = sessionmaker(bind=self._engine)()
+        try:
+            UnitManager(session, self._test_user).get_logins()
+        finally:
+            session.close()
+
+    def test_budgets(self):
+        """
+        check statement budgets of manager operations, without N+1 queries
+        """
+        user, password = self._test_user, self._test_pwd_user
+        budgets = [
+            ('add_user', 1, lambda: UserManager(self._session, 'new-user').add_user(password)),
+            ('check_user_password', 1,
+             lambda: UserManager(self._session, user).check_user_password(password)),
+            # id пользователя, категория (INSERT OR IGNORE и SELECT), unit, триграммы
+            ('add_unit', 5, lambda: self.unit_obj().add_unit(user, password, 'new-login', 'secret',
+                                                             'default', 'new-category')),
+            ('get_logins', 2, lambda: self.unit_obj().get_logins()),
+            ('get_logins category', 2, lambda: self.unit_obj().get_logins('category-1')),
+            ('get_page', 2, lambda: self.unit_obj().get_page(None, None, 10)),
+            ('search', 3, lambda: self.unit_obj().search('login')),
+            ('suggest', 2, lambda: self.unit_obj().suggest('logn-1', 'name-1')),
+            ('get_password', 2,
+             lambda: self.unit_obj().get_password(user, password, 'login-1', 'name-1')),
+            ('get_passwords', 2, lambda: self.unit_obj().get_passwords(
+                user, password, [(f'login-{i}', f'name-{i % 3}') for i in range(self._units)])),
+            ('update_unit', 4, lambda: self.unit_obj().update_unit(
+                user, password, 'login-2', 'name-2', None, 'new-secret')),
+            ('delete_unit', 2, lambda: self.unit_obj().delete_unit('login-3', 'name-0')),
+            ('update_user', 4, lambda: UserManager(self._session, user).update_user(
+                self.file_path, password, 'renamed-user', 'new-password')),
+        ]
+        for operation, budget, func in budgets:
+            with self.subTest(operation):
+                with assert_max_queries(self._engine, budget):
+                    func()
+
+    def test_assert_max_queries(self):
+        """
+        check that the helper fails with the list of statements over the budget
+        """
+        with self.assertRaises(AssertionError) as context:
+            with assert_max_queries(self._engine, 1) as stats:
+                for i in range(3):
+                    self.unit_obj().get_unit(f'login-{i}', 'name-0')
+        self.assertEqual(6, stats.count)
+        self.assertIn('6 statements executed, expected at most 1', str(context.exception))
+        self.assertIn('FROM units', str(context.exception))
+
+    def test_counter(self):
+        """
+        check counts of a manager call, other threads and process stats
+        """
+        thread = threading.Thread(target=self.get_logins_in_new_session)
+        with self._manager_obj.count_statements() as stats:
+            self._manager_obj.unit_obj.get_logins()
+            thread.start()
+            thread.join()
+        self.assertEqual(1, stats.count)
+        self.assertGreater(stats.seconds, 0)
+        with StatementCounter(self._engine, all_threads=True) as all_stats:
+            thread = threading.Thread(target=self.get_logins_in_new_session)
+            thread.start()
+            thread.join()
+        self.assertEqual(2, all_stats.count)
+
+        # запросы sqlite3 без ORM тоже в общем счете: пользователь и units
+        connection = connect(self.file_path)
+        count_before = STATS.count
+        try:
+            SQLiteReader(connection, self._test_user).get_logins()
+        finally:
+            connection.close()
+        self.assertEqual(count_before + 2, STATS.count)
+
+    def test_command_log(self):
+        """
+        check that a command writes the number of its statements to the log
+        """
+        with self.assertLogs('cli', level='DEBUG') as logs:
+            result = CliRunner().invoke(cli, ['show', '-u', self._test_user,
+                                              '-p', self._test_pwd_user, '--db', self.file_path])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertTrue(any('SQL statements in' in line for line in logs.output), logs.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
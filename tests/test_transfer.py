@@ -0,0 +1,136 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from units_manager.transfer import (EXPORT_HEADER, ExportWriter, UnitsReader,
+                                    atomic_write, batched)
+
+
+class TestTransfer(unittest.TestCase):
+
+    def test_csv_browser_exports(self):
+        """
+        check reading of Chrome and Firefox csv exports
+        """
+        chrome = io.StringIO('name,url,username,password\n'
+                             'site.ru,https://site.ru/,user,pass-1\n'
+                             'no-password,https://site.ru/,user,\n')
+        units_reader = UnitsReader(chrome, 'csv')
+        self.assertEqual([{'login': 'user', 'password': 'pass-1', 'name': 'site.ru',
+                           'category': 'default', 'url': 'https://site.ru/'}], list(units_reader))
+        self.assertEqual(1, units_reader.count)
+        self.assertEqual(1, units_reader.invalid)
+
+        firefox = io.StringIO('"url","username","password","httpRealm","guid"\n'
+                              '"https://mail.ru/login","user","pass-2","","{1}"\n')
+        # name is taken from the url host, so logins of different sites don't collide
+        self.assertEqual('mail.ru', list(UnitsReader(firefox, 'csv'))[0]['name'])
+
+    def test_json(self):
+        """
+        check reading of json list, Bitwarden export and json lines
+        """
+        bitwarden = io.StringIO(json.dumps({'items': [
+            {'name': 'site', 'login': {'username': 'user', 'password': 'pass',
+                                       'uris': [{'uri': 'https://site.ru/'}]}}]}))
+        self.assertEqual([{'login': 'user', 'password': 'pass', 'name': 'site',
+                           'category': 'default', 'url': 'https://site.ru/'}],
+                         list(UnitsReader(bitwarden, 'json')))
+
+        records = [{'login': f'user-{i}', 'password': 'pass', 'category': 'work'} for i in range(3)]
+        json_lines = io.StringIO('\n'.join(json.dumps(record) for record in records) + '\n\n')
+        units = list(UnitsReader(json_lines, 'jsonl'))
+        self.assertEqual(['user-0', 'user-1', 'user-2'], [unit_['login'] for unit_ in units])
+        self.assertEqual({'work'}, {unit_['category'] for unit_ in units})
+        self.assertEqual({'default'}, {unit_['name'] for unit_ in units})
+
+    def test_export(self):
+        """
+        check that export is encrypted by chunks and can be read back
+        """
+        units = [{'login': f'user-{i}', 'password': f'secret-{i}', 'name': 'default',
+                  'category': 'default', 'url': None} for i in range(5)]
+        stream = io.StringIO()
+        with ExportWriter(stream, 'export-password', chunk_size=2,
+                          iterations=1000) as export_writer:
+            for unit_ in units:
+                export_writer.write(unit_)
+
+        lines = stream.getvalue().splitlines()
+        # header with the salt, three chunks: 2 + 2 + 1 units and the trailer
+        self.assertTrue(lines[0].startswith(EXPORT_HEADER + ' pbkdf2-sha256 1000 '), lines[0])
+        self.assertEqual(5, len(lines))
+        self.assertNotIn('secret-', stream.getvalue())
+
+        stream.seek(0)
+        self.assertEqual(units, list(UnitsReader(stream, 'pwdone', 'export-password')))
+
+        stream.seek(0)
+        with self.assertRaises(ValueError):
+            list(UnitsReader(stream, 'pwdone', 'incorrect-password'))
+
+        # every export has its own salt
+        other_stream = io.StringIO()
+        ExportWriter(other_stream, 'export-password', iterations=1000)
+        self.assertNotEqual(lines[0], other_stream.getvalue().strip())
+
+    def test_export_damaged(self):
+        """
+        check that truncated exports and exports with changed, dropped
+        or reordered chunks are refused
+        """
+        stream = io.StringIO()
+        with ExportWriter(stream, 'export-password', chunk_size=1,
+                          iterations=1000) as export_writer:
+            for i in range(3):
+                export_writer.write({'login': f'user-{i}', 'password': 'secret', 'name': 'default',
+                                     'category': 'default', 'url': None})
+        header, *chunks, trailer = stream.getvalue().splitlines()
+        changed_chunk = ('A' if chunks[1][0] != 'A' else 'B') + chunks[1][1:]
+        changed_header = header[:-2] + ('00' if header[-2:] != '00' else '11')
+        damaged_files = {
+            'no trailer': [header] + chunks,
+            'truncated': [header] + chunks[:2],
+            'dropped chunk': [header] + chunks[:1] + chunks[2:] + [trailer],
+            'reordered chunks': [header, chunks[1], chunks[0], chunks[2], trailer],
+            'changed chunk': [header, chunks[0], changed_chunk, chunks[2], trailer],
+            'changed salt': [changed_header] + chunks + [trailer],
+            'unknown kdf': [header.replace('pbkdf2-sha256', 'md5')] + chunks + [trailer],
+        }
+        for title, lines in damaged_files.items():
+            with self.subTest(title):
+                with self.assertRaises(ValueError):
+                    list(UnitsReader(io.StringIO('\n'.join(lines) + '\n'), 'pwdone',
+                                     'export-password'))
+
+    def test_atomic_write(self):
+        """
+        check that a failed write keeps the old file and leaves no temporary file
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'export.pwdone')
+            with atomic_write(path) as stream:
+                stream.write('old')
+            with self.assertRaises(RuntimeError):
+                with atomic_write(path) as stream:
+                    stream.write('partial')
+                    raise RuntimeError
+            self.assertEqual(['export.pwdone'], os.listdir(tmp_dir))
+            with open(path, encoding='utf-8') as stream:
+                self.assertEqual('old', stream.read())
+
+    def test_batched(self):
+        """
+        check splitting into batches
+        """
+        self.assertEqual([[0, 1], [2, 3], [4]], list(batched(range(5), 2)))
+        self.assertEqual([], list(batched([], 2)))
+        for batch_size in (0, -1):
+            with self.assertRaises(ValueError):
+                list(batched(range(5), batch_size))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,13 @@ import unittest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from database_manager.models import Base, UnitManager, UserManager
+from database_manager.models import (Base, UnitManager, UserManager,
+                                     migration_add_unit_trigrams,
+                                     migration_add_units_fts)
+from database_manager.search import make_suggest_query, make_trigrams
+from database_manager.statements import StatementCounter, assert_max_queries
 from encryption_manager.models import get_secret_obj
+from units_manager.models import encode_cursor
 
 
 class TestUnitManager(unittest.TestCase):
@@ -35,7 +40,8 @@ class TestUnitManager(unittest.TestCase):
                                  tables=[
                                      Base.metadata.tables["users"],
                                      Base.metadata.tables["units"],
-                                     Base.metadata.tables["categories"]
+                                     Base.metadata.tables["categories"],
+                                     Base.metadata.tables["unit_trigrams"]
                                  ])
 
         self._session_for_user = sessionmaker(bind=engine)()
@@ -135,6 +141,26 @@ class TestUnitManager(unittest.TestCase):
         self.assertEqual(self._test_pwd_login, unit_obj.get_password(self._test_user, self._test_pwd_user,
                                                                      self._test_login, self._test_name))
 
+    def test_get_passwords(self):
+        """
+        check that get_passwords reads all passwords with one query
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        for i in range(3):
+            unit_obj.add_unit(self._test_user, self._test_pwd_user,
+                              f'login-{i}', f'password-{i}', self._test_name)
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'login-0', 'password-default')
+        unit_obj.get_user_id()
+
+        with assert_max_queries(self._session_for_user.get_bind(), 1):
+            passwords = unit_obj.get_passwords(
+                self._test_user, self._test_pwd_user,
+                [('login-0', self._test_name), ('login-2', self._test_name), ('login-0', 'default'),
+                 ('login-1', 'default'), ('non-existent-login', self._test_name)])
+        self.assertEqual({('login-0', self._test_name): 'password-0',
+                          ('login-2', self._test_name): 'password-2',
+                          ('login-0', 'default'): 'password-default'}, passwords)
+
     def test_delete_unit(self):
         """
         check for delete_unit
@@ -311,6 +337,249 @@ class TestUnitManager(unittest.TestCase):
         self.assertEqual(self._test_pwd_login, unit_obj.get_password(newer_user, new_password,
                                                                      self._test_login, self._test_name))
 
+    def test_update_user_atomic(self):
+        """
+        check that a failed re-encryption leaves the user and all units untouched
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        for i in '123':
+            unit_obj.add_unit(self._test_user, self._test_pwd_user,
+                              self._test_login + i, self._test_pwd_login + i, self._test_name)
+        # the unit that can not be decrypted breaks re-encryption in the middle
+        self._cursor_sqlite.execute("UPDATE units SET password = '@@@@' WHERE login = ?",
+                                    [self._test_login + '2'])
+        self._conn_sqlite.commit()
+
+        user_obj = UserManager(self._session_for_user, self._test_user)
+        with self.assertRaises(ValueError):
+            user_obj.update_user(self.file_path, self._test_pwd_user, 'new-user', 'N_u!123')
+
+        self.assertEqual(True, user_obj.check_user_password(self._test_pwd_user))
+        self.assertEqual(False, user_obj.check_user('new-user'))
+        for i in '13':
+            self.assertEqual(self._test_pwd_login + i,
+                             unit_obj.get_password(self._test_user, self._test_pwd_user,
+                                                   self._test_login + i, self._test_name))
+
+    def test_import_units(self):
+        """
+        check for import_units
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'login-0', 'old-password')
+
+        units = ({'login': f'login-{i}', 'password': f'password-{i}', 'name': 'default',
+                  'category': f'category-{i % 2}', 'url': None} for i in range(25))
+        added = unit_obj.import_units(self._test_user, self._test_pwd_user, units, batch_size=10)
+
+        # existing login-0 is skipped and keeps its password
+        self.assertEqual(24, added)
+        self.assertEqual(25, unit_obj.count_units())
+        self.assertEqual('old-password', unit_obj.get_password(self._test_user, self._test_pwd_user,
+                                                               'login-0', 'default'))
+        self.assertEqual('password-7', unit_obj.get_password(self._test_user, self._test_pwd_user,
+                                                             'login-7', 'default'))
+        self.assertEqual(['login-1', 'login-3'], unit_obj.get_logins('category-1')['logins'][:2])
+        categories = self._cursor_sqlite.execute('SELECT category FROM categories').fetchall()
+        self.assertEqual(['category-0', 'category-1', 'default'],
+                         sorted(row[0] for row in categories))
+
+    def test_iter_units(self):
+        """
+        check for iter_units
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'login-1', 'password-1')
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'login-2', 'password-2',
+                          'name-2', category='category', url='https://test.ru/')
+
+        self.assertEqual([{'login': 'login-1', 'password': 'password-1', 'name': 'default',
+                           'category': 'default', 'url': None},
+                          {'login': 'login-2', 'password': 'password-2', 'name': 'name-2',
+                           'category': 'category', 'url': 'https://test.ru/'}],
+                         list(unit_obj.iter_units(self._test_user, self._test_pwd_user,
+                                                  batch_size=1)))
+
+    def test_get_page(self):
+        """
+        check for get_page: pages by (login, name) cover all units once
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        for i in range(7):
+            unit_obj.add_unit(self._test_user, self._test_pwd_user, f'login-{i % 3}', 'password',
+                              f'name-{i}', category='category' if i % 2 else 'default')
+
+        pages, cursor = [], None
+        while True:
+            logins, cursor = unit_obj.get_page(cursor=cursor, limit=3)
+            pages.append(list(zip(logins['logins'], logins['name'])))
+            if cursor is None:
+                break
+        self.assertEqual([3, 3, 1], [len(page) for page in pages])
+        self.assertEqual(sorted((f'login-{i % 3}', f'name-{i}') for i in range(7)),
+                         [key for page in pages for key in page])
+
+        logins, cursor = unit_obj.get_page('category', limit=3)
+        self.assertEqual(['name-3', 'name-1', 'name-5'], logins['name'])
+        self.assertEqual(None, cursor)
+        with self.assertRaises(ValueError):
+            unit_obj.get_page(cursor='incorrect-cursor')
+
+    def test_index_usage(self):
+        """
+        check that unit lookups search units by index on a vault with 100k units
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        unit_obj.add_unit(
+            self._test_user, self._test_pwd_user,
+            self._test_login, self._test_pwd_login, self._test_name
+        )
+        user_id = unit_obj.get_user_id()
+        category_id = self._cursor_sqlite.execute('SELECT id FROM categories').fetchone()[0]
+        self._cursor_sqlite.executemany(
+            'INSERT INTO units (user_id, login, name, category_id, password) '
+            'VALUES (?, ?, ?, ?, ?)',
+            ((user_id, f'login-{i}', 'default', category_id, 'encrypted')
+             for i in range(100000)))
+        self._conn_sqlite.commit()
+
+        with StatementCounter(self._session_for_user.get_bind()) as stats:
+            unit_obj.check_login(self._test_login, self._test_name)
+            unit_obj.get_password(self._test_user, self._test_pwd_user,
+                                  self._test_login, self._test_name)
+            unit_obj.update_unit(self._test_user, self._test_pwd_user,
+                                 self._test_login, self._test_name, url='https://test.ru/')
+            unit_obj.delete_unit(self._test_login, self._test_name)
+            unit_obj.get_page(limit=10)
+            unit_obj.get_page(cursor=encode_cursor('login-50000', 'default'), limit=10)
+
+        units_statements = [item for item in zip(stats.statements, stats.parameters)
+                            if 'units' in item[0]]
+        self.assertNotEqual([], units_statements)
+        for statement, parameters in units_statements:
+            plan = ' '.join(row[3] for row in self._cursor_sqlite.execute(
+                'EXPLAIN QUERY PLAN ' + statement, parameters))
+            # check that units are searched by index and never scanned
+            self.assertIn('sqlite_autoindex_units_1', plan, statement)
+            self.assertNotIn('SCAN units', plan, statement)
+
+    def test_search(self):
+        """
+        check for search with full-text index and without it (LIKE)
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'alice@github.com', 'password',
+                          'github', category='work', url='https://github.com/login')
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'bob', 'password',
+                          'gitlab', category='home')
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'carol', 'password')
+        UserManager(self._session_for_user, 'another-user').add_user('password')
+        UnitManager(self._session_for_user, 'another-user').add_unit(
+            'another-user', 'password', 'alice@github.com', 'password', 'github')
+
+        def check_search():
+            self.assertEqual(['alice@github.com'], unit_obj.search('github.com')['logins'])
+            self.assertEqual(['alice@github.com', 'bob'],
+                             sorted(unit_obj.search('git')['logins']))
+            self.assertEqual(['bob'], unit_obj.search('git home')['logins'])
+            self.assertEqual(['bob'], unit_obj.search('git', category='home')['logins'])
+            self.assertEqual(1, len(unit_obj.search('git', limit=1)['logins']))
+            self.assertEqual([], unit_obj.search('"git" OR bob')['logins'])
+            self.assertEqual([], unit_obj.search(' ')['logins'])
+
+        self.assertEqual(False, unit_obj.has_fts())
+        check_search()
+
+        with self._session_for_user.get_bind().begin() as connection:
+            migration_add_units_fts(connection)
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        self.assertEqual(True, unit_obj.has_fts())
+        check_search()
+
+        # триггеры поддерживают индекс при изменении и удалении units
+        unit_obj.update_unit(self._test_user, self._test_pwd_user, 'carol', 'default',
+                             url='https://gitea.io/')
+        unit_obj.delete_unit('bob', 'gitlab')
+        self.assertEqual(['alice@github.com', 'carol'], sorted(unit_obj.search('git')['logins']))
+
+    def test_suggest(self):
+        """
+        check for suggest: nearest units by trigram index, kept up to date on add, update, delete
+        """
+        with self._session_for_user.get_bind().begin() as connection:
+            migration_add_unit_trigrams(connection)
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        unit_obj.add_unit(self._test_user, self._test_pwd_user, 'alice@github.com', 'password',
+                          'github')
+        unit_obj.import_units(self._test_user, self._test_pwd_user, [
+            {'login': 'alice@gitlab.com', 'password': 'password', 'name': 'gitlab',
+             'category': 'default', 'url': None},
+            {'login': 'bob', 'password': 'password', 'name': 'default',
+             'category': 'default', 'url': None}])
+        UserManager(self._session_for_user, 'another-user').add_user('password')
+        UnitManager(self._session_for_user, 'another-user').add_unit(
+            'another-user', 'password', 'alice@githab.com', 'password', 'github')
+
+        self.assertEqual([('alice@github.com', 'github'), ('alice@gitlab.com', 'gitlab')],
+                         unit_obj.suggest('alice@githab.com', 'github'))
+        self.assertEqual([('alice@github.com', 'github')],
+                         unit_obj.suggest('alice@githab.com', 'github', 1))
+        self.assertEqual([('bob', 'default')], unit_obj.suggest('bobb', 'default'))
+        self.assertEqual([], unit_obj.suggest('carol', 'default'))
+        self.assertEqual([], unit_obj.suggest('', None))
+        # длинный ввод: число триграмм в запросе ограничено
+        long_login = ''.join(chr(ord('a') + i % 26) + chr(ord('a') + i // 26 % 26)
+                             for i in range(700))
+        self.assertEqual([], unit_obj.suggest(long_login, long_login))
+
+        unit_obj.update_unit(self._test_user, self._test_pwd_user, 'bob', 'default',
+                             new_login='robert')
+        self.assertEqual([], unit_obj.suggest('bobb', 'default'))
+        self.assertEqual([('robert', 'default')], unit_obj.suggest('robrt', 'default'))
+        unit_obj.delete_unit('alice@gitlab.com', 'gitlab')
+        self.assertEqual([('alice@github.com', 'github')],
+                         unit_obj.suggest('alice@githab.com', 'github'))
+        self.assertEqual(0, self._cursor_sqlite.execute(
+            'SELECT COUNT(*) FROM unit_trigrams JOIN units ON units.id = unit_trigrams.unit_id '
+            "WHERE units.login = 'alice@gitlab.com'").fetchone()[0])
+
+        # candidates are searched by index, units and trigrams are never scanned
+        sql, parameters = make_suggest_query(unit_obj.get_user_id(),
+                                             make_trigrams('alice@githab.com'))
+        plan = ' '.join(row[3] for row in self._cursor_sqlite.execute(
+            'EXPLAIN QUERY PLAN ' + sql, parameters))
+        self.assertIn('ix_unit_trigrams_user_trigram', plan)
+        self.assertNotIn('SCAN unit', plan)
+
+    def test_get_logins_statement_count(self):
+        """
+        check that listing a 20k units vault costs a constant number of statements
+        """
+        unit_obj = UnitManager(self._session_for_user, self._test_user)
+        for category in ('category1', 'category2', 'category3'):
+            unit_obj.add_unit(self._test_user, self._test_pwd_user,
+                              self._test_login, self._test_pwd_login, category, category=category)
+        user_id = unit_obj.get_user_id()
+        category_ids = [row[0] for row in self._cursor_sqlite.execute('SELECT id FROM categories')]
+        self._cursor_sqlite.executemany(
+            'INSERT INTO units (user_id, login, name, category_id, password) '
+            'VALUES (?, ?, ?, ?, ?)',
+            ((user_id, f'login-{i}', 'default', category_ids[i % 3], 'encrypted')
+             for i in range(20000)))
+        self._conn_sqlite.commit()
+        self._session_for_user.expire_all()
+
+        # new manager: the user id is resolved once, categories are loaded with units
+        with assert_max_queries(self._session_for_user.get_bind(), 4):
+            logins = UnitManager(self._session_for_user, self._test_user).get_logins()
+            logins_category = UnitManager(self._session_for_user, self._test_user)\
+                .get_logins(category='category2')
+
+        self.assertEqual(20003, len(logins['logins']))
+        self.assertEqual(['category1', 'category2', 'category3', 'category1'],
+                         logins['category'][:4])
+        self.assertEqual({'category2'}, set(logins_category['category']))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,54 @@
+import io
+import json
+import unittest
+
+from units_manager.models import UnitsComposition
+
+
+class TestUnitsComposition(unittest.TestCase):
+
+    def setUp(self) -> None:
+        """Настройка окружения"""
+        self._logins = {
+            'logins': ['login-1', 'long-login-2'],
+            'category': ['default', 'category'],
+            'url': ['', 'https://test.ru/'],
+            'name': ['default', 'name-2']
+        }
+
+    def test_table(self):
+        """
+        check table with flags and that input data is not changed
+        """
+        units_composition_obj = UnitsComposition(self._logins)
+        units_composition_obj.prepare_data()
+        stream = io.StringIO()
+        units_composition_obj.write(stream, {'name': True, 'category': False, 'url': True})
+
+        self.assertEqual('logins       | url              | name\n'
+                         '-------------+------------------+---------\n'
+                         'login-1      |                  | default\n'
+                         'long-login-2 | https://test.ru/ | name-2\n', stream.getvalue())
+        self.assertEqual(stream.getvalue().strip(), units_composition_obj.make_str_logins(
+            {'name': True, 'url': True}))
+        self.assertEqual(['login-1', 'long-login-2'], self._logins['logins'])
+
+    def test_empty_table(self):
+        """
+        check table without units
+        """
+        units_composition_obj = UnitsComposition({'logins': [], 'name': []})
+        self.assertEqual('logins | name\n-------+------',
+                         units_composition_obj.make_str_logins({'name': True}))
+
+    def test_json(self):
+        """
+        check json lines output
+        """
+        stream = io.StringIO()
+        UnitsComposition(self._logins).write(stream, output_format='json')
+
+        self.assertEqual([{'login': 'login-1', 'category': 'default', 'url': '', 'name': 'default'},
+                          {'login': 'long-login-2', 'category': 'category',
+                           'url': 'https://test.ru/', 'name': 'name-2'}],
+                         [json.loads(line) for line in stream.getvalue().splitlines()])
@@ -1,21 +1,23 @@
+import base64
+import binascii
 import datetime as dt
+import json
 
 from settings import TIME_SESSION_CLOSE
 
 
 class UnitsComposition:
     """Класс компоновки юнитов на выдачу
-    
-    Пока общими словами описываю данные, т.к. сопоставление точек соприкосновения
-    мы ещё не делали
 
-    IN: 
-        Получает на вход выгруженные данные из БД
+    IN:
+        Получает на вход выгруженные из БД units: словарь столбцов
+        (logins, category, url, name), как его отдает UnitManager.get_logins
     OUT:
-        отдаёт на выходе json, собрав его в зависимости от наших потребностей,
-        которые возникнут по коду
+        Отдает строки таблицы или json lines генератором: данные не копируются
+        и не изменяются, вывод пишется в поток по строке
     """
     _data_obj = {}
+    _widths = None
 
     def __init__(self, data_obj=None):
         if data_obj is None:
@@ -23,46 +25,64 @@ class UnitsComposition:
         self._data_obj = data_obj
 
     def prepare_data(self, data_obj=None):
-        """Подготовка списка логинов"""
+        """Ширина столбцов, за один проход по каждому столбцу"""
         if not data_obj:
             data_obj = self._data_obj
-        for key, lst in data_obj.items():
-            # Ищем максимальную длину строки в столбце
-            max_len = len(key)
-            for item in lst:
-                if len(item) > max_len:
-                    max_len = len(item)
-
-            # Добавляем пробелы в столбцы, для одинаковой длины столбцов
-            for i in range(len(lst)):
-                data_obj[key][i] = data_obj[key][i].ljust(max_len+1)
-            data_obj[key].insert(0, key.ljust(max_len+1))
-
         self._data_obj = data_obj
+        self._widths = {key: max(len(key), max(map(len, lst), default=0)) + 1
+                        for key, lst in data_obj.items()}
 
-    def make_str_logins(self, flags=None, data_obj=None):
-        """Печатем логины с флагами"""
+    def _columns(self, flags):
+        """Выводимые столбцы: логины и столбцы с включенными флагами"""
+        return ['logins'] + [key for key in self._data_obj.keys()
+                             if key != 'logins' and flags.get(key)]
+
+    def iter_rows(self, flags=None):
+        """Строки таблицы с флагами: заголовок, разделитель, по строке на unit"""
         if not flags:
             flags = {}
-        if not data_obj:
-            data_obj = self._data_obj
+        if self._widths is None:
+            self.prepare_data()
+        columns = self._columns(flags)
+        widths = [self._widths[key] for key in columns]
 
-        res_str = ""
-        is_first_line = True
+        yield '| '.join(key.ljust(width) for key, width in zip(columns, widths)).rstrip()
+        yield '+-'.join('-' * width for width in widths)
+        for row in zip(*(self._data_obj[key] for key in columns)):
+            yield '| '.join(item.ljust(width) for item, width in zip(row, widths)).rstrip()
 
-        for i in range(len(data_obj['logins'])):
-            str_for_print = data_obj['logins'][i]
-            delimiter_str = "-" * len(data_obj['logins'][i])
-            for key in data_obj.keys():
-                if key in flags.keys() and flags[key]:
-                    str_for_print += '| ' + data_obj[key][i]
-                    delimiter_str += '+-' + '-' * len(data_obj[key][i])
-            res_str += str_for_print + '\n'
-            if is_first_line:
-                res_str += delimiter_str + '\n'
-                is_first_line = False
+    def iter_json(self):
+        """Строки json lines, по объекту на unit, для скриптов"""
+        keys = ['logins'] + [key for key in self._data_obj.keys() if key != 'logins']
+        # ключ logins в выдаче - login, как в файлах импорта
+        names = ['login'] + keys[1:]
+        for row in zip(*(self._data_obj[key] for key in keys)):
+            yield json.dumps(dict(zip(names, row)), ensure_ascii=False)
 
-        return res_str.strip()
+    def write(self, stream, flags=None, output_format='table'):
+        """Запись в поток таблицы (table) или json lines (json)"""
+        lines = self.iter_json() if output_format == 'json' else self.iter_rows(flags)
+        stream.writelines(line + '\n' for line in lines)
+
+    def make_str_logins(self, flags=None, data_obj=None):
+        """Печатем логины с флагами"""
+        if data_obj:
+            self.prepare_data(data_obj)
+        return '\n'.join(self.iter_rows(flags))
+
+
+def encode_cursor(login, name):
+    """Токен продолжения выдачи: ключ (login, name) последнего unit страницы"""
+    return base64.urlsafe_b64encode(json.dumps([login, name]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(login, name) из токена продолжения, ValueError для поврежденного токена"""
+    try:
+        login, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, TypeError, UnicodeError, ValueError):
+        raise ValueError(f'Incorrect cursor "{cursor}"')
+    return login, name
 
 
 class TimeoutController:
@@ -77,6 +97,10 @@ class TimeoutController:
     """
     _default_time_session = TIME_SESSION_CLOSE
 
+    def __init__(self, time_session=None):
+        if time_session is not None:
+            self._default_time_session = time_session
+
     def check_time_permission(self, check_datetime):
         """
         проверка дельты между переданным datetime и текущим,
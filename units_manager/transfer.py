@@ -0,0 +1,267 @@
+import csv
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import urlparse
+
+from settings import EXPORT_CHUNK_SIZE, EXPORT_KDF_ITERATIONS
+
+# первая строка файла экспорта pwdone: версия формата, KDF, число итераций и соль.
+# Версия 3: ключи AES и HMAC выводятся из пароля через PBKDF2 с солью, у каждой
+# строки HMAC; последняя строка - итог (число частей и units)
+EXPORT_HEADER = 'PWDONE-EXPORT 3'
+EXPORT_KDF = 'pbkdf2-sha256'
+
+# имена полей в файлах импорта: csv/json pwdone и экспорты браузеров
+# (Chrome: name,url,username,password; Firefox: url,username,password,...)
+FIELD_ALIASES = {
+    'login': ('login', 'username', 'user', 'email', 'login_username'),
+    'password': ('password', 'login_password'),
+    'name': ('name', 'title'),
+    'category': ('category', 'folder', 'grouping'),
+    'url': ('url', 'uri', 'login_uri', 'website'),
+}
+
+
+def normalize_unit(record):
+    """
+    Приводим запись файла импорта к unit: login, password, name, category, url.
+    None, если в записи нет логина или пароля
+    """
+    record = {str(key).strip().lower(): value for key, value in record.items()}
+    unit_ = {}
+    for field, aliases in FIELD_ALIASES.items():
+        unit_[field] = next((record[alias] for alias in aliases if record.get(alias)), None)
+    if not unit_['login'] or not unit_['password']:
+        return None
+    if not unit_['name']:
+        # у экспорта Firefox нет имени: без него логины разных сайтов совпали бы
+        unit_['name'] = urlparse(unit_['url']).hostname if unit_['url'] else None
+    unit_['name'] = unit_['name'] or 'default'
+    unit_['category'] = unit_['category'] or 'default'
+    return unit_
+
+
+def read_csv(stream):
+    """Записи csv файла с заголовком, построчно"""
+    yield from csv.DictReader(stream)
+
+
+def read_json(stream):
+    """
+    Записи json файла: список объектов или экспорт Bitwarden ({"items": [...]}).
+    Файл json читается целиком, для потоковой загрузки - read_json_lines
+    """
+    data = json.load(stream)
+    if isinstance(data, dict):
+        data = data.get('items', [])
+    for record in data:
+        login = record.get('login')
+        if isinstance(login, dict):
+            # Bitwarden: данные входа во вложенном объекте
+            uris = login.get('uris') or [{}]
+            record = dict(record, login=login.get('username'), password=login.get('password'),
+                          url=uris[0].get('uri'))
+        yield record
+
+
+def read_json_lines(stream):
+    """Записи json lines файла (объект на строку), построчно"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def make_export_header(iterations, salt):
+    """Строка заголовка экспорта"""
+    return f'{EXPORT_HEADER} {EXPORT_KDF} {iterations} {salt.hex()}'
+
+
+def parse_export_header(header):
+    """(число итераций, соль) из заголовка экспорта, ValueError для другого формата"""
+    parts = header.split(' ')
+    if ' '.join(parts[:2]) != EXPORT_HEADER:
+        raise ValueError('Not a pwdone export file or unsupported version '
+                         f'(header "{header[:40]}")')
+    try:
+        kdf, iterations, salt = parts[2:]
+        if kdf != EXPORT_KDF:
+            raise ValueError
+        return int(iterations), bytes.fromhex(salt)
+    except ValueError:
+        raise ValueError('Damaged export file: incorrect header')
+
+
+def read_export_trailer(stream, export_cipher):
+    """
+    Проверка файла экспорта до импорта: HMAC каждой части с ее номером и итог
+    в последней строке. Подмененные, обрезанный файл, потерянные или переставленные
+    части - ValueError. Возвращает итог {'chunks': .., 'units': ..}
+    """
+    chunks = 0
+    last_line = None
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        if last_line is not None:
+            export_cipher.verify(last_line, chunks)
+            chunks += 1
+        last_line = line
+    if last_line is None:
+        raise ValueError('Damaged export file: no trailer')
+    try:
+        trailer = json.loads(export_cipher.decrypt(last_line, 'trailer'))
+    except ValueError:
+        raise ValueError('Incorrect export password or damaged export file')
+    if not isinstance(trailer, dict) or trailer.get('chunks') != chunks:
+        raise ValueError('Damaged export file: chunks are missing or out of order')
+    return trailer
+
+
+def read_export(stream, export_password):
+    """
+    Записи зашифрованного экспорта pwdone. Сначала файл проверяется по итогу
+    (read_export_trailer), затем части расшифровываются по одной
+    """
+    iterations, salt = parse_export_header(stream.readline().strip())
+    from encryption_manager.models import ExportCipher
+
+    export_cipher = ExportCipher(export_password, salt, iterations)
+    start = stream.tell()
+    trailer = read_export_trailer(stream, export_cipher)
+    stream.seek(start)
+    units = 0
+    for chunk in range(trailer['chunks']):
+        line = stream.readline()
+        while not line.strip():
+            line = stream.readline()
+        records = list(read_json_lines(export_cipher.decrypt(line.strip(), chunk).splitlines()))
+        units += len(records)
+        yield from records
+    if units != trailer['units']:
+        raise ValueError('Damaged export file: number of logins does not match')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'jsonl': read_json_lines,
+}
+
+
+class UnitsReader:
+    """Потоковое чтение units из файла импорта
+
+    IN:
+        Поток файла и его формат (csv, json, jsonl, pwdone - тогда еще и пароль
+        экспорта)
+    OUT:
+        Итератор units (login, password, name, category, url), их число в count;
+        записи без логина или пароля пропускаются и считаются в invalid
+    """
+
+    def __init__(self, stream, file_format, export_password=None):
+        self._stream = stream
+        self._file_format = file_format
+        self._export_password = export_password
+        self.count = 0
+        self.invalid = 0
+
+    def __iter__(self):
+        if self._file_format == 'pwdone':
+            # экспорт pwdone зашифрован, ключ - из пароля экспорта
+            records = read_export(self._stream, self._export_password)
+        else:
+            records = READERS[self._file_format](self._stream)
+        for record in records:
+            unit_ = normalize_unit(record)
+            if unit_ is None:
+                self.invalid += 1
+                continue
+            self.count += 1
+            yield unit_
+
+
+class ExportWriter:
+    """Запись зашифрованного экспорта pwdone
+
+    IN:
+        Поток вывода, пароль экспорта и число итераций PBKDF2
+    OUT:
+        Заголовок с солью, затем по строке на каждые chunk_size units:
+        зашифрованные json lines с HMAC. В памяти держится не больше одной части.
+        При выходе из with без ошибки - итог: число частей и units
+    """
+
+    def __init__(self, stream, export_password, chunk_size=EXPORT_CHUNK_SIZE,
+                 iterations=EXPORT_KDF_ITERATIONS):
+        from encryption_manager.models import ExportCipher
+
+        salt = os.urandom(16)
+        self._stream = stream
+        self._export_cipher = ExportCipher(export_password, salt, iterations)
+        self._chunk_size = chunk_size
+        self._chunk = []
+        self._chunks = 0
+        self.count = 0
+        self._stream.write(make_export_header(iterations, salt) + '\n')
+
+    def write(self, unit_):
+        """Добавление unit (login, password, name, category, url)"""
+        self._chunk.append(json.dumps(unit_, ensure_ascii=False))
+        self.count += 1
+        if len(self._chunk) >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленной части, HMAC части - с ее номером"""
+        if self._chunk:
+            line = self._export_cipher.encrypt('\n'.join(self._chunk), self._chunks)
+            self._stream.write(line + '\n')
+            self._chunks += 1
+            self._chunk = []
+
+    def write_trailer(self):
+        """Запись итога, после нее частей в файле быть не должно"""
+        self.flush()
+        self._stream.write(self._export_cipher.encrypt(
+            json.dumps({'chunks': self._chunks, 'units': self.count}), 'trailer') + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.write_trailer()
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Поток записи в файл path: пишется во временный файл рядом и заменяет path
+    только при выходе из with без ошибки, иначе удаляется
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    descriptor, tmp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+    try:
+        with open(descriptor, 'w', encoding='utf-8') as stream:
+            yield stream
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def batched(iterable, batch_size):
+    """Списки по batch_size элементов из итератора"""
+    if batch_size < 1:
+        raise ValueError(f'batch size must be at least 1, got {batch_size}')
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch